@@ -18,7 +18,6 @@
 # You should have received a copy of the GNU General Public License
 # along with SmartHome.py. If not, see <http://www.gnu.org/licenses/>.
 #########################################################################
-import http
 import logging
 import lib.connection
 import lib.tools
@@ -31,18 +30,87 @@ import urllib
 from urllib.parse import urlparse
 import fcntl
 import struct
+import collections
+import time
 import requests
 
 logger = logging.getLogger('')
 sonos_speaker = {}
 
 
+class StateMirror():
+    """
+    Holds the last known state of every speaker as sent by the Sonos Broker together with the state version of the
+    last received message. The version is used to find out which speakers have to be resynchronized: every message
+    names the version of the previous message sent to this client ('previous_version'). If it differs from the last
+    received version, a message got lost (or the broker was restarted) and the speaker is resynchronized with the
+    next refresh. The comparison with the broker's versions in stale() catches the loss of the last message.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._versions = {}
+        # speakers with a lost message
+        self._gaps = set()
+        self._lock = threading.Lock()
+
+    def update(self, uid, data):
+        with self._lock:
+            self._states.setdefault(uid, {}).update(data)
+            if 'state_version' in data:
+                if 'previous_version' in data and data['previous_version'] != self._versions.get(uid):
+                    logger.debug("Sonos: lost message for {uid}, previous version {previous}, last received "
+                                 "{last}".format(uid=uid, previous=data['previous_version'],
+                                                 last=self._versions.get(uid)))
+                    self._gaps.add(uid)
+                self._versions[uid] = data['state_version']
+
+    def version(self, uid):
+        return self._versions.get(uid)
+
+    def state(self, uid):
+        """
+        Returns a copy of the last known state of a speaker.
+        """
+        with self._lock:
+            return dict(self._states.get(uid, {}))
+
+    def invalidate(self, uid=None):
+        with self._lock:
+            if uid is None:
+                self._versions.clear()
+            else:
+                self._versions.pop(uid, None)
+
+    def stale(self, uids, versions):
+        """
+        Returns all speakers whose mirrored state version differs from the version reported by the broker.
+        Speakers unknown to the broker are skipped, the broker will send their state once they are online.
+        :param versions: dict uid -> state version reported by the broker
+        """
+        with self._lock:
+            return [uid for uid in uids if uid in versions and
+                    (uid in self._gaps or versions[uid] != self._versions.get(uid))]
+
+    def resynced(self, uids):
+        """
+        The current state of these speakers has been requested, their lost messages are replaced.
+        """
+        with self._lock:
+            self._gaps.difference_update(uids)
+
+
 class UDPDispatcher(lib.connection.Server):
-    def __init__(self, ip, port):
+    def __init__(self, ip, port, mirror=None):
         lib.connection.Server.__init__(self, ip, port, proto='UDP')
+        self._mirror = mirror
         self.dest = 'udp:' + ip + ':{port}'.format(port=port)
         logger.debug('starting udp listener with {url}'.format(url=self.dest))
 
+        # key -> [received, applied]
+        self._stats = collections.defaultdict(lambda: [0, 0])
+        self._stats_start = time.time()
+
         self.connect()
 
     def handle_connection(self):
@@ -56,27 +124,168 @@ class UDPDispatcher(lib.connection.Server):
 
         try:
             sonos = json.loads(data.decode('utf-8').strip())
-            uid = sonos['uid']
-
-            if not uid:
-                logger.error("No uid found in sonos udp response!\nResponse: {}")
-            if uid not in sonos_speaker:
-                logger.warning("no sonos speaker configured with uid '{uid}".format(uid=uid))
-                return
-
-            for key, value in sonos.items():
-                instance_var = getattr(sonos_speaker[uid], key)
 
-                if isinstance(instance_var, list):
-                    for item in instance_var:
-                        item(value, 'Sonos', '')
+            # the broker may send the data of several speakers within one message
+            if isinstance(sonos, list):
+                for speaker_data in sonos:
+                    self._apply(speaker_data)
+            else:
+                self._apply(sonos)
 
         except Exception as err:
             logger.error("Error parsing sonos broker response!\nError: {}".format(err))
 
+    def _apply(self, sonos):
+        uid = sonos.get('uid')
+
+        if not uid:
+            logger.error("No uid found in sonos udp response!\nResponse: {}".format(sonos))
+            return
+        if uid not in sonos_speaker:
+            logger.warning("no sonos speaker configured with uid '{uid}".format(uid=uid))
+            return
+        speaker = sonos_speaker[uid]
+
+        if self._mirror is not None:
+            self._mirror.update(uid, sonos)
+
+        # collect all changed values first and update the items in one pass, unchanged values are skipped to avoid
+        # needless triggers of logics
+        changes = []
+        for key, value in sonos.items():
+            stats = self._stats[key]
+            stats[0] += 1
+
+            items = getattr(speaker, key, None)
+            if not isinstance(items, list):
+                continue
+
+            changed = False
+            for item in items:
+                if item() != value:
+                    changes.append((item, value))
+                    changed = True
+            if changed:
+                stats[1] += 1
+
+        for item, value in changes:
+            item(value, 'Sonos', '')
+
+    def statistics(self):
+        """
+        Returns the number of received and applied (changed) values per key and the received values per minute.
+        """
+        minutes = max(time.time() - self._stats_start, 1) / 60
+        return {key: {'received': received, 'applied': applied, 'per_minute': round(received / minutes, 2)}
+                for key, (received, applied) in self._stats.items()}
+
+
+class CommandDispatcher():
+    """
+    Sends the commands to the Sonos Broker in a background thread with a persistent (keep-alive) connection.
+    Pending commands which set a value are coalesced: if a value changes several times before the command is sent,
+    only the latest value is sent per speaker, command and group_command flag. The latest command is moved to the end
+    of the queue, so the commands are still sent in the order they were issued.
+    """
+
+    coalesce_commands = ('set_volume', 'set_max_volume', 'set_mute', 'set_led', 'set_bass', 'set_treble',
+                         'set_loudness', 'set_playmode', 'set_play', 'set_pause', 'set_stop', 'set_track_position',
+                         'current_state')
+    # play, pause and stop set the same transport state, only the last one counts
+    transport_commands = ('set_play', 'set_pause', 'set_stop')
+
+    def __init__(self, broker_url, timeout=5, maxsize=100):
+        self._broker_url = broker_url
+        self._timeout = timeout
+        self._maxsize = maxsize
+        self._keys = collections.deque()
+        self._pending = {}
+        self._condition = threading.Condition()
+        self._session_lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.headers.update({'Content-type': 'application/json', 'Accept': 'text/plain'})
+        self._alive = True
+        self._thread = threading.Thread(target=self._worker, name='SonosDispatcher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _key(self, payload):
+        command = payload['command']
+        if command in self.coalesce_commands:
+            parameter = payload.get('parameter', {})
+            if command in self.transport_commands:
+                command = 'transport'
+            return command, parameter.get('uid'), int(parameter.get('group_command', 0))
+        # unique key, this command is never coalesced
+        return object()
+
+    def put(self, payload):
+        """
+        Queues a command. Returns immediately.
+        """
+        key = self._key(payload)
+        with self._condition:
+            if key in self._pending:
+                logger.debug("Sonos: superseded pending command {cmd}".format(cmd=self._pending[key]))
+                self._keys.remove(key)
+                self._keys.append(key)
+                self._pending[key] = payload
+                return True
+            if len(self._keys) >= self._maxsize:
+                logger.warning("Sonos: command queue full, dropping command {cmd}".format(cmd=payload))
+                return False
+            self._keys.append(key)
+            self._pending[key] = payload
+            self._condition.notify()
+        return True
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self._alive and not self._keys:
+                    self._condition.wait()
+                if not self._keys:
+                    return
+                payload = self._pending.pop(self._keys.popleft())
+            self.send(payload)
+
+    def send(self, payload):
+        """
+        Sends a command synchronously.
+        :return: the response text or None, if the command failed
+        """
+        try:
+            logger.debug("Sending request: {0}".format(payload))
+
+            with self._session_lock:
+                response = self._session.post(self._broker_url, data=json.dumps(payload), timeout=self._timeout)
+
+            html_start = "<html><head><title>Sonos Broker</title></head><body>"
+            html_end = "</body></html>"
+
+            if response.status_code == 200:
+                logger.info("Sonos: Message %s %s successfully sent - %s %s" %
+                            (self._broker_url, payload, response.status_code, response.reason))
+                return response.text.replace(html_start, "", 1).replace(html_end, "", 1)
+
+            else:
+                logger.warning("Sonos: Could not send message %s %s - %s %s" %
+                               (self._broker_url, payload, response.status_code, response.text))
+                return None
+        except Exception as e:
+            logger.warning(
+                "Could not send sonos notification: {0}. Error: {1}".format(payload, e))
+
+    def stop(self):
+        with self._condition:
+            self._alive = False
+            self._condition.notify()
+        self._thread.join(self._timeout)
+        self._session.close()
+
 
 class Sonos():
-    def __init__(self, smarthome, listen_host='0.0.0.0', listen_port=9999, broker_url=None, refresh=120):
+    def __init__(self, smarthome, listen_host='0.0.0.0', listen_port=9999, broker_url=None, refresh=120, timeout=5):
         self._sonoslock = threading.Lock()
         self._lan_ip = get_lan_ip()
 
@@ -107,6 +316,8 @@ class Sonos():
         self._listen_port = listen_port
         self._sh = smarthome
         self._command = SonosCommand()
+        self._routes = {}
+        self._dispatcher = CommandDispatcher(self._broker_url, float(timeout))
 
         logger.debug('refresh sonos speakers every {refresh} seconds'.format(refresh=refresh))
 
@@ -114,7 +325,8 @@ class Sonos():
         self._sh.scheduler.add('sonos-update', self._subscribe, cycle=refresh)
 
         # start UDP listener
-        UDPDispatcher(self._listen_host, self._listen_port)
+        self._mirror = StateMirror()
+        self._udp_dispatcher = UDPDispatcher(self._listen_host, self._listen_port, self._mirror)
 
     def run(self):
         self.alive = True
@@ -126,8 +338,23 @@ class Sonos():
         logger.debug('(re)registering to sonos broker server ...')
         self._send_cmd(SonosCommand.subscribe(self._lan_ip, self._listen_port))
 
-        for uid, speaker in sonos_speaker.items():
-            self._send_cmd(SonosCommand.current_state(uid))
+        if not sonos_speaker:
+            return
+
+        # heartbeat: only request the current state of speakers whose state version differs from the mirrored one
+        # (lost udp messages, broker or plugin restart)
+        stale = list(sonos_speaker)
+        response = self._send_cmd(SonosCommand.state_versions(list(sonos_speaker), self._lan_ip, self._listen_port))
+        if response is not None:
+            try:
+                stale = self._mirror.stale(sonos_speaker, json.loads(response))
+            except ValueError:
+                logger.warning("Sonos: invalid state versions from broker, requesting the state of all speakers")
+
+        if stale:
+            logger.debug('Sonos: resynchronizing speakers {uids}'.format(uids=stale))
+            if self._send_cmd(SonosCommand.batch([SonosCommand.current_state(uid) for uid in stale])) is not None:
+                self._mirror.resynced(stale)
 
     def _unsubscribe(self):
         """
@@ -142,6 +369,7 @@ class Sonos():
         """
         # try to unsubscribe the plugin from the Sonos Broker
         self._unsubscribe()
+        self._dispatcher.stop()
         self.alive = False
 
     def _resolve_uid(self, item):
@@ -181,6 +409,20 @@ class Sonos():
                     return None
 
                 attr = item.conf['sonos_send']
+                if attr not in ITEM_ROUTES:
+                    logger.warning("sonos: unknown command '{}' for item {}".format(attr, item))
+                    return None
+
+                # resolve all sub-items (group_command, volume, ...) once, item updates only use this routing record
+                validator, builder, child_names = ITEM_ROUTES[attr]
+                children = {}
+                for child in item.return_children():
+                    name = child._name.lower()
+                    for child_name in child_names:
+                        if name == '{}.{}'.format(item._name, child_name).lower():
+                            children[child_name] = child
+                self._routes[id(item)] = ItemRoute(uid, attr, validator, builder, children)
+
                 logger.debug("sonos: {} is send to {}".format(item, attr))
                 return self._update_item
             finally:
@@ -192,286 +434,82 @@ class Sonos():
         pass
 
     def _update_item(self, item, caller=None, source=None, dest=None):
-        if caller != 'Sonos':
-            value = item()
-
-            if 'sonos_send' in item.conf:
-                uid = self._resolve_uid(item)
+        if caller == 'Sonos':
+            return None
 
-                if not uid:
-                    return None
-                command = item.conf['sonos_send']
-
-                cmd = ''
-
-                if command == 'mute':
-                    if isinstance(value, bool):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.mute(uid, value, group_command)
-
-                if command == 'led':
-                    if isinstance(value, bool):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.led(uid, value, group_command)
-
-                if command == 'play':
-                    if isinstance(value, bool):
-                        cmd = self._command.play(uid, value)
-
-                if command == 'pause':
-                    if isinstance(value, bool):
-                        cmd = self._command.pause(uid, value)
-
-                if command == 'stop':
-                    if isinstance(value, bool):
-                        cmd = self._command.stop(uid, value)
-
-                if command == 'volume':
-                    if isinstance(value, int):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.volume(uid, value, group_command)
-
-                if command == 'max_volume':
-                    if isinstance(value, int):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.max_volume(uid, value, group_command)
-
-                if command == 'bass':
-                    if isinstance(value, int):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.bass(uid, value, group_command)
-
-                if command == 'treble':
-                    if isinstance(value, int):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.treble(uid, value, group_command)
-
-                if command == 'loudness':
-                    if isinstance(value, bool):
-                        group_item_name = '{}.group_command'.format(item._name)
-                        group_command = 0
-                        for child in item.return_children():
-                            if child._name.lower() == group_item_name.lower():
-                                group_command = child()
-                                break
-                        cmd = self._command.loudness(uid, value, group_command)
-
-                if command == 'playmode':
-                    value = value.lower().strip('\'').strip('\"')
-                    if value in ['normal', 'shuffle_norepeat', 'shuffle', 'repeat_all']:
-                        cmd = self._command.playmode(uid, value)
-                    else:
-                        logger.warning(
-                            "Ignoring PLAYMODE command. Value {value} not a valid paramter!".format(value=value))
-
-                if command == 'next':
-                    cmd = self._command.next(uid)
-
-                if command == 'previous':
-                    cmd = self._command.previous(uid)
-
-                if command == 'play_uri':
-                    cmd = self._command.play_uri(uid, value)
-
-                if command == 'play_snippet':
-                    volume_item_name = '{}.volume'.format(item._name)
-                    group_item_name = '{}.group_command'.format(item._name)
-                    fade_item_name = '{}.fade_in'.format(item._name)
-                    volume = -1
-                    group_command = 0
-                    fade_in = 0
-                    for child in item.return_children():
-                        if child._name.lower() == volume_item_name.lower():
-                            volume = child()
-                        if child._name.lower() == group_item_name.lower():
-                            group_command = child()
-                        if child._name.lower() == fade_item_name.lower():
-                            fade_in = child()
-                    cmd = self._command.play_snippet(uid, value, volume, group_command, fade_in)
-
-                if command == 'play_tts':
-                    volume_item_name = '{}.volume'.format(item._name)
-                    language_item_name = '{}.language'.format(item._name)
-                    group_item_name = '{}.group_command'.format(item._name)
-                    force_item_name = '{}.force_stream_mode'.format(item._name)
-                    fade_item_name = '{}.fade_in'.format(item._name)
-                    volume = -1
-                    language = 'de'
-                    group_command = 0
-                    force_stream_mode = 0
-                    fade_in = 0
-                    for child in item.return_children():
-                        if child._name.lower() == volume_item_name.lower():
-                            volume = child()
-                        if child._name.lower() == language_item_name.lower():
-                            language = child()
-                        if child._name.lower() == group_item_name.lower():
-                            group_command = child()
-                        if child._name.lower() == force_item_name.lower():
-                            force_stream_mode = child()
-                        if child._name.lower() == fade_item_name.lower():
-                            fade_in = child()
-                    cmd = self._command.play_tts(uid, value, language, volume, group_command, force_stream_mode,
-                                                 fade_in)
-
-                if command == 'seek':
-                    if not re.match(r'^[0-9][0-9]?:[0-9][0-9]:[0-9][0-9]$', value):
-                        logger.warning('invalid timestamp for sonos seek command, use HH:MM:SS format')
-                        cmd = None
-                    else:
-                        cmd = self._command.seek(uid, value)
-
-                if command == 'current_state':
-                    cmd = self._command.current_state(uid)
-
-                if command == 'join':
-                    cmd = self._command.join(uid, value)
-
-                if command == 'unjoin':
-                    cmd = self._command.unjoin(uid)
-
-                if command == 'partymode':
-                    cmd = self._command.partymode(uid)
-
-                if command == 'volume_up':
-                    group_item_name = '{}.group_command'.format(item._name)
-                    group_command = 0
-                    for child in item.return_children():
-                        if child._name.lower() == group_item_name.lower():
-                            group_command = child()
-                            break
-                    cmd = self._command.volume_up(uid, group_command)
-
-                if command == 'volume_down':
-                    group_item_name = '{}.group_command'.format(item._name)
-                    group_command = 0
-                    for child in item.return_children():
-                        if child._name.lower() == group_item_name.lower():
-                            group_command = child()
-                            break
-                    cmd = self._command.volume_down(uid, group_command)
-
-                if command == 'get_playlist':
-                    cmd = self._command.get_playlist(uid)
-                    data = self._send_cmd(cmd)
-
-                    if data:
-                        try:
-                            with open(item(), 'w') as f:
-                                f.write(data)
-                                logger.info("Playlist saved to {file}".format(file=item()))
-                        except Exception as err:
-                            logger.error("Could not save playlist to {file}".format(file=item()))
-                            logger.error(err)
-                    else:
-                        logger.warning("No playlist returned")
-                    return
+        route = self._routes.get(id(item))
+        if route is None:
+            return None
+        value = item()
 
-                if command == 'set_playlist':
-
-                    play_item_name = '{}.play_after_insert'.format(item._name)
-                    play_after_insert = 0
-                    for child in item.return_children():
-                        if child._name.lower() == play_item_name.lower():
-                            play_after_insert = child()
-                            break
-
-                    if not os.path.isfile(item()):
-                        logger.warning("File {file} not found".format(file=item()))
-                        return
-                    try:
-                        with open(item(), 'r') as f:
-                            playlist = f.read()
-                            cmd = self._command.set_playlist(uid, playlist, play_after_insert)
-                            self._send_cmd(cmd)
-                    except Exception as err:
-                        logger.error("Could not open playlist {file}".format(file=item()))
-                        logger.error(err)
-                    return
+        if route.command == 'get_playlist':
+            self._get_playlist(item, route)
+            return
 
-                if cmd:
-                    self._send_cmd(cmd)
-                    return
-        return None
+        if route.command == 'set_playlist':
+            self._set_playlist(item, route)
+            return
 
-    def _send_cmd(self, payload):
-        try:
-            logger.debug("Sending request: {0}".format(payload))
+        if not route.validator(value):
+            return None
 
-            headers = {'Content-type': 'application/json', 'Accept': 'text/plain'}
-            response = requests.post(self._broker_url, data=json.dumps(payload), headers=headers)
+        cmd = route.builder(route.uid, value, route.children)
+        if cmd:
+            # item updates must not wait for the broker
+            self._dispatcher.put(cmd)
+        return None
 
-            html_start = "<html><head><title>Sonos Broker</title></head><body>"
-            html_end = "</body></html>"
+    def _get_playlist(self, item, route):
+        data = self._send_cmd(SonosCommand.get_playlist(route.uid))
 
-            if response.status_code == 200:
-                logger.info("Sonos: Message %s %s successfully sent - %s %s" %
-                            (self._broker_url, payload, response.status_code, response.reason))
-                return response.text.replace(html_start, "", 1).replace(html_end, "", 1)
+        if data:
+            try:
+                with open(item(), 'w') as f:
+                    f.write(data)
+                    logger.info("Playlist saved to {file}".format(file=item()))
+            except Exception as err:
+                logger.error("Could not save playlist to {file}".format(file=item()))
+                logger.error(err)
+        else:
+            logger.warning("No playlist returned")
 
-            else:
-                logger.warning("Sonos: Could not send message %s %s - %s %s" %
-                               (self._broker_url, payload, response.status_code, response.text))
-                return None
-        except Exception as e:
-            logger.warning(
-                "Could not send sonos notification: {0}. Error: {1}".format(payload, e))
+    def _set_playlist(self, item, route):
+        play_after_insert = _child_value(route.children, 'play_after_insert', 0)
 
-    def _send_cmd_response(self, cmd):
+        if not os.path.isfile(item()):
+            logger.warning("File {file} not found".format(file=item()))
+            return
         try:
-            data = ''
-            conn = http.client.HTTPConnection(self._broker_url)
+            with open(item(), 'r') as f:
+                playlist = f.read()
+                cmd = self._command.set_playlist(route.uid, playlist, play_after_insert)
+                self._send_cmd(cmd)
+        except Exception as err:
+            logger.error("Could not open playlist {file}".format(file=item()))
+            logger.error(err)
 
-            conn.request("GET", cmd)
-            response = conn.getresponse()
-            if response.status == 200:
-                logger.info("Sonos: Message %s %s successfully sent - %s %s" %
-                            (self._broker_url, cmd, response.status, response.reason))
-                data = response.read()
-            else:
-                logger.warning("Sonos: Could not send message %s %s - %s %s" %
-                               (self._broker_url, cmd, response.status, response.reason))
-            conn.close()
-            return data
+    def _send_cmd(self, payload):
+        return self._dispatcher.send(payload)
 
-        except Exception as e:
-            logger.warning(
-                "Could not send sonos notification: {0}. Error: {1}".format(cmd, e))
+    def get_favorite_radiostations(self, start_item=0, max_items=50):
+        cmd = SonosCommand.favradio(start_item, max_items)
+        if not cmd:
+            return None
+        return self._send_cmd(cmd)
 
-        logger.debug("Sending request: {0}".format(cmd))
+    def get_state(self, uid):
+        """
+        Returns the last known state of a speaker received from the Sonos Broker.
+        Usage in a logic: sh.sonos.get_state('rincon_000e58c3892e01410')
+        """
+        return self._mirror.state(uid.lower())
 
-    def get_favorite_radiostations(self, start_item=0, max_items=50):
-        return self._send_cmd_response(SonosCommand.favradio(start_item, max_items))
+    def update_statistics(self):
+        """
+        Returns the update statistics per speaker attribute, e.g. to find noisy attributes.
+        Usage in a logic: sh.sonos.update_statistics()
+        """
+        return self._udp_dispatcher.statistics()
 
     def version(self):
         return "v1.3\t2015-01-18"
@@ -537,6 +575,26 @@ class SonosCommand():
             }
         }
 
+    @staticmethod
+    def batch(commands):
+        return {
+            'command': 'batch',
+            'parameter': {
+                'commands': commands
+            }
+        }
+
+    @staticmethod
+    def state_versions(uids, ip, port):
+        return {
+            'command': 'get_state_versions',
+            'parameter': {
+                'uids': uids,
+                'ip': ip,
+                'port': port
+            }
+        }
+
     @staticmethod
     def current_state(uid, group_command=0):
         return {
@@ -820,6 +878,101 @@ class SonosCommand():
         }
 
 
+#######################################################################
+# ITEM ROUTING
+#######################################################################
+
+# routing record for every item with a 'sonos_send' attribute, built in parse_item()
+ItemRoute = collections.namedtuple('ItemRoute', 'uid, command, validator, builder, children')
+
+SEEK_PATTERN = re.compile(r'^[0-9][0-9]?:[0-9][0-9]:[0-9][0-9]$')
+PLAYMODES = ('normal', 'shuffle_norepeat', 'shuffle', 'repeat_all')
+
+
+def _child_value(children, name, default):
+    child = children.get(name)
+    if child is None:
+        return default
+    return child()
+
+
+def _is_bool(value):
+    return isinstance(value, bool)
+
+
+def _is_int(value):
+    return isinstance(value, int)
+
+
+def _is_any(value):
+    return True
+
+
+def _is_seek(value):
+    if not SEEK_PATTERN.match(value):
+        logger.warning('invalid timestamp for sonos seek command, use HH:MM:SS format')
+        return False
+    return True
+
+
+def _playmode(uid, value, children):
+    value = value.lower().strip('\'').strip('\"')
+    if value not in PLAYMODES:
+        logger.warning("Ignoring PLAYMODE command. Value {value} not a valid paramter!".format(value=value))
+        return None
+    return SonosCommand.playmode(uid, value)
+
+
+# sonos_send value -> (value validator, command builder, names of the sub-items used by the builder)
+ITEM_ROUTES = {
+    'mute': (_is_bool, lambda uid, value, c: SonosCommand.mute(uid, value, _child_value(c, 'group_command', 0)),
+             ('group_command',)),
+    'led': (_is_bool, lambda uid, value, c: SonosCommand.led(uid, value, _child_value(c, 'group_command', 0)),
+            ('group_command',)),
+    'play': (_is_bool, lambda uid, value, c: SonosCommand.play(uid, value), ()),
+    'pause': (_is_bool, lambda uid, value, c: SonosCommand.pause(uid, value), ()),
+    'stop': (_is_bool, lambda uid, value, c: SonosCommand.stop(uid, value), ()),
+    'volume': (_is_int, lambda uid, value, c: SonosCommand.volume(uid, value, _child_value(c, 'group_command', 0)),
+               ('group_command',)),
+    'max_volume': (_is_int, lambda uid, value, c: SonosCommand.max_volume(uid, value,
+                                                                          _child_value(c, 'group_command', 0)),
+                   ('group_command',)),
+    'bass': (_is_int, lambda uid, value, c: SonosCommand.bass(uid, value, _child_value(c, 'group_command', 0)),
+             ('group_command',)),
+    'treble': (_is_int, lambda uid, value, c: SonosCommand.treble(uid, value, _child_value(c, 'group_command', 0)),
+               ('group_command',)),
+    'loudness': (_is_bool, lambda uid, value, c: SonosCommand.loudness(uid, value,
+                                                                       _child_value(c, 'group_command', 0)),
+                 ('group_command',)),
+    'playmode': (_is_any, _playmode, ()),
+    'next': (_is_any, lambda uid, value, c: SonosCommand.next(uid), ()),
+    'previous': (_is_any, lambda uid, value, c: SonosCommand.previous(uid), ()),
+    'play_uri': (_is_any, lambda uid, value, c: SonosCommand.play_uri(uid, value), ()),
+    'play_snippet': (_is_any, lambda uid, value, c: SonosCommand.play_snippet(uid, value,
+                                                                              _child_value(c, 'volume', -1),
+                                                                              _child_value(c, 'group_command', 0),
+                                                                              _child_value(c, 'fade_in', 0)),
+                     ('volume', 'group_command', 'fade_in')),
+    'play_tts': (_is_any, lambda uid, value, c: SonosCommand.play_tts(uid, value, _child_value(c, 'language', 'de'),
+                                                                      _child_value(c, 'volume', -1),
+                                                                      _child_value(c, 'group_command', 0),
+                                                                      _child_value(c, 'force_stream_mode', 0),
+                                                                      _child_value(c, 'fade_in', 0)),
+                 ('volume', 'language', 'group_command', 'force_stream_mode', 'fade_in')),
+    'seek': (_is_seek, lambda uid, value, c: SonosCommand.seek(uid, value), ()),
+    'current_state': (_is_any, lambda uid, value, c: SonosCommand.current_state(uid), ()),
+    'join': (_is_any, lambda uid, value, c: SonosCommand.join(uid, value), ()),
+    'unjoin': (_is_any, lambda uid, value, c: SonosCommand.unjoin(uid), ()),
+    'partymode': (_is_any, lambda uid, value, c: SonosCommand.partymode(uid), ()),
+    'volume_up': (_is_any, lambda uid, value, c: SonosCommand.volume_up(uid, _child_value(c, 'group_command', 0)),
+                  ('group_command',)),
+    'volume_down': (_is_any, lambda uid, value, c: SonosCommand.volume_down(uid, _child_value(c, 'group_command', 0)),
+                    ('group_command',)),
+    'get_playlist': (_is_any, None, ()),
+    'set_playlist': (_is_any, None, ('play_after_insert',)),
+}
+
+
 #######################################################################
 # UTIL FUNCTIONS
 #######################################################################
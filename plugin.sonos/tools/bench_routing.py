@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for the item routing of the Sonos plugin.
+
+Builds 20 speakers with 30 'sonos_send' items each, parses them with the plugin and measures the time of an item
+update. Commands are not sent, the dispatcher only counts them. The plugin is loaded from the parent folder of this
+script; outside of a smarthome.py checkout the 'lib' modules it imports are replaced by empty stand-ins (the routing
+doesn't use them):
+
+    python3 tools/bench_routing.py
+"""
+import argparse
+import importlib.util
+import os
+import sys
+import time
+import types
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+
+
+def load_plugin():
+    try:
+        import lib.connection
+        import lib.tools
+    except ImportError:
+        lib = types.ModuleType('lib')
+        lib.connection = types.ModuleType('lib.connection')
+        lib.connection.Server = type('Server', (), {})
+        lib.tools = types.ModuleType('lib.tools')
+        sys.modules.update({'lib': lib, 'lib.connection': lib.connection, 'lib.tools': lib.tools})
+    spec = importlib.util.spec_from_file_location('sonos_plugin', os.path.join(PLUGIN_DIR, '__init__.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+Sonos = load_plugin().Sonos
+
+# (sonos_send command, item value, sub-items)
+ITEM_TEMPLATES = [
+    ('mute', True, ['group_command']),
+    ('led', True, ['group_command']),
+    ('play', True, []),
+    ('pause', False, []),
+    ('stop', False, []),
+    ('volume', 20, ['group_command']),
+    ('max_volume', 80, ['group_command']),
+    ('bass', 2, ['group_command']),
+    ('treble', -2, ['group_command']),
+    ('loudness', True, ['group_command']),
+    ('playmode', 'shuffle', []),
+    ('next', True, []),
+    ('previous', True, []),
+    ('play_uri', 'x-file-cifs://server/music/track.mp3', []),
+    ('play_snippet', 'x-file-cifs://server/music/snippet.mp3', ['volume', 'group_command', 'fade_in']),
+    ('play_tts', 'Hallo Welt', ['volume', 'language', 'group_command', 'force_stream_mode', 'fade_in']),
+    ('seek', '00:01:30', []),
+    ('current_state', True, []),
+    ('join', 'rincon_000e58c3892e01410', []),
+    ('unjoin', True, []),
+    ('partymode', True, []),
+    ('volume_up', True, ['group_command']),
+    ('volume_down', True, ['group_command']),
+]
+
+
+class FakeItem():
+    """
+    Implements the parts of the smarthome.py item interface used by the plugin.
+    """
+
+    def __init__(self, name, value=None, conf=None, parent=None):
+        self._name = name
+        self._value = value
+        self.conf = conf or {}
+        self._parent = parent
+        self._children = []
+
+    def __call__(self, value=None, caller=None, source=None):
+        return self._value
+
+    def return_parent(self):
+        return self._parent
+
+    def return_children(self):
+        return self._children
+
+
+class CountingDispatcher():
+    def __init__(self):
+        self.count = 0
+
+    def put(self, payload):
+        self.count += 1
+
+
+def build_items(speakers, items_per_speaker):
+    items = []
+    for i in range(speakers):
+        speaker = FakeItem('room{}'.format(i), conf={'sonos_uid': 'rincon_{:016d}'.format(i)})
+        for j in range(items_per_speaker):
+            command, value, children = ITEM_TEMPLATES[j % len(ITEM_TEMPLATES)]
+            name = '{}.{}_{}'.format(speaker._name, command, j)
+            item = FakeItem(name, value, {'sonos_send': command}, speaker)
+            item._children = [FakeItem('{}.{}'.format(name, child), 0, parent=item) for child in children]
+            items.append(item)
+    return items
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Sonos plugin item routing benchmark')
+    argparser.add_argument('--speakers', type=int, default=20)
+    argparser.add_argument('--items', type=int, default=30, help='sonos_send items per speaker')
+    argparser.add_argument('--rounds', type=int, default=200)
+    args = argparser.parse_args()
+
+    # no network, scheduler or udp listener needed for the routing
+    plugin = Sonos.__new__(Sonos)
+    plugin._sonoslock = __import__('threading').Lock()
+    plugin._routes = {}
+    plugin._dispatcher = CountingDispatcher()
+
+    items = build_items(args.speakers, args.items)
+    start = time.perf_counter()
+    for item in items:
+        plugin.parse_item(item)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for item in items:
+            plugin._update_item(item, caller='Visu')
+    update_time = time.perf_counter() - start
+    updates = args.rounds * len(items)
+
+    print('items       : {items} ({speakers} speakers x {per})'.format(items=len(items), speakers=args.speakers,
+                                                                       per=args.items))
+    print('parse       : {ms:.2f} ms'.format(ms=parse_time * 1000))
+    print('updates     : {updates} ({sent} commands built)'.format(updates=updates, sent=plugin._dispatcher.count))
+    print('per update  : {us:.2f} us'.format(us=update_time / updates * 1000000))
+    print('updates/s   : {ups:.0f}'.format(ups=updates / update_time))
+
+
+if __name__ == '__main__':
+    main()
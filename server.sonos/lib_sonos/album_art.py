@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import collections
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future
+import requests
+from lib_sonos import definitions
+from lib_sonos import utils
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger('')
+
+# the cache used by the broker, None if the album art proxy is disabled
+album_art_cache = None
+
+# the keys created by AlbumArtCache.key(), nothing else is accepted as a file name
+KEY_PATTERN = re.compile('[0-9a-f]{40}')
+
+
+def proxy_url(uri):
+    """
+    Returns the url of the cached album art or the uri itself, if the album art proxy is disabled.
+    """
+    if album_art_cache is None or not uri:
+        return uri
+    return album_art_cache.register(uri)
+
+
+def _content_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    return 'image/jpeg'
+
+
+class AlbumArtEntry():
+    def __init__(self, data):
+        self.data = data
+        self.content_type = _content_type(data)
+        self.etag = '"{hash}"'.format(hash=hashlib.md5(data).hexdigest())
+
+
+class AlbumArtCache():
+    """
+    Caches the album art images of the speakers on disk and in memory (LRU). The images are fetched only once from the
+    speakers, concurrent requests for the same image are coalesced. Thumbnails are created for the configured sizes
+    (requires Pillow).
+    Only uris sent to the clients by the broker are fetched, the cache must not be abused as an open proxy.
+    """
+
+    def __init__(self, base_url, folder=definitions.ALBUM_ART_PATH, sizes=None,
+                 memory_items=definitions.ALBUM_ART_MEMORY_ITEMS, quota=definitions.ALBUM_ART_QUOTA,
+                 timeout=definitions.ALBUM_ART_TIMEOUT):
+        self._base_url = base_url.rstrip('/')
+        self._folder = folder
+        self._sizes = frozenset(sizes or ())
+        self._memory_items = memory_items
+        self._quota = quota
+        self._timeout = timeout
+        self._uris = collections.OrderedDict()
+        self._memory = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+
+        if self._sizes and Image is None:
+            logger.warning('Pillow is not installed, album art thumbnails are disabled!')
+            self._sizes = frozenset()
+        os.makedirs(self._folder, exist_ok=True)
+
+    @property
+    def sizes(self):
+        return self._sizes
+
+    @staticmethod
+    def key(uri):
+        return hashlib.sha1(uri.encode('utf-8')).hexdigest()
+
+    def register(self, uri):
+        """
+        Registers an album art uri and returns the proxy url.
+        """
+        key = self.key(uri)
+        with self._lock:
+            self._uris[key] = uri
+            self._uris.move_to_end(key)
+            while len(self._uris) > definitions.ALBUM_ART_MAX_URIS:
+                self._uris.popitem(last=False)
+        return '{base}/albumart/{key}'.format(base=self._base_url, key=key)
+
+    def is_registered(self, key):
+        """
+        Only the keys of uris sent to the clients are served. Checked before the key is used as a file name.
+        """
+        if not isinstance(key, str) or KEY_PATTERN.fullmatch(key) is None:
+            return False
+        with self._lock:
+            return key in self._uris
+
+    def _path(self, key, size):
+        return os.path.join(self._folder, key if size is None else '{key}_{size}'.format(key=key, size=size))
+
+    def get(self, key, size=None):
+        """
+        Returns the (resized) album art.
+        :param key: key of a registered uri
+        :param size: one of the configured thumbnail sizes or None for the original image
+        :return: AlbumArtEntry or None, if the key is unknown
+        """
+        if not self.is_registered(key):
+            return None
+        if size is not None and size not in self._sizes:
+            if Image is None:
+                # thumbnails are not available, the clients get the original image
+                size = None
+            else:
+                raise ValueError('Album art size {size} is not configured!'.format(size=size))
+
+        with self._lock:
+            entry = self._memory.get((key, size))
+            if entry is not None:
+                self._memory.move_to_end((key, size))
+                return entry
+            future = self._pending.get((key, size))
+            owner = future is None
+            if owner:
+                future = Future()
+                self._pending[(key, size)] = future
+
+        if not owner:
+            return future.result(self._timeout * 2)
+
+        try:
+            entry = self._load(key, size)
+            if entry is not None:
+                with self._lock:
+                    self._memory[(key, size)] = entry
+                    while len(self._memory) > self._memory_items:
+                        self._memory.popitem(last=False)
+            future.set_result(entry)
+            return entry
+        except Exception as err:
+            future.set_exception(err)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop((key, size), None)
+
+    def _load(self, key, size):
+        path = self._path(key, size)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                # the modification time is used for the disk lru
+                os.utime(path)
+                return AlbumArtEntry(f.read())
+
+        if size is None:
+            with self._lock:
+                uri = self._uris.get(key)
+            if uri is None:
+                return None
+            response = self._session.get(uri, timeout=self._timeout)
+            if response.status_code != 200:
+                raise Exception("Couldn't fetch album art {uri}.\nStatus code: {code}".format(
+                    uri=uri, code=response.status_code))
+            data = response.content
+        else:
+            original = self.get(key)
+            if original is None:
+                return None
+            data = self._thumbnail(original.data, size)
+
+        self._save(path, data)
+        return AlbumArtEntry(data)
+
+    @staticmethod
+    def _thumbnail(data, size):
+        image = Image.open(io.BytesIO(data))
+        image.thumbnail((size, size), Image.LANCZOS if hasattr(Image, 'LANCZOS') else Image.ANTIALIAS)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=85)
+        return output.getvalue()
+
+    def _save(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self._folder)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._enforce_quota()
+
+    def _enforce_quota(self):
+        if utils.get_folder_size(self._folder) <= self._quota * 1024 * 1024:
+            return
+        # remove the least recently used files until the cache is below 90% of the quota
+        files = []
+        for name in os.listdir(self._folder):
+            path = os.path.join(self._folder, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        size = sum(file[1] for file in files)
+        for mtime, file_size, path in files:
+            if size <= self._quota * 1024 * 1024 * 0.9:
+                break
+            try:
+                os.remove(path)
+                size -= file_size
+            except OSError:
+                pass
+
+    def serve(self, handler, key, size=None):
+        """
+        Answers a http GET request with the album art. Supports conditional requests (ETag).
+        """
+        try:
+            entry = self.get(key, size)
+        except ValueError as err:
+            self._send_empty(handler, 400)
+            logger.debug(err)
+            return
+        except Exception as err:
+            logger.warning(err)
+            self._send_empty(handler, 502)
+            return
+
+        if entry is None:
+            self._send_empty(handler, 404)
+            return
+
+        if_none_match = handler.headers.get('If-None-Match')
+        if if_none_match is not None and entry.etag in [tag.strip() for tag in if_none_match.split(',')]:
+            self._send_empty(handler, 304, entry)
+            return
+
+        handler.send_response(200)
+        handler.send_header('Content-Type', entry.content_type)
+        handler.send_header('Content-Length', str(len(entry.data)))
+        self._send_cache_headers(handler, entry)
+        handler.end_headers()
+        handler.wfile.write(entry.data)
+
+    @staticmethod
+    def _send_cache_headers(handler, entry):
+        handler.send_header('ETag', entry.etag)
+        handler.send_header('Cache-Control', 'public, max-age=86400')
+        handler.send_header('Access-Control-Allow-Origin', '*')
+
+    def _send_empty(self, handler, code, entry=None):
+        handler.send_response(code)
+        if entry is not None:
+            self._send_cache_headers(handler, entry)
+        handler.send_header('Content-Length', '0')
+        handler.end_headers()
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import email.utils
+import logging
+import mimetypes
+import os
+import re
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+logger = logging.getLogger('')
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+mimetypes.add_type('audio/mpeg', '.mp3')
+mimetypes.add_type('audio/wav', '.wav')
+
+
+def parse_range(value, size):
+    """
+    Parses a single byte range of a http 'Range' header.
+    :param value: header value, e.g. 'bytes=0-1023', 'bytes=1024-' or 'bytes=-500'
+    :param size: file size in bytes
+    :return: (start, end) both inclusive, None if the range is not satisfiable or False if the header is not
+             supported (the whole file should be sent then)
+    """
+    match = RANGE_PATTERN.match(value.strip())
+    if not match:
+        # multiple ranges or other units are not supported, a server may ignore the header in this case
+        return False
+    first, last = match.groups()
+    if not first and not last:
+        return False
+    if not first:
+        # suffix range: the last n bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class AudioFileHandler(BaseHTTPRequestHandler):
+    """
+    Serves the (tts) audio files from the server's root folder. Supports HEAD, range requests and conditional
+    requests. The payload is sent with sendfile(), so no data is copied into user space.
+    """
+    protocol_version = 'HTTP/1.1'
+    cache_max_age = 86400
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def log_message(self, format, *args):
+        logger.debug("audio server: {client} - {message}".format(client=self.client_address[0], message=format % args))
+
+    def _translate_path(self):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        root = os.path.realpath(self.server.root)
+        abs_path = os.path.realpath(os.path.join(root, path.lstrip('/')))
+        if os.path.commonpath([root, abs_path]) != root:
+            return None
+        return abs_path
+
+    def _send_empty(self, code, headers=None):
+        self.send_response(code)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+            return int(mtime) <= since
+        return False
+
+    def _serve(self, head=False):
+        abs_path = self._translate_path()
+        if abs_path is None or not os.path.isfile(abs_path):
+            self._send_empty(404)
+            return
+
+        try:
+            f = open(abs_path, 'rb')
+        except OSError:
+            self._send_empty(404)
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = '"{mtime:x}-{size:x}"'.format(mtime=int(stat.st_mtime), size=size)
+            last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+            cache_headers = {
+                'ETag': etag,
+                'Last-Modified': last_modified,
+                'Cache-Control': 'public, max-age={age}'.format(age=self.cache_max_age),
+            }
+
+            if self._not_modified(etag, stat.st_mtime):
+                self._send_empty(304, cache_headers)
+                return
+
+            code = 200
+            start, end = 0, size - 1
+            range_header = self.headers.get('Range')
+            if_range = self.headers.get('If-Range')
+            if range_header and size and (if_range is None or if_range.strip() in (etag, last_modified)):
+                byte_range = parse_range(range_header, size)
+                if byte_range is None:
+                    self._send_empty(416, {'Content-Range': 'bytes */{size}'.format(size=size)})
+                    return
+                if byte_range:
+                    start, end = byte_range
+                    code = 206
+            length = end - start + 1 if size else 0
+
+            self.send_response(code)
+            self.send_header('Content-Type', mimetypes.guess_type(abs_path)[0] or 'application/octet-stream')
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            for key, value in cache_headers.items():
+                self.send_header(key, value)
+            if code == 206:
+                self.send_header('Content-Range', 'bytes {start}-{end}/{size}'.format(start=start, end=end, size=size))
+            self.end_headers()
+
+            if head or not length:
+                return
+            try:
+                self.wfile.flush()
+                self.connection.sendfile(f, start, length)
+            except (ConnectionError, OSError) as err:
+                # speakers close the connection after they have buffered enough data, this is uncritical
+                logger.debug("audio server: connection closed by {client}: {err}".format(client=self.client_address[0],
+                                                                                         err=err))
+                self.close_connection = True
+
+
+class AudioServer(socketserver.ThreadingMixIn, HTTPServer):
+    """
+    Threaded http server for the audio files in 'root'.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host, port, root):
+        self.root = root
+        HTTPServer.__init__(self, (host, port), AudioFileHandler)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='AudioServer')
+        thread.daemon = True
+        thread.start()
+        logger.info('audio server listening on {host}:{port}, serving {root}'.format(host=self.server_address[0],
+                                                                                     port=self.server_address[1],
+                                                                                     root=self.root))
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
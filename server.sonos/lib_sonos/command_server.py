@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+import logging
+import selectors
+import socket
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from lib_sonos import album_art
+from lib_sonos import definitions
+from lib_sonos import sonos_commands
+from lib_sonos.push_broker import PushBroker
+
+logger = logging.getLogger('')
+
+
+class SonosHttpHandler(BaseHTTPRequestHandler):
+    """
+    Handles the JSON commands. Every call of handle() answers a single request, the connection is kept open
+    (HTTP/1.1 keep-alive) and PooledHTTPServer hands it back to a worker when the next request arrives. Pipelined
+    requests are processed in order.
+    A GET request to '/events' opens a Server-Sent-Events stream with the status changes of the speakers,
+    '/albumart/<key>' returns a cached album art image.
+    """
+    protocol_version = 'HTTP/1.1'
+    # a request is only handled when its data has arrived, this limits slow clients
+    timeout = definitions.REQUEST_TIMEOUT
+    # headers and body are written separately, avoid the delayed ack stall on persistent connections
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        self.handle_one_request()
+
+    def finish(self):
+        # the connection stays open for the next request, it is closed by the server (close())
+        pass
+
+    def close(self):
+        BaseHTTPRequestHandler.finish(self)
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        if url.path.startswith('/albumart/') and album_art.album_art_cache is not None:
+            self._album_art(url)
+            return
+        if url.path.rstrip('/') != '/events':
+            self.make_response(False, 'Only JSON commands sent by HTTP POST are supported!')
+            return
+
+        query = urllib.parse.parse_qs(url.query)
+        uids = [uid for value in query.get('uids', []) for uid in value.split(',') if uid]
+        attributes = [attribute for value in query.get('attributes', []) for attribute in value.split(',') if attribute]
+        last_event_id = self.headers.get('Last-Event-ID')
+        if last_event_id is not None:
+            try:
+                last_event_id = int(last_event_id)
+            except ValueError:
+                last_event_id = None
+        PushBroker.open_stream(self, uids or None, attributes or None, last_event_id)
+
+    def do_POST(self):
+        try:
+            size = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            self.close_connection = True
+            self.make_response(False, 'Invalid Content-Length header!')
+            return
+        command = self.rfile.read(size).decode('utf-8')
+
+        status, response = sonos_commands.dispatch(command)
+        self.make_response(status, response)
+        logger.debug('Server response -- status: {status} -- response: {response}'.format(status=status,
+                                                                                          response=response))
+
+    def _album_art(self, url):
+        key = url.path[len('/albumart/'):]
+        size = urllib.parse.parse_qs(url.query).get('size', [None])[0]
+        try:
+            size = int(size) if size is not None else None
+        except ValueError:
+            size = -1
+        album_art.album_art_cache.serve(self, key, size)
+
+    def make_response(self, status, response):
+        body = "<html><head><title>Sonos Broker</title></head><body>{response}</body></html>".format(
+            response=response).encode('utf-8')
+        if status:
+            self.send_response(definitions.HTTP_SUCCESS, 'OK')
+        else:
+            self.send_response(definitions.HTTP_ERROR, 'Bad request')
+        self.send_header("Content-type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        if not self.server.keep_alive:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("{client} - {message}".format(client=self.client_address[0], message=format % args))
+
+
+class PooledHTTPServer(HTTPServer):
+    """
+    Handles the requests by a bounded pool of worker threads instead of a new thread per connection. Idle keep-alive
+    connections don't occupy a worker: they wait in a selector and are handed to the pool when their next request
+    arrives. Connections idle for KEEP_ALIVE_TIMEOUT seconds are closed.
+    """
+
+    def __init__(self, server_address, handler_class, workers=definitions.DEFAULT_WORKERS, keep_alive=True):
+        self.keep_alive = keep_alive
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        HTTPServer.__init__(self, server_address, handler_class)
+
+        # the selector is only used by the idle thread, connections to wait for are passed by _parked
+        self._idle = selectors.DefaultSelector()
+        self._parked = []
+        self._parked_lock = threading.Lock()
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._idle.register(self._wakeup_receiver, selectors.EVENT_READ)
+        self._idle_active = True
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='HttpIdleConnections', daemon=True)
+        self._idle_thread.start()
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address, handler=None):
+        try:
+            if handler is None:
+                # the handler answers the first request
+                handler = self.RequestHandlerClass(request, client_address, self)
+            else:
+                handler.handle_one_request()
+        except Exception:
+            self.handle_error(request, client_address)
+            if handler is not None:
+                handler.close_connection = True
+
+        with self._detached_lock:
+            detached = request in self._detached
+            self._detached.discard(request)
+        if handler is None or detached or handler.close_connection or not self._idle_active:
+            self._close(request, handler, detached)
+        elif self._has_data(request, handler):
+            # pipelined request
+            self._executor.submit(self._process_request_worker, request, client_address, handler)
+        else:
+            with self._parked_lock:
+                self._parked.append((request, client_address, handler))
+            self._wakeup()
+
+    @staticmethod
+    def _has_data(request, handler):
+        """
+        Whether the next request has been received (or read ahead by the buffered reader of the handler) already.
+        """
+        try:
+            request.setblocking(False)
+            return bool(handler.rfile.peek(1))
+        except OSError:
+            # the worker finds out what's wrong
+            return True
+        finally:
+            request.settimeout(handler.timeout)
+
+    def _close(self, request, handler, detached=False):
+        if handler is not None:
+            try:
+                handler.close()
+            except OSError:
+                pass
+        if not detached:
+            self.shutdown_request(request)
+
+    def _wakeup(self):
+        try:
+            self._wakeup_sender.send(b'\0')
+        except OSError:
+            pass
+
+    def _watch_idle(self):
+        while self._idle_active:
+            with self._parked_lock:
+                parked, self._parked = self._parked, []
+            deadline = time.monotonic() + definitions.KEEP_ALIVE_TIMEOUT
+            for request, client_address, handler in parked:
+                self._idle.register(request, selectors.EVENT_READ, (client_address, handler, deadline))
+
+            for key, _ in self._idle.select(timeout=1):
+                if key.fileobj is self._wakeup_receiver:
+                    try:
+                        while self._wakeup_receiver.recv(1024):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._idle.unregister(key.fileobj)
+                client_address, handler, _ = key.data
+                try:
+                    self._executor.submit(self._process_request_worker, key.fileobj, client_address, handler)
+                except RuntimeError:
+                    # the server has been closed
+                    self._close(key.fileobj, handler)
+
+            now = time.monotonic()
+            for key in list(self._idle.get_map().values()):
+                if key.data is not None and key.data[2] <= now:
+                    self._idle.unregister(key.fileobj)
+                    self._close(key.fileobj, key.data[1])
+
+        for key in list(self._idle.get_map().values()):
+            if key.data is not None:
+                self._close(key.fileobj, key.data[1])
+        with self._parked_lock:
+            parked, self._parked = self._parked, []
+        for request, client_address, handler in parked:
+            self._close(request, handler)
+        self._idle.close()
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+
+    def detach(self, request):
+        """
+        The connection is handed over to another thread (e.g. an event stream) and must not be closed by the server.
+        """
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        self._idle_active = False
+        self._wakeup()
+        self._executor.shutdown(wait=False)
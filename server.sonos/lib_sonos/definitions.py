@@ -34,6 +34,35 @@ DEFAULT_PID = os.path.join(tempfile.gettempdir(), 'sonos_broker.pid')
 HTTP_SUCCESS = 200
 HTTP_ERROR = 400
 SCAN_TIMEOUT = 180
+DISCOVERY_TIMEOUT = 5
+SPEAKER_REGISTRY_FILE = 'sonos_broker_speakers.json'
+DESCRIPTION_CACHE_FILE = 'sonos_broker_descriptions.json'
 TIMESTAMP_PATTERN = "([0-5]?[0-9]):([0-5]?[0-9]):([0-5][0-9])"
 MB_PLAYLIST = "#so_pl#"
-SUBSCRIPTION_TIMEOUT = 120
\ No newline at end of file
+SUBSCRIPTION_TIMEOUT = 120
+DEFAULT_TTS_ENGINE = 'google'
+DEFAULT_TTS_WORKERS = 2
+TTS_TIMEOUT = 30
+BATCH_WORKERS = 8
+DEFAULT_WORKERS = 16
+KEEP_ALIVE_TIMEOUT = 30
+REQUEST_TIMEOUT = 5
+PUSH_QUEUE_SIZE = 256
+PUSH_REPLAY_SIZE = 1024
+PUSH_PING_INTERVAL = 15
+PUSH_SEND_TIMEOUT = 10
+ALBUM_ART_PATH = '/tmp/sonos_broker_album_art'
+ALBUM_ART_MEMORY_ITEMS = 100
+ALBUM_ART_QUOTA = 50
+ALBUM_ART_MAX_URIS = 10000
+ALBUM_ART_TIMEOUT = 10
+MUSIC_INDEX_CHECK_INTERVAL = 300
+MUSIC_INDEX_PAGE_SIZE = 100
+MUSIC_INDEX_RETRY_INTERVAL = 10
+MUSIC_INDEX_WINDOW = 4
+FAVORITES_PAGE_SIZE = 100
+FAVORITES_MAX_PAGES = 32
+RADIO_RULES_CFG = 'radio_rules.cfg'
+RADIO_RULES_CHECK_INTERVAL = 10
+RADIO_PARSER_MEMO_SIZE = 1024
+RADIO_PARSER_MAX_STATIONS = 256
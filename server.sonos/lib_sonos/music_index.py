@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+import bisect
+import collections
+import logging
+import re
+import threading
+import time
+import urllib.parse
+from lib_sonos import definitions
+from lib_sonos.sonos_library import SonosLibrary
+
+logger = logging.getLogger('')
+
+# the index used by the broker, None if the music library index is disabled
+music_index = None
+
+TOKEN_PATTERN = re.compile(r'\w+')
+LIBRARY_TRACKS = 'A:TRACKS'
+# ContentDirectory containers of the music library (A: the library index, S: the shares)
+LIBRARY_CONTAINERS = ('A:', 'S:')
+
+Track = collections.namedtuple('Track', 'item_id uri title artist album track_number album_art')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold()) if text else []
+
+
+def _track_from_didl(item):
+    resources = getattr(item, 'resources', None)
+    track_number = getattr(item, 'original_track_number', None)
+    return Track(
+        item_id=item.item_id,
+        uri=resources[0].uri if resources else '',
+        title=getattr(item, 'title', '') or '',
+        artist=getattr(item, 'creator', '') or '',
+        album=getattr(item, 'album', '') or '',
+        track_number=track_number if track_number is not None else 0,
+        album_art=getattr(item, 'album_art_uri', '') or '')
+
+
+class IndexSnapshot():
+    """
+    Immutable search structures of one library version. Queries always work on a complete snapshot, a new snapshot
+    is swapped in after it has been built.
+    """
+
+    def __init__(self, tracks, version):
+        self.version = version
+        self.tracks = sorted(tracks, key=lambda t: (t.artist.casefold(), t.album.casefold(), t.track_number,
+                                                    t.title.casefold()))
+
+        postings = collections.defaultdict(set)
+        albums = collections.OrderedDict()
+        for track_id, track in enumerate(self.tracks):
+            for token in set(tokenize(track.title) + tokenize(track.artist) + tokenize(track.album)):
+                postings[token].add(track_id)
+            albums.setdefault(track.artist, collections.OrderedDict()).setdefault(track.album, []).append(track_id)
+
+        self.postings = dict(postings)
+        self.tokens = sorted(self.postings)
+        # artist -> album -> track ids, in library order
+        self.albums = albums
+        self.artists = list(albums)
+        self.artist_keys = [artist.casefold() for artist in self.artists]
+        self.album_list = [(artist, album) for artist, artist_albums in albums.items() for album in artist_albums]
+        self.album_keys = [album.casefold() for artist, album in self.album_list]
+
+    def _prefix_ids(self, prefix):
+        """
+        Returns the ids of all tracks with a token starting with 'prefix'.
+        """
+        exact = self.postings.get(prefix)
+        start = bisect.bisect_left(self.tokens, prefix)
+        end = bisect.bisect_left(self.tokens, prefix + '\U0010ffff', start)
+        if end - start == 1 and exact is not None:
+            return exact
+        ids = set()
+        for token in self.tokens[start:end]:
+            ids |= self.postings[token]
+        return ids
+
+    def search_tracks(self, term):
+        """
+        Returns the sorted ids of all tracks matching the search term.
+        """
+        tokens = tokenize(term)
+        if not tokens:
+            return []
+        # all tokens have to match, the last token may be incomplete (search as you type)
+        candidates = [self.postings.get(token, set()) for token in tokens[:-1]]
+        candidates.append(self._prefix_ids(tokens[-1]))
+        candidates.sort(key=len)
+        ids = candidates[0]
+        for other in candidates[1:]:
+            ids = ids & other
+            if not ids:
+                break
+        return sorted(ids)
+
+
+def _container_filter(container_id):
+    """
+    Returns a function selecting the tracks of the indexed album container 'A:ALBUM/<album>' or
+    'A:ARTIST/<artist>/<album>', None for any other container (e.g. the whole library or a share).
+    """
+    parts = [urllib.parse.unquote(part) for part in container_id.split('/')]
+    if parts[0] == 'A:ALBUM' and len(parts) == 2 and parts[1]:
+        album = parts[1]
+        return lambda track: track.album == album
+    if parts[0] == 'A:ARTIST' and len(parts) == 3 and parts[1] and parts[2]:
+        artist, album = parts[1:]
+        return lambda track: track.artist == artist and track.album == album
+    return None
+
+
+def _page(items, start_item, max_items):
+    return items[start_item:start_item + max_items]
+
+
+def track_to_dict(track):
+    return track._asdict()
+
+
+class MusicIndex():
+    """
+    In-memory index of the music library (local shares). The index is built from the paged browse results of a
+    speaker. It is updated in the background when the ContentDirectory events of the household (subscribed by
+    SonosLibrary) report changed library containers: only the tracks of a changed album container are fetched again,
+    a change of the whole library or of a share rebuilds the index.
+    Every 'check_interval' seconds the update id and the number of tracks of the library are compared with the index
+    (a single browse request for one item), this catches changes while no event subscription was active.
+    """
+
+    def __init__(self, check_interval=definitions.MUSIC_INDEX_CHECK_INTERVAL,
+                 page_size=definitions.MUSIC_INDEX_PAGE_SIZE):
+        self._check_interval = check_interval
+        self._page_size = page_size
+        self._snapshot = IndexSnapshot([], None)
+        self._sync_lock = threading.Lock()
+        self._thread = None
+        self._last_sync = None
+        # container id -> update id of the last ContentDirectory event
+        self._update_ids = {}
+        self._changed = set()
+        self._check = False
+        self._changes_lock = threading.Lock()
+        self._wakeup = threading.Event()
+
+    @staticmethod
+    def _get_soco():
+        # the music library of the same household as the favorites
+        for speaker in SonosLibrary.household_speakers():
+            if speaker.status:
+                return speaker.soco
+        raise Exception('No speaker online to browse the music library!')
+
+    @staticmethod
+    def library_version(soco):
+        """
+        Returns the (update id, number of tracks) of the music library.
+        """
+        response, metadata = soco._music_lib_search(LIBRARY_TRACKS, 0, 1)
+        return metadata['update_id'], metadata['total_matches']
+
+    def _fetch_tracks(self, soco):
+        # the didl objects are converted page by page, only the compact track records are kept
+        return [_track_from_didl(item) for item in soco.browse_items(LIBRARY_TRACKS, page_size=self._page_size,
+                                                                     window=definitions.MUSIC_INDEX_WINDOW)]
+
+    def sync(self, force=False):
+        """
+        Rebuilds the index, if the music library has changed since the last sync.
+        :return: True, if the index was rebuilt
+        """
+        with self._sync_lock:
+            soco = self._get_soco()
+            version = self.library_version(soco)
+            self._last_sync = time.time()
+            if not force and version == self._snapshot.version:
+                return False
+            self._rebuild(soco, version)
+            return True
+
+    def _rebuild(self, soco, version):
+        start = time.time()
+        tracks = self._fetch_tracks(soco)
+        self._snapshot = IndexSnapshot(tracks, version)
+        logger.info('music library index rebuilt: {count} tracks in {duration:.1f}s'.format(
+            count=len(tracks), duration=time.time() - start))
+
+    def update(self, container_ids):
+        """
+        Updates the index after the given library containers have changed. The tracks of album containers are
+        replaced by the current tracks of these containers, any other change rebuilds the index.
+        """
+        with self._sync_lock:
+            soco = self._get_soco()
+            filters = [_container_filter(container_id) for container_id in container_ids]
+            if self._snapshot.version is None or None in filters:
+                version = self.library_version(soco)
+                self._last_sync = time.time()
+                self._rebuild(soco, version)
+                return
+
+            start = time.time()
+            tracks = [track for track in self._snapshot.tracks if not any(selects(track) for selects in filters)]
+            removed = len(self._snapshot.tracks) - len(tracks)
+            count = len(tracks)
+            for container_id in container_ids:
+                tracks.extend(_track_from_didl(item) for item in soco.browse_items(
+                    container_id, page_size=self._page_size, window=definitions.MUSIC_INDEX_WINDOW))
+            version = self.library_version(soco)
+            self._last_sync = time.time()
+            self._snapshot = IndexSnapshot(tracks, version)
+            logger.info('music library index updated: {containers} container(s), {removed} tracks removed, {added} '
+                        'added in {duration:.1f}s'.format(containers=len(container_ids), removed=removed,
+                                                          added=len(tracks) - count, duration=time.time() - start))
+
+    def handle_ContentDirectory_event(self, variables):
+        """
+        Called with the ContentDirectory events of the household. 'ContainerUpdateIDs' is a comma separated list of
+        container ids and update ids, e.g. 'A:ALBUM/Abbey%20Road,12,S:,3'. The update runs in the index thread.
+        """
+        value = variables.get('container_update_i_ds')
+        if not value:
+            return
+        parts = value.split(',')
+        with self._changes_lock:
+            for container_id, update_id in zip(parts[0::2], parts[1::2]):
+                if not container_id.startswith(LIBRARY_CONTAINERS):
+                    continue
+                known = self._update_ids.get(container_id)
+                self._update_ids[container_id] = update_id
+                if known is None:
+                    # the first event of a subscription reports all containers, compare the library version only
+                    self._check = True
+                elif known != update_id:
+                    self._changed.add(container_id)
+            if self._changed or self._check:
+                self._wakeup.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='MusicIndex')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        interval = 0
+        while True:
+            self._wakeup.wait(interval)
+            with self._changes_lock:
+                self._wakeup.clear()
+                changed, self._changed = self._changed, set()
+                self._check = False
+            interval = self._check_interval
+            try:
+                if changed:
+                    self.update(sorted(changed))
+                else:
+                    self.sync()
+            except Exception as err:
+                logger.warning('Could not update the music library index: {err}'.format(err=err))
+                # e.g. no speaker discovered yet
+                interval = min(interval, definitions.MUSIC_INDEX_RETRY_INTERVAL)
+                with self._changes_lock:
+                    # retried with the next changes
+                    self._changed |= changed
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'tracks': len(snapshot.tracks),
+            'artists': len(snapshot.artists),
+            'albums': len(snapshot.album_list),
+            'update_id': snapshot.version[0] if snapshot.version else None,
+            'last_sync': self._last_sync
+        }
+
+    def search(self, term, search_type='tracks', start_item=0, max_items=100):
+        """
+        Searches the index. Tracks match if all words of 'term' are part of the title, artist or album (the last word
+        may be incomplete), artists and albums match if their name contains 'term'.
+        :param search_type: tracks, artists or albums
+        :return: dict with 'total_matches' and the 'items' of the requested page
+        """
+        snapshot = self._snapshot
+        if search_type == 'tracks':
+            matches = snapshot.search_tracks(term)
+            items = [track_to_dict(snapshot.tracks[track_id]) for track_id in _page(matches, start_item, max_items)]
+        elif search_type == 'artists':
+            key = term.casefold()
+            matches = [artist for artist, artist_key in zip(snapshot.artists, snapshot.artist_keys)
+                       if key in artist_key]
+            items = _page(matches, start_item, max_items)
+        elif search_type == 'albums':
+            key = term.casefold()
+            matches = [album for album, album_key in zip(snapshot.album_list, snapshot.album_keys) if key in album_key]
+            items = [{'artist': artist, 'album': album} for artist, album in _page(matches, start_item, max_items)]
+        else:
+            raise ValueError("Unknown search type '{type}'!".format(type=search_type))
+        return {'total_matches': len(matches), 'items': items}
+
+    def browse(self, artist=None, album=None, start_item=0, max_items=100):
+        """
+        Browses the index: without parameters all artists are returned, with 'artist' all albums of the artist and
+        with 'artist' and 'album' all tracks of the album.
+        :return: dict with 'total_matches' and the 'items' of the requested page
+        """
+        snapshot = self._snapshot
+        if artist is None:
+            matches = snapshot.artists
+            items = _page(matches, start_item, max_items)
+        elif artist not in snapshot.albums:
+            matches, items = [], []
+        elif album is None:
+            matches = list(snapshot.albums[artist])
+            items = _page(matches, start_item, max_items)
+        else:
+            matches = snapshot.albums[artist].get(album, [])
+            items = [track_to_dict(snapshot.tracks[track_id]) for track_id in _page(matches, start_item, max_items)]
+        return {'total_matches': len(matches), 'items': items}
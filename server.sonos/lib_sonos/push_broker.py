@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import collections
+import json
+import logging
+import queue
+import socket
+import threading
+from lib_sonos import definitions
+from lib_sonos.udp_broker import ClientFilter
+
+logger = logging.getLogger('')
+event_streams = set()
+_streams_lock = threading.RLock()
+
+# the last events for clients resuming a stream with 'Last-Event-ID'
+_replay = collections.deque(maxlen=definitions.PUSH_REPLAY_SIZE)
+_event_id = 0
+
+
+def _encode(event_id, values):
+    data = json.dumps(values, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return 'id: {id}\nevent: update\ndata: {data}\n\n'.format(id=event_id, data=data).encode('utf-8')
+
+
+class EventStream():
+    """
+    A Server-Sent-Events connection. The events are written by a dedicated thread from a bounded queue, so a slow
+    client never blocks the speakers. If the queue is full, the client is considered too slow and disconnected. It can
+    reconnect with the 'Last-Event-ID' header and gets the missed events from the replay buffer.
+    """
+
+    def __init__(self, sock, address, client_filter):
+        self._sock = sock
+        self.address = address
+        self.filter = client_filter
+        self._queue = queue.Queue(maxsize=definitions.PUSH_QUEUE_SIZE)
+        self._closed = False
+        self._thread = threading.Thread(target=self._writer, name='EventStream')
+        self._thread.daemon = True
+
+    def start(self):
+        self._thread.start()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def put(self, data):
+        try:
+            self._queue.put_nowait(data)
+        except queue.Full:
+            logger.warning('event stream {client}: slow consumer, closing connection'.format(client=self.address))
+            self.close()
+
+    def _writer(self):
+        self._sock.settimeout(definitions.PUSH_SEND_TIMEOUT)
+        try:
+            while not self._closed:
+                try:
+                    data = self._queue.get(timeout=definitions.PUSH_PING_INTERVAL)
+                except queue.Empty:
+                    # comment line, keeps proxies from closing the connection and detects dead clients
+                    data = b': ping\n\n'
+                if data is None:
+                    break
+                self._sock.sendall(data)
+        except (socket.error, socket.timeout) as err:
+            logger.debug('event stream {client}: connection closed: {err}'.format(client=self.address, err=err))
+        finally:
+            PushBroker.unregister(self)
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._sock.close()
+
+    def close(self):
+        self._closed = True
+        PushBroker.unregister(self)
+        try:
+            # wake up the writer
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+
+class PushBroker():
+    @staticmethod
+    def register(stream, last_event_id=None):
+        """
+        Registers an event stream. If 'last_event_id' is given, all later events still in the replay buffer are
+        queued first. If the buffer does not reach back far enough, a 'resync' event is sent: the client has to request
+        the current state.
+        """
+        with _streams_lock:
+            if last_event_id is not None:
+                if _replay and _replay[0][0] > last_event_id + 1 or last_event_id > _event_id:
+                    stream.put('event: resync\ndata: {}\n\n'.encode('utf-8'))
+                else:
+                    for event_id, values in _replay:
+                        if event_id > last_event_id:
+                            selected = stream.filter.select(values)
+                            if selected is not None:
+                                stream.put(_encode(event_id, selected))
+            if stream.closed:
+                return
+            event_streams.add(stream)
+        logger.info('event stream registered: {client} -- filter: {filter}'.format(client=stream.address,
+                                                                                 filter=stream.filter))
+
+    @staticmethod
+    def unregister(stream):
+        with _streams_lock:
+            if stream not in event_streams:
+                return
+            event_streams.discard(stream)
+        logger.info('event stream unregistered: {client}'.format(client=stream.address))
+
+    @staticmethod
+    def publish(values):
+        """
+        Queues the values of a speaker for all event streams matching the values. Events are encoded once per
+        distinct filter.
+        :param values: dict with the changed values, must contain the speaker 'uid'
+        """
+        global _event_id
+        # queuing never blocks, so all streams get the events in the order of the event ids
+        with _streams_lock:
+            _event_id += 1
+            _replay.append((_event_id, values))
+
+            encoded = {}
+            for stream in list(event_streams):
+                selected = stream.filter.select(values)
+                if selected is None:
+                    continue
+                if stream.filter.key not in encoded:
+                    encoded[stream.filter.key] = _encode(_event_id, selected)
+                stream.put(encoded[stream.filter.key])
+
+    @staticmethod
+    def open_stream(handler, uids=None, attributes=None, last_event_id=None):
+        """
+        Answers a http request with an event stream. The connection is detached from the http server and served by
+        the stream's writer thread.
+        """
+        handler.send_response(definitions.HTTP_SUCCESS, 'OK')
+        handler.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.send_header('Access-Control-Allow-Origin', '*')
+        handler.end_headers()
+        handler.wfile.flush()
+
+        stream = EventStream(handler.request, handler.client_address[0], ClientFilter(uids, attributes))
+        PushBroker.register(stream, last_event_id)
+        handler.close_connection = True
+        handler.server.detach(handler.request)
+        stream.start()
+        return stream
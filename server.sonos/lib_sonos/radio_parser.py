@@ -1,60 +1,178 @@
-import re
+import configparser
+import functools
 import logging
+import os
+import re
+import string
+import threading
+import time
+from lib_sonos import definitions
 
 logger = logging.getLogger('')
 
-# dictionary: pattern_station : [ pattern_track_artist_1, pattern_track_artist_2, ...]
-# ALWAYS use a named group for track and artist
 
-radio_list = {
-    ## SWR3 ##
-    re.compile(r"swr3*.?", re.IGNORECASE):  [re.compile(r"(?P<track>.*?)/(?P<artist>.*?)", re.IGNORECASE)],
-    ## 104.6 RTL ##
-    re.compile(r"104\.6 rtl*.?", re.IGNORECASE):  [re.compile(r"(?P<artist>.*)::(?P<track>.*)", re.IGNORECASE)],
-}
+class RadioRule():
+    """
+    Splits the stream titles of the radio stations whose name matches 'station'. The patterns are tried in order, they
+    have to match the whole stream title and need the named groups 'artist' and 'title'.
+    """
+
+    def __init__(self, name, station, patterns, ignore=(), title_case=False):
+        self.name = name
+        self.station = re.compile(station, re.IGNORECASE)
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+        for pattern in self.patterns:
+            if not {'artist', 'title'} <= set(pattern.groupindex):
+                raise ValueError("Pattern '{pattern}' of rule '{name}' needs the groups 'artist' and 'title'!".format(
+                    pattern=pattern.pattern, name=name))
+        # stream titles without track information, e.g. news or commercials
+        self.ignore = tuple(prefix.lower() for prefix in ignore)
+        self.title_case = title_case
+
+
+def split_title(stream_content):
+    """
+    Default for stations without a rule: 'artist - title'. A hyphen without spaces is only used, if it is the only one
+    (e.g. 'Jay-Z - Empire State Of Mind', but 'Artist-Title').
+    """
+    artist, separator, title = stream_content.partition(' - ')
+    if not separator:
+        parts = stream_content.split('-')
+        if len(parts) != 2:
+            return '', stream_content
+        artist, title = parts
+    return artist, title
+
+
+class RadioRules():
+    """
+    An immutable set of rules. The rule of a station is looked up once per station name, the results of parse() are
+    memoised, because a speaker sends the same stream title with every event until the track changes.
+    """
+
+    def __init__(self, rules=(), title_case=False, memo_size=definitions.RADIO_PARSER_MEMO_SIZE):
+        self.rules = list(rules)
+        self.title_case = title_case
+        # station name -> rule, None if no rule matches
+        self._stations = {}
+        self.parse = functools.lru_cache(maxsize=memo_size)(self._parse)
+
+    @classmethod
+    def from_file(cls, path, memo_size=definitions.RADIO_PARSER_MEMO_SIZE):
+        """
+        Loads the rules from a config file, every section is a rule (see radio_rules.cfg).
+        """
+        config = configparser.ConfigParser(interpolation=None)
+        with open(path, encoding='utf-8') as f:
+            config.read_file(f)
+        rules = []
+        for name in config.sections():
+            section = config[name]
+            if 'station' not in section or 'patterns' not in section:
+                raise ValueError("Rule '{name}' needs the options 'station' and 'patterns'!".format(name=name))
+            rules.append(RadioRule(name, section['station'], _lines(section['patterns']),
+                                   _lines(section.get('ignore', '')), section.getboolean('title_case', False)))
+        title_case = config.getboolean(config.default_section, 'title_case', fallback=False)
+        return cls(rules, title_case, memo_size)
+
+    def rule(self, radio_station):
+        try:
+            return self._stations[radio_station]
+        except KeyError:
+            pass
+        rule = next((rule for rule in self.rules if rule.station.match(radio_station)), None)
+        if len(self._stations) >= definitions.RADIO_PARSER_MAX_STATIONS:
+            self._stations.clear()
+        self._stations[radio_station] = rule
+        return rule
+
+    def _parse(self, radio_station, stream_content):
+        rule = self.rule(radio_station)
+        title_case = self.title_case
+        artist, title = None, None
+        if rule is not None:
+            title_case = rule.title_case
+            if stream_content.lower().startswith(rule.ignore):
+                artist, title = '', stream_content
+            else:
+                for pattern in rule.patterns:
+                    match = pattern.fullmatch(stream_content)
+                    if match:
+                        artist, title = match.group('artist'), match.group('title')
+                        break
+        if artist is None:
+            artist, title = split_title(stream_content)
+
+        artist, title = artist.strip(), title.strip()
+        if title_case:
+            return string.capwords(artist), string.capwords(title)
+        return artist, title
+
+
+def _lines(value):
+    return [line.strip() for line in value.splitlines() if line.strip()]
+
+
+class RadioParser():
+    """
+    Holds the rules of a config file. The file is checked for changes every 'check_interval' seconds and reloaded, if it
+    was modified. Invalid rules are logged, the previous rules are kept.
+    """
+
+    def __init__(self, path=None, check_interval=definitions.RADIO_RULES_CHECK_INTERVAL,
+                 memo_size=definitions.RADIO_PARSER_MEMO_SIZE):
+        self._path = path
+        self._check_interval = check_interval
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0
+        self._rules = RadioRules(memo_size=memo_size)
+
+    @property
+    def rules(self):
+        now = time.monotonic()
+        if self._path is not None and now >= self._next_check:
+            self._check(now)
+        return self._rules
+
+    def _check(self, now):
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + self._check_interval
+            try:
+                mtime = os.stat(self._path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self._mtime:
+                return
+            self._mtime = mtime
+            if mtime is None:
+                logger.warning('Radio rules file {path} not found!'.format(path=self._path))
+                return
+            try:
+                self._rules = RadioRules.from_file(self._path, self._memo_size)
+                logger.info('{count} radio rules loaded from {path}'.format(count=len(self._rules.rules),
+                                                                           path=self._path))
+            except Exception as err:
+                logger.warning('Could not load the radio rules from {path}, keeping the previous rules: {err}'.format(
+                    path=self._path, err=err))
+
+    def parse(self, radio_station, stream_content):
+        """
+        :return: (artist, title) of a stream title
+        """
+        return self.rules.parse(radio_station or '', stream_content)
+
+
+# the parser used by the broker, the rules file is set at startup
+radio_parser = RadioParser()
 
 
 def title_artist_parser(radio_station, track_artist):
-
-    artist = ''
-    track = track_artist
-    found = False
-
     try:
-
-        for pattern_station, patterns_track in radio_list.items():
-
-            station_match = pattern_station.match(radio_station)
-
-            if station_match:
-                for pattern_track in patterns_track:
-                    track_match = pattern_track.match(track_artist)
-
-                    if track_match:
-                        artist = track_match.group('artist')
-                        track = track_match.group('track')
-                        found = True
-                        break
-
-                break
-
-        #no special parser, just try to split the radio string with '-'
-        if not found:
-            split_title = track_artist.split('-')
-
-            if len(split_title) == 2:
-
-                if split_title:
-                    if len(split_title) == 2:
-                            artist = split_title[0].strip()
-                            track = split_title[1].strip()
-
-                    # mostly this happens during commercial breaks, news, weather etc
-                    if len(split_title) > 2:
-                        artist = split_title[0].strip()
-                        track = '-'.join(split_title[1:])
-
+        return radio_parser.parse(radio_station, track_artist)
     except Exception as err:
         logger.exception(err)
-    finally:
-        return artist.strip().title(), track.strip().title()
\ No newline at end of file
+        return '', track_artist.strip()
@@ -2,51 +2,62 @@ import json
 from abc import ABCMeta, abstractmethod
 import logging
 import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import soco
 from lib_sonos.sonos_library import SonosLibrary
-from lib_sonos.definitions import TIMESTAMP_PATTERN, SCAN_TIMEOUT
-from lib_sonos.udp_broker import UdpBroker
+from lib_sonos.definitions import TIMESTAMP_PATTERN, SCAN_TIMEOUT, BATCH_WORKERS
+from lib_sonos.udp_broker import UdpBroker, ClientFilter
 from soco.exceptions import SoCoUPnPException
 from lib_sonos import sonos_speaker
+from lib_sonos import music_index
 from lib_sonos import utils
-from lib_sonos.utils import underscore_to_camel
+from lib_sonos.utils import camel_to_underscore
 
 logger = logging.getLogger('')
 
 
-class MyDecoder(json.JSONDecoder):
-    def decode(self, json_string):
-        obj = json.loads(json_string)
-        module = __import__(__name__, fromlist=['sonos.json_commands'])
-
-        '''
-         class name must be camel case, convert it
-        '''
-        class_name = underscore_to_camel(obj['command'])
-        class_ = getattr(module, class_name)
-
-        if 'parameter' in obj:
-            instance = class_(obj['parameter'])
-        else:
-            instance = class_(obj)
-        return instance
-
-
 class JsonCommandBase():
     __metaclass__ = ABCMeta
 
+    # parameter schema: all other parameters are ignored
+    required = ()
+    optional = ()
+
     def __init__(self, parameter=None):
         self._status = False
         self._response = ''
 
         if parameter is not None:
-            for key, value in parameter.items():
-                setattr(self, key, value)
+            for key in self.required + self.optional:
+                if key in parameter:
+                    setattr(self, key, parameter[key])
 
     @abstractmethod
     def run(self):
         raise NotImplementedError("Method 'run' must be implemented!")
 
+    @classmethod
+    def validate(cls, parameter):
+        """
+        Checks the parameters against the command schema.
+        :param parameter: dictionary with all parameters
+        :return: an error message or None, if all required parameters are given
+        """
+        if not isinstance(parameter, dict):
+            return 'Parameters have to be a JSON object!'
+        for key in cls.required:
+            if key not in parameter:
+                return "Missing parameter '{parameter}'!".format(parameter=key)
+        unknown = [key for key in parameter if key not in cls.required and key not in cls.optional and
+                   key != 'command']
+        if unknown:
+            logger.debug('COMMAND {classname} -- ignoring unknown parameters: {unknown}'.format(
+                classname=cls.__name__, unknown=', '.join(unknown)))
+        return None
+
     @staticmethod
     def missing_param_error(err):
         s_args = list(filter(None, err.args[0].split("'")))
@@ -56,6 +67,9 @@ class JsonCommandBase():
 ### CLIENT SUBSCRIBE / UNSUBSCRIE ######################################################################################
 
 class ClientSubscribe(JsonCommandBase):
+    required = ('ip', 'port')
+    optional = ('uids', 'attributes', 'max_rate')
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -74,7 +88,24 @@ class ClientSubscribe(JsonCommandBase):
             if not utils.ip_address_is_valid(self.ip):
                 raise Exception('IP address \'{ip}\' is not valid.'.format(ip=self.ip))
 
-            UdpBroker.subscribe_client(self.ip, self.port)
+            uids = getattr(self, 'uids', None)
+            if uids is not None and not isinstance(uids, list):
+                raise Exception('The parameter \'uids\' has to be a list of speaker uids!')
+
+            attributes = getattr(self, 'attributes', None)
+            if attributes is not None and not isinstance(attributes, list):
+                raise Exception('The parameter \'attributes\' has to be a list of speaker attributes!')
+
+            max_rate = getattr(self, 'max_rate', None)
+            if max_rate is not None:
+                try:
+                    max_rate = float(max_rate)
+                except (TypeError, ValueError):
+                    raise Exception('Parameter \'max_rate\' has to be a number!')
+                if max_rate < 0:
+                    raise Exception('Parameter \'max_rate\' must not be negative!')
+
+            UdpBroker.subscribe_client(self.ip, port, ClientFilter(uids, attributes, max_rate))
             self._status = True
         except AttributeError as err:
             self._response = JsonCommandBase.missing_param_error(err)
@@ -85,6 +116,9 @@ class ClientSubscribe(JsonCommandBase):
 
 
 class ClientUnsubscribe(JsonCommandBase):
+    required = ('ip', 'port')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -116,6 +150,9 @@ class ClientUnsubscribe(JsonCommandBase):
 ### CURRENT STATE ######################################################################################################
 
 class CurrentState(JsonCommandBase):
+    required = ('uid',)
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -146,9 +183,53 @@ class CurrentState(JsonCommandBase):
             return self._status, self._response
 
 
+class GetStateVersions(JsonCommandBase):
+    required = ()
+    optional = ('uids', 'ip', 'port')
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            logger.debug('COMMAND {classname} -- attributes: {attributes}'.format(classname=self.__class__.__name__,
+                                                                                  attributes=utils.dump_attributes(
+                                                                                      self)))
+            uids = None
+            if hasattr(self, 'uids'):
+                if not isinstance(self.uids, list):
+                    raise Exception('The parameter \'uids\' has to be a list of speaker uids!')
+                uids = [uid.lower() for uid in self.uids]
+
+            # a subscribed client gets the versions of the last messages sent to it, updates skipped by its filter
+            # don't count
+            client_filter = None
+            if hasattr(self, 'ip') and hasattr(self, 'port'):
+                if not utils.check_int(self.port):
+                    raise Exception('Port \'{port}\' is not an Integer!'.format(port=self.port))
+                client_filter = UdpBroker.client_filter(self.ip, int(self.port))
+
+            versions = {}
+            for uid, speaker in sonos_speaker.sonos_speakers.items():
+                if uids is not None and uid not in uids:
+                    continue
+                versions[uid] = speaker.state_version
+                if client_filter is not None:
+                    versions[uid] = client_filter.delivered_version(uid, versions[uid])
+            self._response = utils.to_json(versions)
+            self._status = True
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
 ### VOLUME #############################################################################################################
 
 class GetVolume(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -175,6 +256,9 @@ class GetVolume(JsonCommandBase):
 
 
 class SetVolume(JsonCommandBase):
+    required = ('uid', 'volume')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -218,6 +302,9 @@ class SetVolume(JsonCommandBase):
 # ## VOLUME UP ##########################################################################################################
 
 class VolumeUp(JsonCommandBase):
+    required = ('uid',)
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -254,6 +341,9 @@ class VolumeUp(JsonCommandBase):
 ### VOLUME DOWN ########################################################################################################
 
 class VolumeDown(JsonCommandBase):
+    required = ('uid',)
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -290,6 +380,9 @@ class VolumeDown(JsonCommandBase):
 ### MAX VOLUME #########################################################################################################
 
 class GetMaxVolume(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -316,6 +409,9 @@ class GetMaxVolume(JsonCommandBase):
 
 
 class SetMaxVolume(JsonCommandBase):
+    required = ('uid', 'max_volume')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -364,6 +460,9 @@ class SetMaxVolume(JsonCommandBase):
 ### MUTE ###############################################################################################################
 
 class GetMute(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -390,6 +489,9 @@ class GetMute(JsonCommandBase):
 
 
 class SetMute(JsonCommandBase):
+    required = ('uid', 'mute')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -426,6 +528,9 @@ class SetMute(JsonCommandBase):
 ### BASS ###############################################################################################################
 
 class GetBass(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -452,6 +557,9 @@ class GetBass(JsonCommandBase):
 
 
 class SetBass(JsonCommandBase):
+    required = ('uid', 'bass')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -491,6 +599,9 @@ class SetBass(JsonCommandBase):
 ### TREBLE #############################################################################################################
 
 class GetTreble(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -517,6 +628,9 @@ class GetTreble(JsonCommandBase):
 
 
 class SetTreble(JsonCommandBase):
+    required = ('uid', 'treble')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -558,6 +672,9 @@ class SetTreble(JsonCommandBase):
 ### LOUDNESS ###########################################################################################################
 
 class GetLoudness(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -584,6 +701,9 @@ class GetLoudness(JsonCommandBase):
 
 
 class SetLoudness(JsonCommandBase):
+    required = ('uid', 'loudness')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -628,6 +748,9 @@ class SetLoudness(JsonCommandBase):
 ### STOP ###############################################################################################################
 
 class GetStop(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -654,6 +777,9 @@ class GetStop(JsonCommandBase):
 
 
 class SetStop(JsonCommandBase):
+    required = ('uid', 'stop')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -686,6 +812,9 @@ class SetStop(JsonCommandBase):
 ### PLAY ###############################################################################################################
 
 class GetPlay(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -712,6 +841,9 @@ class GetPlay(JsonCommandBase):
 
 
 class SetPlay(JsonCommandBase):
+    required = ('uid', 'play')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -744,6 +876,9 @@ class SetPlay(JsonCommandBase):
 ### PAUSE ##############################################################################################################
 
 class GetPause(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -770,6 +905,9 @@ class GetPause(JsonCommandBase):
 
 
 class SetPause(JsonCommandBase):
+    required = ('uid', 'pause')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -802,6 +940,9 @@ class SetPause(JsonCommandBase):
 ### RADIO STATION ######################################################################################################
 
 class GetRadioStation(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -830,6 +971,9 @@ class GetRadioStation(JsonCommandBase):
 ### RADIO SHOW #########################################################################################################
 
 class GetRadioShow(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -858,6 +1002,9 @@ class GetRadioShow(JsonCommandBase):
 ### PLAYMODE ###########################################################################################################
 
 class GetPlaymode(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -884,6 +1031,9 @@ class GetPlaymode(JsonCommandBase):
 
 
 class SetPlaymode(JsonCommandBase):
+    required = ('uid', 'playmode')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -922,6 +1072,9 @@ class SetPlaymode(JsonCommandBase):
 ### ALARMS #############################################################################################################
 
 class GetAlarms(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -950,6 +1103,9 @@ class GetAlarms(JsonCommandBase):
 ### TRACK ARTIST #######################################################################################################
 
 class GetTrackArtist(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -978,6 +1134,9 @@ class GetTrackArtist(JsonCommandBase):
 ### TRACK TITLE ########################################################################################################
 
 class GetTrackTitle(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1006,6 +1165,9 @@ class GetTrackTitle(JsonCommandBase):
 ### TRACK ALBUM COVER ##################################################################################################
 
 class GetTrackAlbumArt(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1034,6 +1196,9 @@ class GetTrackAlbumArt(JsonCommandBase):
 ### TRACK TITLE ########################################################################################################
 
 class GetTrackUri(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1062,6 +1227,9 @@ class GetTrackUri(JsonCommandBase):
 ### LED ################################################################################################################
 
 class SetLed(JsonCommandBase):
+    required = ('uid', 'led')
+    optional = ('group_command',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1105,6 +1273,9 @@ class SetLed(JsonCommandBase):
 
 
 class GetLed(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1133,6 +1304,9 @@ class GetLed(JsonCommandBase):
 ### NEXT ###############################################################################################################
 
 class Next(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1168,6 +1342,9 @@ class Next(JsonCommandBase):
 ### PREVIOUS ###########################################################################################################
 
 class Previous(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1204,6 +1381,9 @@ class Previous(JsonCommandBase):
 ### TRACK POSITION #####################################################################################################
 
 class GetTrackPosition(JsonCommandBase):
+    required = ('uid',)
+    optional = ('force_refresh',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1243,6 +1423,9 @@ class GetTrackPosition(JsonCommandBase):
 
 
 class SetTrackPosition(JsonCommandBase):
+    required = ('uid', 'timestamp')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1275,6 +1458,9 @@ class SetTrackPosition(JsonCommandBase):
 ### PARTYMODE ##########################################################################################################
 
 class Partymode(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1303,6 +1489,9 @@ class Partymode(JsonCommandBase):
 ### JOIN ###############################################################################################################
 
 class Join(JsonCommandBase):
+    required = ('uid', 'join_uid')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1331,6 +1520,9 @@ class Join(JsonCommandBase):
 ### UNJOIN #############################################################################################################
 
 class Unjoin(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1359,6 +1551,9 @@ class Unjoin(JsonCommandBase):
 ### CLIENT LIST ########################################################################################################
 
 class ClientList(JsonCommandBase):
+    required = ()
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1391,6 +1586,9 @@ class ClientList(JsonCommandBase):
 ### PLAY URI ###########################################################################################################
 
 class PlayUri(JsonCommandBase):
+    required = ('uid', 'uri')
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1418,6 +1616,9 @@ class PlayUri(JsonCommandBase):
 ### PLAY SNIPPET #######################################################################################################
 
 class PlaySnippet(JsonCommandBase):
+    required = ('uid', 'uri')
+    optional = ('fade_in', 'group_command', 'volume')
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1472,6 +1673,9 @@ class PlaySnippet(JsonCommandBase):
 ### PLAY TTS ###########################################################################################################
 
 class PlayTts(JsonCommandBase):
+    required = ('uid', 'tts')
+    optional = ('fade_in', 'force_stream_mode', 'group_command', 'language', 'volume')
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1539,45 +1743,63 @@ class PlayTts(JsonCommandBase):
             return self._status, self._response
 
 
-### GET FAVORITE RADIO STATIONS ########################################################################################
+### GET FAVORITES #####################################################################################################
+
+def _get_favorites(command, favorite_type):
+    try:
+        logger.debug('COMMAND {classname} -- attributes: {attributes}'.format(classname=command.__class__.__name__,
+                                                                              attributes=utils.dump_attributes(
+                                                                                  command)))
+        start_item, max_items = _paging(command, default_max_items=50)
+        command._response = SonosLibrary.get_favorites(favorite_type, start_item, max_items)
+        command._status = True
+    except AttributeError as err:
+        command._response = JsonCommandBase.missing_param_error(err)
+    except Exception as err:
+        command._response = err
+    finally:
+        return command._status, command._response
+
 
 class GetFavoriteRadioStations(JsonCommandBase):
+    required = ()
+    optional = ('uid', 'max_items', 'start_item')
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
     def run(self):
-        try:
-            logger.debug('COMMAND {classname} -- attributes: {attributes}'.format(classname=self.__class__.__name__,
-                                                                                  attributes=utils.dump_attributes(
-                                                                                      self)))
-            start_item = 0
-            if hasattr(self, 'start_item'):
-                if not utils.check_int(self.start_item):
-                    raise Exception('The parameter \'start_item\' has to be an integer!')
-                start_item = int(self.start_item)
-
-            max_items = 50
-            if hasattr(self, 'max_items'):
-                if not utils.check_int(self.start_item):
-                    raise Exception('The parameter \'max_items\' has to be an integer!')
-                max_items = int(self.max_items)
-
-            self._response = SonosLibrary.get_fav_radiostations(start_item, max_items)
-            self._status = True
-        except ConnectionError:
-            self._response = 'Unable to process command. Speaker with uid \'{uid}\'seems to be offline.'. \
-                format(uid=self.uid)
-        except AttributeError as err:
-            self._response = JsonCommandBase.missing_param_error(err)
-        except Exception as err:
-            self._response = err
-        finally:
-            return self._status, self._response
+        return _get_favorites(self, 'radio_stations')
+
+
+class GetFavoriteRadioShows(JsonCommandBase):
+    required = ()
+    optional = ('uid', 'max_items', 'start_item')
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        return _get_favorites(self, 'radio_shows')
+
+
+class GetSonosFavorites(JsonCommandBase):
+    required = ()
+    optional = ('uid', 'max_items', 'start_item')
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        return _get_favorites(self, 'sonos_favorites')
 
 
 ### IsCoordiantor ######################################################################################################
 
 class IsCoordinator(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1604,6 +1826,9 @@ class IsCoordinator(JsonCommandBase):
 # TTSLocalMode #########################################################################################################
 
 class TtsLocalMode(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1630,6 +1855,9 @@ class TtsLocalMode(JsonCommandBase):
 # PLAYLIST #############################################################################################################
 
 class GetPlaylist(JsonCommandBase):
+    required = ('uid',)
+    optional = ()
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1653,6 +1881,9 @@ class GetPlaylist(JsonCommandBase):
 
 
 class SetPlaylist(JsonCommandBase):
+    required = ('uid', 'playlist')
+    optional = ('play_after_insert',)
+
     def __init__(self, parameter):
         super().__init__(parameter)
 
@@ -1681,3 +1912,288 @@ class SetPlaylist(JsonCommandBase):
             self._response = err
         finally:
             return self._status, self._response
+
+
+# BATCH ################################################################################################################
+
+_batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS)
+
+
+class Batch(JsonCommandBase):
+    """
+    Runs an ordered list of commands with one request. Commands for different speakers are processed concurrently,
+    commands for the same speaker are processed in the given order.
+    """
+    required = ('commands',)
+    optional = ()
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    @staticmethod
+    def _lane_key(obj):
+        try:
+            uid = obj.get('parameter', obj).get('uid')
+        except AttributeError:
+            return None
+        return uid.lower() if isinstance(uid, str) else uid
+
+    @staticmethod
+    def _run_lane(lane, results):
+        for index, obj in lane:
+            if isinstance(obj, dict) and obj.get('command') == 'batch':
+                status, response = False, 'Nested batch commands are not supported!'
+            else:
+                status, response = dispatch_object(obj)
+            results[index] = {
+                'command': obj.get('command', '') if isinstance(obj, dict) else '',
+                'status': bool(status),
+                'response': response if isinstance(response, (str, int, float, list, dict)) else str(response)
+            }
+
+    def run(self):
+        try:
+            if not isinstance(self.commands, list):
+                raise Exception('The parameter \'commands\' has to be a list of commands!')
+            logger.debug('COMMAND {classname} -- {count} commands'.format(classname=self.__class__.__name__,
+                                                                          count=len(self.commands)))
+
+            # one lane per speaker, the order within a lane is the order of the request
+            lanes = OrderedDict()
+            for index, obj in enumerate(self.commands):
+                lanes.setdefault(Batch._lane_key(obj), []).append((index, obj))
+
+            results = [None] * len(self.commands)
+            futures = [_batch_executor.submit(Batch._run_lane, lane, results) for lane in lanes.values()]
+            for future in futures:
+                future.result()
+
+            self._response = utils.to_json(results)
+            self._status = True
+        except AttributeError as err:
+            self._response = JsonCommandBase.missing_param_error(err)
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+# COMMAND STATS ########################################################################################################
+
+class CommandStats():
+    """
+    Request-level timing for all commands (count, total, maximum and last run time in milliseconds).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def add(self, command, duration):
+        with self._lock:
+            stats = self._stats.get(command)
+            if stats is None:
+                stats = self._stats[command] = [0, 0.0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            stats[3] = duration
+
+    def as_dict(self):
+        with self._lock:
+            return {command: {'count': count,
+                              'avg_ms': round(total / count * 1000, 3),
+                              'max_ms': round(maximum * 1000, 3),
+                              'last_ms': round(last * 1000, 3)}
+                    for command, (count, total, maximum, last) in self._stats.items()}
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+
+command_stats = CommandStats()
+
+
+class CommandStatistics(JsonCommandBase):
+    required = ()
+    optional = ('reset',)
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            self._response = utils.to_json(command_stats.as_dict())
+            if hasattr(self, 'reset'):
+                if self.reset in [1, True, '1', 'True', 'yes']:
+                    command_stats.clear()
+                elif self.reset not in [0, False, '0', 'False', 'no']:
+                    raise Exception('The parameter \'reset\' has to be 0|1 or True|False !')
+            self._status = True
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+class EventStatistics(JsonCommandBase):
+    required = ()
+    optional = ('reset',)
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            reset = False
+            if hasattr(self, 'reset'):
+                if self.reset in [1, True, '1', 'True', 'yes']:
+                    reset = True
+                elif self.reset not in [0, False, '0', 'False', 'no']:
+                    raise Exception('The parameter \'reset\' has to be 0|1 or True|False !')
+            self._response = utils.to_json({uid: speaker.event_statistics(reset) for uid, speaker in
+                                            sonos_speaker.sonos_speakers.items()})
+            self._status = True
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+### MUSIC LIBRARY INDEX ################################################################################################
+
+def _paging(command, default_max_items=100):
+    start_item = 0
+    if hasattr(command, 'start_item'):
+        if not utils.check_int(command.start_item):
+            raise Exception('The parameter \'start_item\' has to be an integer!')
+        start_item = int(command.start_item)
+
+    max_items = default_max_items
+    if hasattr(command, 'max_items'):
+        if not utils.check_int(command.max_items):
+            raise Exception('The parameter \'max_items\' has to be an integer!')
+        max_items = int(command.max_items)
+    return max(start_item, 0), max(max_items, 0)
+
+
+def _music_index():
+    if music_index.music_index is None:
+        raise Exception('The music library index is disabled! Enable it in the broker configuration.')
+    return music_index.music_index
+
+
+class LibrarySearch(JsonCommandBase):
+    required = ('term',)
+    optional = ('type', 'start_item', 'max_items')
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            logger.debug('COMMAND {classname} -- attributes: {attributes}'.format(classname=self.__class__.__name__,
+                                                                                  attributes=utils.dump_attributes(
+                                                                                      self)))
+            search_type = getattr(self, 'type', 'tracks')
+            if search_type not in ('tracks', 'artists', 'albums'):
+                raise Exception('The parameter \'type\' has to be tracks, artists or albums!')
+            start_item, max_items = _paging(self)
+
+            self._response = utils.to_json(_music_index().search(str(self.term), search_type, start_item, max_items))
+            self._status = True
+        except AttributeError as err:
+            self._response = JsonCommandBase.missing_param_error(err)
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+class LibraryBrowse(JsonCommandBase):
+    required = ()
+    optional = ('artist', 'album', 'start_item', 'max_items')
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            logger.debug('COMMAND {classname} -- attributes: {attributes}'.format(classname=self.__class__.__name__,
+                                                                                  attributes=utils.dump_attributes(
+                                                                                      self)))
+            artist = getattr(self, 'artist', None)
+            album = getattr(self, 'album', None)
+            if album is not None and artist is None:
+                raise Exception('The parameter \'album\' requires the parameter \'artist\'!')
+            start_item, max_items = _paging(self)
+
+            self._response = utils.to_json(_music_index().browse(artist, album, start_item, max_items))
+            self._status = True
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+class LibraryStatus(JsonCommandBase):
+    required = ()
+    optional = ()
+
+    def __init__(self, parameter):
+        super().__init__(parameter)
+
+    def run(self):
+        try:
+            self._response = utils.to_json(_music_index().status())
+            self._status = True
+        except Exception as err:
+            self._response = err
+        finally:
+            return self._status, self._response
+
+
+# DISPATCH TABLE #######################################################################################################
+
+# command name -> command class, e.g. 'set_volume' -> SetVolume
+commands = {camel_to_underscore(class_.__name__): class_ for class_ in JsonCommandBase.__subclasses__()}
+
+
+def dispatch(json_string):
+    """
+    Decodes a JSON command, validates its parameters and runs it. The run time is recorded in 'command_stats'.
+    :param json_string: JSON command, e.g. {"command": "get_volume", "parameter": {"uid": "rincon_..."}}
+    :return: status, response
+    """
+    try:
+        obj = json.loads(json_string)
+    except ValueError:
+        return False, 'Invalid JSON command!'
+    return dispatch_object(obj)
+
+
+def dispatch_object(obj):
+    """
+    Same as dispatch(), but for an already decoded JSON command.
+    """
+    try:
+        command = obj['command']
+    except (KeyError, TypeError):
+        return False, 'Invalid JSON command!'
+
+    class_ = commands.get(command)
+    if class_ is None:
+        return False, "No command '{command}' found!".format(command=command)
+
+    parameter = obj.get('parameter', obj)
+    error = class_.validate(parameter)
+    if error:
+        return False, error
+
+    start = time.perf_counter()
+    status, response = class_(parameter).run()
+    duration = time.perf_counter() - start
+    command_stats.add(command, duration)
+    logger.debug('COMMAND {command} -- {duration:.1f} ms'.format(command=command, duration=duration * 1000))
+    return status, response
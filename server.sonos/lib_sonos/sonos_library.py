@@ -1,26 +1,194 @@
+import logging
+import threading
+from lib_sonos import definitions
 from lib_sonos import sonos_speaker
 from lib_sonos import utils
 
+logger = logging.getLogger('')
+
+# favorite type -> (ContentDirectory object id, soco method)
+FAVORITE_TYPES = {
+    'radio_stations': ('R:0/0', 'get_favorite_radio_stations'),
+    'radio_shows': ('R:0/1', 'get_favorite_radio_shows'),
+    'sonos_favorites': ('FV:2', 'get_sonos_favorites'),
+}
+
+
+def _affects(object_id, container_id):
+    return object_id == container_id or object_id.startswith(container_id + '/') or \
+        container_id.startswith(object_id + '/')
+
+
+class FavoritesEntry():
+    def __init__(self, total, favorites):
+        self.total = total
+        self.favorites = favorites
+        # (start_item, max_items) -> json response
+        self.pages = {}
+
 
 class SonosLibrary:
+    """
+    The favorites (radio stations, radio shows, Sonos favorites) are the same for all speakers of the household. They
+    are fetched once and served from memory. The cache is invalidated by the 'ContainerUpdateIDs' of the
+    ContentDirectory events, without an active subscription nothing is cached.
+    With several households, the favorites of 'household_id' are served, by default of the first household by id.
+    """
+    household_id = None
+    _favorites = {}
+    _generations = {favorite_type: 0 for favorite_type in FAVORITE_TYPES}
+    _update_ids = {}
+    _lock = threading.Lock()
+    _load_lock = threading.Lock()
+    _sub_content_directory = None
+    _sub_uid = None
 
     @classmethod
     def get_fav_radiostations(cls, start_item, max_items):
+        return cls.get_favorites('radio_stations', start_item, max_items)
 
-        #get any speaker in our list
-        stations = {}
-        found = False
+    @classmethod
+    def get_favorites(cls, favorite_type, start_item, max_items):
+        """
+        Returns a page of the favorites as json.
+        :param favorite_type: radio_stations, radio_shows or sonos_favorites
+        """
+        key = (start_item, max_items)
+        with cls._lock:
+            entry = cls._favorites.get(favorite_type)
+            if entry is not None and key in entry.pages:
+                return entry.pages[key]
 
-        for key, value in sonos_speaker.sonos_speakers.items():
+        if entry is None:
+            entry = cls._load(favorite_type)
+
+        page = utils.to_json({
+            'total': str(entry.total),
+            'returned': len(entry.favorites[start_item:start_item + max_items]),
+            'favorites': entry.favorites[start_item:start_item + max_items]
+        })
+        with cls._lock:
+            if len(entry.pages) >= definitions.FAVORITES_MAX_PAGES:
+                entry.pages.clear()
+            entry.pages[key] = page
+        return page
+
+    @classmethod
+    def _load(cls, favorite_type):
+        with cls._load_lock:
+            with cls._lock:
+                entry = cls._favorites.get(favorite_type)
+                generation = cls._generations[favorite_type]
+                cached = cls._sub_content_directory is not None
+            if entry is not None:
+                # loaded by a concurrent request
+                return entry
+
+            total, favorites = cls._fetch(favorite_type)
+            entry = FavoritesEntry(total, favorites)
+            with cls._lock:
+                # an invalidation during the fetch makes the result outdated, it is returned but not cached
+                if cached and generation == cls._generations[favorite_type]:
+                    cls._favorites[favorite_type] = entry
+            logger.debug('favorites cache: {count} {type} loaded'.format(count=total, type=favorite_type))
+            return entry
+
+    @classmethod
+    def household_speakers(cls):
+        """
+        :return: the speakers of the household whose favorites and music library are served
+        """
+        households = sonos_speaker.speakers_by_household()
+        if cls.household_id is not None:
+            return households.get(cls.household_id, [])
+        if not households:
+            return []
+        return households[min(households)]
+
+    @classmethod
+    def _fetch(cls, favorite_type):
+        object_id, method = FAVORITE_TYPES[favorite_type]
+        for speaker in cls.household_speakers():
             try:
-                soco = sonos_speaker.sonos_speakers[key].soco
-                stations = soco.get_favorite_radio_stations(start_item, max_items)
-                found = True
-                break
-            except Exception:
-                pass
+                fetch = getattr(speaker.soco, method)
+                favorites = []
+                while True:
+                    result = fetch(len(favorites), definitions.FAVORITES_PAGE_SIZE)
+                    favorites.extend(result['favorites'])
+                    if not result['returned'] or len(favorites) >= int(result['total']):
+                        return int(result['total']), favorites
+            except Exception as err:
+                logger.debug('Could not fetch {type} from {uid}: {err}'.format(type=favorite_type, uid=speaker.uid,
+                                                                               err=err))
+
+        raise Exception("Couldn't fetch favorites. All speakers offline?")
+
+    @classmethod
+    def invalidate(cls, favorite_types=None):
+        with cls._lock:
+            for favorite_type in favorite_types or FAVORITE_TYPES:
+                cls._generations[favorite_type] += 1
+                cls._favorites.pop(favorite_type, None)
+
+    @classmethod
+    def handle_ContentDirectory_event(cls, variables):
+        """
+        'ContainerUpdateIDs' is a comma separated list of container ids and update ids, e.g. 'FV:2,17,R:0,4'.
+        """
+        value = variables.get('container_update_i_ds')
+        if not value:
+            return
+        parts = value.split(',')
+        changed = set()
+        with cls._lock:
+            for container_id, update_id in zip(parts[0::2], parts[1::2]):
+                if cls._update_ids.get(container_id) == update_id:
+                    continue
+                cls._update_ids[container_id] = update_id
+                changed.update(favorite_type for favorite_type, (object_id, method) in FAVORITE_TYPES.items()
+                               if _affects(object_id, container_id))
+        if changed:
+            logger.debug('favorites cache: invalidating {types}'.format(types=sorted(changed)))
+            cls.invalidate(changed)
+
+    @classmethod
+    def event_subscription(cls, event_queue):
+        """
+        Subscribes the ContentDirectory events of one speaker, the favorites are the same for the whole household.
+        """
+        speakers = cls.household_speakers()
+        subscription = cls._sub_content_directory
+        if subscription is not None and subscription.time_left > 0 and \
+                any(speaker.uid == cls._sub_uid for speaker in speakers):
+            return
 
-        if not found:
-            raise Exception("Couldn't fetch favorite radio stations. All speakers offline?")
+        cls.event_unsubscribe()
+        for speaker in speakers:
+            uid = speaker.uid
+            try:
+                logger.debug('renewing content directory event for {uid}'.format(uid=uid))
+                subscription = speaker.soco.contentDirectory.subscribe(definitions.SUBSCRIPTION_TIMEOUT, True,
+                                                                       event_queue)
+            except Exception as err:
+                logger.warning('Could not subscribe to content directory events of {uid}: {err}'.format(uid=uid,
+                                                                                                       err=err))
+                continue
+            with cls._lock:
+                cls._sub_content_directory = subscription
+                cls._sub_uid = uid
+            return
 
-        return utils.to_json(stations)
\ No newline at end of file
+    @classmethod
+    def event_unsubscribe(cls):
+        with cls._lock:
+            subscription = cls._sub_content_directory
+            cls._sub_content_directory = None
+            cls._sub_uid = None
+            # events may have been missed, the next subscription starts with an empty cache
+            cls._update_ids.clear()
+        cls.invalidate()
+        if subscription is not None:
+            try:
+                subscription.unsubscribe()
+            except Exception as err:
+                logger.debug(err)
@@ -2,20 +2,25 @@ from __future__ import unicode_literals
 
 # -*- coding: utf-8 -*-
 import queue
-import requests
 from collections import namedtuple
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from lib_sonos import sonos_speaker
 from lib_sonos.sonos_speaker import SonosSpeaker
-from lib_sonos.definitions import SCAN_TIMEOUT
+from lib_sonos.sonos_library import SonosLibrary
+from lib_sonos.definitions import SCAN_TIMEOUT, DISCOVERY_TIMEOUT, BATCH_WORKERS
 from lib_sonos.radio_parser import title_artist_parser
+from lib_sonos.album_art import proxy_url
+from lib_sonos import speaker_registry
+from lib_sonos import music_index
 import socket
 import logging
 from time import sleep
-from soco import discover
+from soco import SoCo, discover_households
 from threading import Lock
 from soco.data_structures import DidlAudioBroadcast
-from soco.services import zone_group_state_shared_cache
+from soco.services import zone_group_state_caches
+from soco import description
 from lib_sonos import utils
 
 try:
@@ -45,15 +50,25 @@ Action = namedtuple('Action', 'name, in_args, out_args')
 class SonosServerService():
     _sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
     _sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+    # interface names or addresses to search for speakers on, None: all interfaces
+    discovery_interfaces = None
+    discovery_timeout = DISCOVERY_TIMEOUT
 
-    def __init__(self, host, port, remote_folder, local_folder, quota, tts_local_mode):
+    @staticmethod
+    def set_discovery(interfaces=None, timeout=DISCOVERY_TIMEOUT):
+        SonosServerService.discovery_interfaces = interfaces
+        SonosServerService.discovery_timeout = timeout
+
+    def __init__(self, host, port, remote_folder, local_folder, quota, tts_local_mode, tts_engine=None):
         self.event_lock = Lock()
         self.lock = Lock()
         self.host = host
         self.port = port
         self.event_queue = queue.Queue()
 
-        SonosSpeaker.set_tts(local_folder, remote_folder, quota, tts_local_mode)
+        SonosSpeaker.set_tts(local_folder, remote_folder, quota, tts_local_mode, tts_engine)
+        # the speakers of the last run are addressable at once, the discovery thread verifies them
+        self._warm_speakers = self.warm_start()
 
         p_t = threading.Thread(target=self.process_events)
         p_t.daemon = True
@@ -65,16 +80,24 @@ class SonosServerService():
     def unsubscribe_speaker_events(self):
         for speaker in sonos_speaker.sonos_speakers.values():
             speaker.event_unsubscribe()
+        SonosLibrary.event_unsubscribe()
 
     def get_speakers_periodically(self):
 
         sleep_scan = SCAN_TIMEOUT
 
+        if self._warm_speakers:
+            try:
+                self.verify_speakers(self._warm_speakers)
+            except Exception as err:
+                logger.exception(err)
+            self._warm_speakers = []
+
         while 1:
             try:
                 logger.debug('active threads: {}'.format(len(threading.enumerate())))
                 logger.info('scan devices ...')
-                zone_group_state_shared_cache.clear()
+                zone_group_state_caches.clear()
                 self.discover()
 
             except Exception as err:
@@ -82,85 +105,154 @@ class SonosServerService():
             finally:
                 sleep(sleep_scan)
 
+    @staticmethod
+    def warm_start():
+        """
+        Registers the speakers of the speaker registry without any network call, so commands are accepted before the
+        first discovery has finished. Their state is filled by the first events.
+        :return: the registered speakers
+        """
+        registry = speaker_registry.speaker_registry
+        if registry is None:
+            return []
+        speakers = {}
+        for entry in registry.load():
+            try:
+                soco = SoCo(entry['ip'])
+                soco._uid = entry['uid']
+                soco._household_id = entry['household_id']
+                soco._player_name = entry['speaker_info'].get('zone_name')
+                soco.speaker_info = dict(entry['speaker_info'])
+                speaker = SonosSpeaker(soco, fetch_state=False)
+                speaker.model = entry.get('model', '')
+            except Exception as err:
+                logger.warning('speaker registry: skipping speaker {uid}: {err}'.format(uid=entry['uid'], err=err))
+                continue
+            speakers[speaker.uid] = (speaker, entry)
+
+        # the topology of the last run, until the discovery or a topology event replaces it
+        for speaker, entry in speakers.values():
+            coordinator = speakers.get(entry.get('coordinator'), (speaker,))[0]
+            members = [speakers[uid][0] for uid in entry.get('zone_members', []) if uid in speakers]
+            speaker.set_topology(coordinator, members, entry.get('sub_members', []))
+            sonos_speaker.add_speaker(speaker)
+        if speakers:
+            logger.info('{count} speaker(s) loaded from {path}'.format(count=len(speakers), path=registry.path))
+        return [speaker for speaker, entry in speakers.values()]
+
+    def verify_speakers(self, speakers):
+        """
+        Checks the warm started speakers in parallel: the reachable ones are subscribed to their events, which bring
+        their current state. The others are left to the discovery.
+        """
+        def verify(speaker):
+            try:
+                speaker.soco.get_speaker_info(refresh=True)
+                speaker.event_subscription(self.event_queue)
+                return True
+            except Exception as err:
+                logger.debug('speaker registry: {uid} not reachable: {err}'.format(uid=speaker.uid, err=err))
+                return False
+
+        with self.lock:
+            # skip the speakers already replaced or removed
+            speakers = [speaker for speaker in speakers if sonos_speaker.sonos_speakers.get(speaker.uid) is speaker]
+            with ThreadPoolExecutor(max_workers=BATCH_WORKERS) as executor:
+                verified = sum(executor.map(verify, speakers))
+            SonosLibrary.event_subscription(self.event_queue)
+        logger.info('speaker registry: {verified} of {count} speaker(s) reachable'.format(verified=verified,
+                                                                                          count=len(speakers)))
+
+    @staticmethod
+    def save_registry():
+        registry = speaker_registry.speaker_registry
+        if registry is not None:
+            registry.save(sonos_speaker.sonos_speakers.values())
+
     @staticmethod
     def _discover():
-        return discover(timeout=5, include_invisible=False)
+        """
+        Searches on all (or the configured) network interfaces at the same time.
+        :return: dict household id -> set of SoCo instances
+        """
+        interface_addrs = utils.get_interface_ips(SonosServerService.discovery_interfaces)
+        return discover_households(timeout=SonosServerService.discovery_timeout, include_invisible=False,
+                                   interface_addrs=interface_addrs)
 
     def discover(self):
-        try:
-            with sonos_speaker._sonos_lock:
-                zone_group_state_shared_cache.clear()
+        # one scan at a time; the speaker registry is copy-on-write, so commands and events never wait for a scan
+        with self.lock:
+            try:
+                zone_group_state_caches.clear()
                 active_uids = []
-                soco_speakers = SonosServerService._discover()
+                households = SonosServerService._discover()
 
-                if soco_speakers is None:
+                if not households:
                     return
 
                 speaker_to_remove = []
 
-                for soco_speaker in soco_speakers:
+                for soco_speaker in set().union(*households.values()):
                     uid = soco_speaker.uid.lower()
+                    speaker = sonos_speaker.sonos_speakers.get(uid)
+
+                    if speaker is not None and speaker.soco is not soco_speaker:
+                        # the speaker got a new ip address since it was registered (e.g. by the warm start)
+                        logger.info('speaker {uid} moved to {ip}'.format(uid=uid, ip=soco_speaker.ip_address))
+                        sonos_speaker.remove_speakers([uid])
+                        speaker = None
 
                     # new speaker found, update it
-                    if uid not in sonos_speaker.sonos_speakers:
+                    if speaker is None:
                         try:
                             soco_speaker.get_speaker_info(refresh=True)
                             active_uids.append(uid)
                         except Exception:
                             # !! sometimes an offline speaker is cached and will be found by the discover function
-                            speaker_to_remove.append(soco_speaker.uid)
+                            speaker_to_remove.append(uid)
                             continue
                         try:
                             _sp = SonosSpeaker(soco_speaker)
-                            sonos_speaker.sonos_speakers[uid] = _sp
-                            sonos_speaker.sonos_speakers[uid].model = SonosServerService.get_model_name(
-                                sonos_speaker.sonos_speakers[uid].ip)
+                            _sp.model = SonosServerService.get_model_name(soco_speaker)
+                            sonos_speaker.add_speaker(_sp)
                         except Exception:
-                            speaker_to_remove.append(soco_speaker.uid)
-                            continue  # speaker maybe deleted by another thread
+                            speaker_to_remove.append(uid)
+                            continue
                     else:
                         try:
-                            sonos_speaker.sonos_speakers[uid].soco.get_speaker_info(refresh=True)
+                            speaker.soco.get_speaker_info(refresh=True)
                             active_uids.append(uid)
                         except Exception:
-                            speaker_to_remove.append(soco_speaker.uid)
-                            continue  # speaker maybe deleted by another thread
+                            speaker_to_remove.append(uid)
+                            continue
 
-                for uid in speaker_to_remove:
-                    uid = uid.lower()
-                    if uid in sonos_speaker.sonos_speakers:
-                        sonos_speaker.sonos_speakers.pop(uid)
+                sonos_speaker.remove_speakers(speaker_to_remove)
 
                 # remove all offline speakers from internal list
-                try:
-                    offline_uids = set(list(sonos_speaker.sonos_speakers.keys())) - set(active_uids)
-                except KeyError:
-                    pass  # speaker maybe deleted by another thread
-
+                speakers = sonos_speaker.sonos_speakers
+                offline_uids = set(speakers) - set(active_uids)
                 for uid in offline_uids:
                     logger.info("offline speaker: {uid} -- removing from list".format(uid=uid))
-                    try:
-                        sonos_speaker.sonos_speakers[uid].status = False
-                        sonos_speaker.sonos_speakers[uid].send()
-                        del sonos_speaker.sonos_speakers[uid]
-                    except KeyError:
-                        continue  # speaker maybe deleted by another thread
+                    speakers[uid].status = False
+                    speakers[uid].send()
+                sonos_speaker.remove_speakers(offline_uids)
 
                 # register events for all speaker, this has to be the last step due to some logics in the event
                 # handling routine
 
-                for speaker in sonos_speaker.sonos_speakers.values():
-                    try:
-                        speaker.set_zone_coordinator()
-                        speaker.set_group_members()
+                # every household has its own zone group state
+                for household_id, speakers in sorted(sonos_speaker.speakers_by_household().items()):
+                    logger.debug('household {household_id}: {count} speaker(s)'.format(household_id=household_id,
+                                                                                        count=len(speakers)))
+                    sonos_speaker.update_topology(speakers[0].soco)
+                    for speaker in speakers:
                         speaker.event_subscription(self.event_queue)
-                    except KeyError:
-                        pass  # speaker maybe deleted by another thread
 
-        except Exception as err:
-            logger.exception('Error in method discover()!\nError: {err}'.format(err=err))
-        finally:
-            pass
+                SonosLibrary.event_subscription(self.event_queue)
+                self.save_registry()
+
+            except Exception as err:
+                logger.exception('Error in method discover()!\nError: {err}'.format(err=err))
 
     def process_events(self):
         speakers = []
@@ -185,21 +277,18 @@ class SonosServerService():
 
                 uid = uid[1]
 
-                if uid not in sonos_speaker.sonos_speakers:
+                speaker = sonos_speaker.sonos_speakers.get(uid)
+                if speaker is None:
                     print("No sonos speaker found for subscription {}".format(event.sid.lower()))
                     continue
 
-                with sonos_speaker._sonos_lock:
-                    try:
-                        speaker = sonos_speaker.sonos_speakers[uid]
-                        if speaker not in speakers:
-                            speakers.append(speaker)
-                    except KeyError:
-                        pass  # speaker maybe removed from another thread
+                speaker.event_received()
+                if speaker not in speakers:
+                    speakers.append(speaker)
 
                 if event.service.service_type == 'ZoneGroupTopology':
-                    speaker.set_zone_coordinator()
-                    speaker.set_group_members()
+                    # the zone group state of the event is already in the cache of SoCo
+                    sonos_speaker.update_topology(speaker.soco)
                     speaker.dirty_music_metadata()
 
                 if event.service.service_type == 'AVTransport':
@@ -211,6 +300,11 @@ class SonosServerService():
                 if event.service.service_type == 'AlarmClock':
                     self.handle_AlarmClock_event(speaker, event.variables)
 
+                if event.service.service_type == 'ContentDirectory':
+                    SonosLibrary.handle_ContentDirectory_event(event.variables)
+                    if music_index.music_index is not None:
+                        music_index.music_index.handle_ContentDirectory_event(event.variables)
+
             except queue.Empty:
                 pass
             except KeyboardInterrupt:
@@ -226,28 +320,25 @@ class SonosServerService():
 
     # missing model name, not implemented in soco framework
     @staticmethod
-    def get_model_name(ip):
-        response = requests.get('http://' + ip + ':1400/xml/device_description.xml')
-        dom = XML.fromstring(response.content)
-
-        if dom.findtext('.//{urn:schemas-upnp-org:device-1-0}modelName') is not None:
-            return dom.findtext('.//{urn:schemas-upnp-org:device-1-0}modelName')
-
-        return ""
+    def get_model_name(soco):
+        """
+        The device description is fetched once per model and software version, see soco.description.
+        :param soco: SoCo instance of the speaker
+        """
+        return description.description_cache.model_name(soco)
 
     @staticmethod
-    def set_radio_data(speaker, variables):
-
-        speaker.streamtype = "radio"
-        speaker.track_duration = "00:00:00"
-        speaker.radio_station = ''
-        speaker.radio_show = ''
+    def radio_data(speaker, variables):
+        """
+        Returns the radio values of an AVTransport event as a patch for the speaker state.
+        """
+        patch = {'streamtype': 'radio', 'track_duration': '00:00:00', 'radio_station': '', 'radio_show': ''}
 
         radio_station_title = variables['enqueued_transport_uri_meta_data']
         radio_data = variables['current_track_meta_data']
 
         if hasattr(radio_station_title, 'title'):
-            speaker.radio_station = radio_station_title.title
+            patch['radio_station'] = radio_station_title.title
 
         if hasattr(radio_data, 'radio_show'):
             # the format of a radio_show item seems to be this format:
@@ -256,15 +347,15 @@ class SonosServerService():
             if radio_show:
                 radio_show = radio_show.split(',p', 1)
                 if len(radio_show) > 1:
-                    speaker.radio_show = radio_show[0]
+                    patch['radio_show'] = radio_show[0]
 
         if hasattr(radio_data, 'album_art_uri'):
-            speaker.track_album_art = ''
+            patch['track_album_art'] = ''
             album_art = radio_data.album_art_uri
             if album_art:
                 if not album_art.startswith(('http:', 'https:')):
                     album_art = 'http://' + speaker.ip + ':1400' + album_art
-                speaker.track_album_art = album_art
+                patch['track_album_art'] = proxy_url(album_art)
 
         if hasattr(radio_data, 'stream_content'):
             ignore_title_string = ('ZPSTR_BUFFERING', 'ZPSTR_BUFFERING', 'ZPSTR_CONNECTING', 'x-sonosapi-stream')
@@ -278,81 +369,70 @@ class SonosServerService():
                     # if radio, in most cases the following format is used: artist - title
                     #if stream_content is not null, radio is assumed
 
-                    artist, title = title_artist_parser(speaker.radio_station if speaker.radio_station else '',
-                                                        stream_content)
-            speaker.track_artist = artist
-            speaker.track_title = title
+                    artist, title = title_artist_parser(patch['radio_station'], stream_content)
+            patch['track_artist'] = artist
+            patch['track_title'] = title
+        return patch
 
     @staticmethod
-    def set_music_data(speaker, variables):
-        speaker.streamtype = "music"
-        speaker.radio_show = ''
-        speaker.radio_station = ''
+    def music_data(speaker, variables):
+        """
+        Returns the track values of an AVTransport event as a patch for the speaker state.
+        """
+        patch = {'streamtype': 'music', 'radio_show': '', 'radio_station': ''}
 
         if 'current_track_duration' in variables:
-            speaker.track_duration = variables['current_track_duration']
+            patch['track_duration'] = variables['current_track_duration']
 
         ml_track = variables['current_track_meta_data']
         if ml_track:
-            if hasattr(ml_track, 'album_art_uri'):
-                if ml_track.album_art_uri:
-                    if not ml_track.album_art_uri.startswith(('http:', 'https:')):
-                        album_art_uri = 'http://' + speaker.ip + ':1400' + ml_track.album_art_uri
-                    speaker.track_album_art = album_art_uri
-            else:
-                speaker.track_album_art = ''
-
-            if hasattr(ml_track, 'album'):
-                speaker.track_album = ml_track.album
-            else:
-                speaker.track_album = ''
-
-            if hasattr(ml_track, 'title'):
-                speaker.track_title = ml_track.title
-            else:
-                speaker.title = ''
-
-            if hasattr(ml_track, 'creator'):
-                speaker.track_artist = ml_track.creator
-            else:
-                speaker.track_artist = ''
+            album_art_uri = getattr(ml_track, 'album_art_uri', '')
+            if album_art_uri:
+                if not album_art_uri.startswith(('http:', 'https:')):
+                    album_art_uri = 'http://' + speaker.ip + ':1400' + album_art_uri
+                album_art_uri = proxy_url(album_art_uri)
+            patch['track_album_art'] = album_art_uri or ''
+            patch['track_title'] = getattr(ml_track, 'title', '')
+            patch['track_artist'] = getattr(ml_track, 'creator', '')
+        return patch
 
     def handle_AVTransport_event(self, speaker, variables):
+        # all values of the event are applied at once, unchanged values are not sent again
+        patch = {}
 
         # meta data for both types (radio, music)
         if 'current_track_uri' in variables:
-            speaker.track_uri = variables['current_track_uri']
+            patch['track_uri'] = variables['current_track_uri']
 
         if 'current_playmode' in variables:
-            speaker.playmode = variables['current_playmode'].lower()
+            patch['playmode'] = variables['current_playmode'].lower()
 
+        refresh_position = False
         if 'transport_state' in variables:
             transport_state = variables['transport_state']
             if transport_state:
-                if transport_state.lower() == "transitioning":
+                transport_state = transport_state.lower()
+                if transport_state == "transitioning":
                     # because where is no event for current track position, we call it active
-                    speaker.get_trackposition(force_refresh=True)
-                if transport_state.lower() == "stopped":
-                    speaker.stop = 1
-                    speaker.play = 0
-                    speaker.pause = 0
-                if transport_state.lower() == "paused_playback":
-                    speaker.stop = 0
-                    speaker.play = 0
-                    speaker.pause = 1
-                if transport_state.lower() == "playing":
-                    speaker.stop = 0
-                    speaker.play = 1
-                    speaker.pause = 0
-
+                    refresh_position = True
+                if transport_state == "stopped":
+                    patch.update(stop=1, play=0, pause=0)
+                if transport_state == "paused_playback":
+                    patch.update(stop=0, play=0, pause=1)
+                if transport_state == "playing":
+                    patch.update(stop=0, play=1, pause=0)
                     # get current track info, if new track is played or resumed to get track_uri, track_album_art
-                    speaker.get_trackposition(force_refresh=True)
+                    refresh_position = True
 
         if 'enqueued_transport_uri_meta_data' in variables:
             if isinstance(variables['enqueued_transport_uri_meta_data'], DidlAudioBroadcast):
-                SonosServerService.set_radio_data(speaker, variables)
+                patch.update(SonosServerService.radio_data(speaker, variables))
             else:
-                SonosServerService.set_music_data(speaker, variables)
+                patch.update(SonosServerService.music_data(speaker, variables))
+
+        speaker.apply_patch(patch)
+        if refresh_position:
+            speaker.get_trackposition(force_refresh=True)
 
     def handle_AlarmClock_event(self, speaker, variables):
         """
@@ -362,6 +442,7 @@ class SonosServerService():
         speaker.get_alarms()
 
     def handle_RenderingControl_event(self, speaker, variables):
+        patch = {}
 
         if 'volume' in variables:
             volume = variables['volume']['Master']
@@ -369,16 +450,18 @@ class SonosServerService():
                 if utils.check_max_volume_exceeded(volume, speaker.max_volume):
                     speaker.set_volume(speaker.max_volume, trigger_action=True)
                 else:
-                    speaker.volume = int(volume)
+                    patch['volume'] = int(volume)
 
         if 'mute' in variables:
-            speaker.mute = int(variables['mute']['Master'])
+            patch['mute'] = int(variables['mute']['Master'])
 
         if 'bass' in variables:
-            speaker.bass = int(variables['bass'])
+            patch['bass'] = int(variables['bass'])
 
         if 'treble' in variables:
-            speaker.treble = int(variables['treble'])
+            patch['treble'] = int(variables['treble'])
 
         if 'loudness' in variables:
-            speaker.loudness = int(variables['loudness']['Master'])
\ No newline at end of file
+            patch['loudness'] = int(variables['loudness']['Master'])
+
+        speaker.apply_patch(patch)
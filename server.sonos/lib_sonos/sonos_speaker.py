@@ -1,21 +1,23 @@
 # -*- coding: utf-8 -*-
 import base64
+import collections
 import io
 import pickle
 import logging
+import operator
 import queue
 import tempfile
-import urllib
-from lib_sonos.utils import NotifyList
 from soco.alarms import get_alarms
 from soco.exceptions import SoCoUPnPException
+from soco.groups import ZoneTopology
 import threading
 import time
-import json
 from lib_sonos import udp_broker
+from lib_sonos import push_broker
 from lib_sonos import utils
 from soco.snapshot import Snapshot
 from lib_sonos import definitions
+from lib_sonos.tts import GoogleTTSProvider
 
 try:
     import xml.etree.cElementTree as XML
@@ -23,73 +25,237 @@ except ImportError:
     import xml.etree.ElementTree as XML
 
 logger = logging.getLogger('')
+
+# uid -> SonosSpeaker. The registry is copy-on-write: the dict is never changed, add_speaker() and remove_speakers()
+# replace it. Readers need no lock, but have to access it as 'sonos_speaker.sonos_speakers' (no 'from ... import').
 sonos_speakers = {}
-_sonos_lock = threading.Lock()
+_registry_lock = threading.Lock()
+
+# state versions start with the broker start time, so clients can detect a broker restart
+_state_version_epoch = int(time.time() * 1000)
+# last state versions of removed speakers, a speaker coming back online continues with its versions
+_removed_state_versions = {}
+
+
+def add_speaker(speaker):
+    global sonos_speakers
+    with _registry_lock:
+        speakers = dict(sonos_speakers)
+        speakers[speaker.uid] = speaker
+        sonos_speakers = speakers
+
+
+def remove_speakers(uids):
+    """
+    Removes speakers from the registry. The removed instances are retired, they don't send any updates anymore.
+    :param uids: uids of the speakers, unknown uids are ignored
+    :return: list of the removed speakers
+    """
+    global sonos_speakers
+    with _registry_lock:
+        speakers = dict(sonos_speakers)
+        removed = [speakers.pop(uid) for uid in set(uids) if uid in speakers]
+        sonos_speakers = speakers
+    for speaker in removed:
+        speaker.retire()
+    return removed
+
+
+def speakers_by_household():
+    """
+    :return: dict household id -> list of the registered speakers of the household
+    """
+    households = {}
+    for speaker in sonos_speakers.values():
+        households.setdefault(speaker.household_id, []).append(speaker)
+    return households
+
+
+def update_topology(soco):
+    """
+    Sets the zone coordinator, the zone members and the sub-members of all registered speakers from one zone group
+    state. Satellites, the slaves of stereo pairs and bridges are no speakers of their own, they are sub-members of
+    the zone they belong to. Members which are not registered (yet) are skipped.
+    :param soco: any SoCo instance of the household
+    """
+    speakers = sonos_speakers
+    topology = soco.topology
+    for group in soco.all_groups:
+        zones = []
+        for member in group.members:
+            member_topology = topology.get(member.uid)
+            if member_topology is not None and member_topology.role != ZoneTopology.ZONE:
+                continue
+            speaker = speakers.get(member.uid.lower())
+            if speaker is None:
+                logger.debug('topology: zone {uid} is not registered'.format(uid=member.uid.lower()))
+                continue
+            zones.append(speaker)
+        if not zones:
+            continue
+        coordinator = None
+        if group.coordinator is not None:
+            coordinator = speakers.get(group.coordinator.uid.lower())
+        for speaker in zones:
+            member_topology = topology.get(speaker.soco.uid)
+            sub_members = [uid.lower() for uid in member_topology.sub_uids] if member_topology is not None else []
+            speaker.set_topology(coordinator or speaker, [zone for zone in zones if zone is not speaker],
+                                 sub_members)
+
+
+# all properties sent to the clients, the index is the bit in the dirty mask of a speaker
+PROPERTIES = (
+    'uid', 'ip', 'mac_address', 'model', 'serial_number', 'software_version', 'hardware_version', 'household_id',
+    'status', 'tts_local_mode', 'is_coordinator', 'additional_zone_members', 'sub_members', 'alarms', 'volume',
+    'max_volume', 'mute', 'bass', 'treble', 'loudness', 'led', 'playmode', 'zone_name', 'zone_icon', 'track_uri',
+    'track_duration', 'track_position', 'track_title', 'track_artist', 'track_album_art', 'playlist_position',
+    'streamtype', 'stop', 'play', 'pause', 'radio_station', 'radio_show'
+)
+_PROPERTY_BITS = {name: 1 << index for index, name in enumerate(PROPERTIES)}
+_PROPERTY_READERS = tuple(operator.attrgetter(name) for name in PROPERTIES)
+
+
+def property_mask(*names):
+    mask = 0
+    for name in names:
+        mask |= _PROPERTY_BITS[name]
+    return mask
+
+
+# properties of the group, the getters of a member forward to the zone coordinator
+GROUP_MASK = property_mask(
+    'playmode', 'zone_name', 'zone_icon', 'track_uri', 'track_duration', 'track_position', 'track_title',
+    'track_artist', 'track_album_art', 'playlist_position', 'streamtype', 'stop', 'play', 'pause', 'radio_station',
+    'radio_show')
+MUSIC_METADATA_MASK = GROUP_MASK | property_mask('mute')
+ALL_MASK = (1 << len(PROPERTIES)) - 1
+
+# the mutable properties of a speaker with their initial value
+STATE_FIELDS = (
+    ('status', True),
+    ('model', ''),
+    ('alarms', ''),
+    ('volume', 0),
+    ('max_volume', -1),
+    ('mute', 0),
+    ('bass', 0),
+    ('treble', 0),
+    ('loudness', 0),
+    ('led', 1),
+    ('playmode', ''),
+    ('zone_name', ''),
+    ('zone_icon', ''),
+    ('track_uri', ''),
+    ('track_duration', '00:00:00'),
+    ('track_position', '00:00:00'),
+    ('track_title', ''),
+    ('track_artist', ''),
+    ('track_album_art', ''),
+    ('playlist_position', 0),
+    ('streamtype', ''),
+    ('stop', 0),
+    ('play', 0),
+    ('pause', 0),
+    ('radio_station', ''),
+    ('radio_show', ''),
+)
+# the state of an offline speaker, status and model are kept
+OFFLINE_STATE = {name: value for name, value in STATE_FIELDS if name not in ('status', 'model')}
+
+
+class SpeakerState():
+    """
+    Compact record of the mutable speaker properties. An event is applied as a patch (property name -> value) in one
+    pass, the result is the bitmask (see PROPERTIES) of the properties whose value really changed.
+    """
+    __slots__ = tuple(name for name, value in STATE_FIELDS)
+
+    def __init__(self):
+        for name, value in STATE_FIELDS:
+            setattr(self, name, value)
+
+    def apply(self, patch):
+        """
+        :param patch: dict property name -> new value
+        :return: bitmask of the changed properties, 0 if the patch changed nothing
+        """
+        changed = 0
+        for name, value in patch.items():
+            if getattr(self, name) != value:
+                setattr(self, name, value)
+                changed |= _PROPERTY_BITS[name]
+        return changed
 
 
 class SonosSpeaker():
     tts_local_mode = False
     local_folder = ''
     remote_folder = ''
+    tts_engine = None
 
     @classmethod
-    def set_tts(self, local_folder, remote_folder, quota, tts_local_mode=False):
+    def set_tts(self, local_folder, remote_folder, quota, tts_local_mode=False, tts_engine=None):
         SonosSpeaker.tts_local_mode = tts_local_mode
         SonosSpeaker.local_folder = local_folder
         SonosSpeaker.remote_folder = remote_folder
         SonosSpeaker.quota = quota
+        SonosSpeaker.tts_engine = tts_engine
 
-    def __init__(self, soco):
+    def __init__(self, soco, fetch_state=True):
+        """
+        :param soco: SoCo instance of the speaker
+        :param fetch_state: if False, no network calls are made, the speaker gets its state with the first events
+        """
         self._tts_local_mode = SonosSpeaker.tts_local_mode
         self._fade_in = False
         self._saved_music_item = None
-        self._zone_members = NotifyList()
-        self._zone_members.register_callback(self.zone_member_changed)
-        self._dirty_properties = []
+        # replaced as a whole by set_topology(), so it can be iterated without a lock
+        self._zone_members = []
+        # uids of the satellites and the stereo pair slave of the zone
+        self._sub_members = []
+        # guards the dirty mask and the state version
+        self._lock = threading.RLock()
+        self._dirty = 0
+        self._retired = False
+        # updates waiting to be sent in the order of their state versions, see _send()
+        self._outbox = collections.deque()
+        self._sending = False
         self._soco = soco
         self._uid = self.soco.uid.lower()
-        self._alarms = ''
-        self._mute = 0
-        self._track_uri = ''
-        self._track_duration = "00:00:00"
-        self._track_position = "00:00:00"
-        self._streamtype = ''
-        self._stop = 0
-        self._play = 0
-        self._pause = 0
-        self._radio_station = ''
-        self._radio_show = ''
-        self._track_album_art = ''
-        self._track_title = ''
-        self._track_artist = ''
-        self._led = 1
-        self._max_volume = -1
-        self._playlist_position = 0
-        self._model = ''
-        self._status = True
+        self._state = SpeakerState()
+        self._events_received = 0
+        self._pushes_sent = 0
         self._metadata = ''
         self._sub_av_transport = None
         self._sub_rendering_control = None
         self._sub_zone_group = None
         self._sub_alarm = None
         self._properties_hash = None
-        self._zone_coordinator = None
+        self._state_version = _removed_state_versions.get(self._uid, _state_version_epoch)
+        # the speaker is visible to the commands before the discovery has set the coordinator
+        self._zone_coordinator = self
         self._additional_zone_members = ''
         self._snippet_queue = queue.PriorityQueue(10)
         self._snippet_queue_lock = threading.Lock()
 
-        self._volume = self.soco.volume
-        self._bass = self.soco.bass
-        self._treble = self.soco.treble
-        self._loudness = self.soco.loudness
-        self._playmode = self.soco.play_mode
         self._ip = self.soco.ip_address
-        self._zone_icon = self.soco.speaker_info['zone_icon']
-        self._zone_name = soco.speaker_info['zone_name']
+        self._state.apply({
+            'zone_icon': self.soco.speaker_info['zone_icon'],
+            'zone_name': self.soco.speaker_info['zone_name'],
+        })
+        if fetch_state:
+            self._state.apply({
+                'volume': self.soco.volume,
+                'bass': self.soco.bass,
+                'treble': self.soco.treble,
+                'loudness': self.soco.loudness,
+                'playmode': self.soco.play_mode,
+            })
         self._serial_number = self.soco.speaker_info['serial_number']
         self._software_version = self.soco.speaker_info['software_version']
         self._hardware_version = self.soco.speaker_info['hardware_version']
         self._mac_address = self.soco.speaker_info['mac_address']
+        self._household_id = self.soco.household_id
 
         self._snippet_event_thread = threading.Thread(target=self.process_snippets)
         self._snippet_event_thread.daemon = True
@@ -99,6 +265,10 @@ class SonosSpeaker():
 
     # ## SoCo instance ##################################################################################################
 
+    @property
+    def lock(self):
+        return self._lock
+
     @property
     def soco(self):
 
@@ -130,14 +300,24 @@ class SonosSpeaker():
         :return: model name
         :rtype : string
         """
-        return self._model
+        return self._state.model
 
     @model.setter
     def model(self, value):
-        if self._model == value:
-            return
-        self._model = value
-        self.dirty_property('model')
+        self.apply_patch({'model': value})
+
+    # ## STATE VERSION ##################################################################################################
+
+    @property
+    def state_version(self):
+
+        """
+        Returns the state version of the speaker. The version is incremented with every message sent to the clients.
+        Clients can compare it with the version of the last message they received to detect lost messages.
+        :return: state version
+        :rtype : int
+        """
+        return self._state_version
 
     # ## METADATA #######################################################################################################
 
@@ -187,6 +367,12 @@ class SonosSpeaker():
     def serial_number(self):
         return self._serial_number
 
+    # ## HOUSEHOLD ######################################################################################################
+
+    @property
+    def household_id(self):
+        return self._household_id
+
     # ## SOFTWARE VERSION ###############################################################################################
 
     @property
@@ -208,7 +394,7 @@ class SonosSpeaker():
     ### LED ############################################################################################################
 
     def get_led(self):
-        return self._led
+        return self._state.led
 
     def set_led(self, value, trigger_action=False, group_command=False):
         if trigger_action:
@@ -216,15 +402,12 @@ class SonosSpeaker():
                 for speaker in self._zone_members:
                     speaker.set_led(value, trigger_action=True, group_command=False)
             self.soco.status_light = value
-        if value == self._led:
-            return
-        self._led = value
-        self.dirty_property('led')
+        self.apply_patch({'led': value})
 
     ### BASS ###########################################################################################################
 
     def get_bass(self):
-        return self._bass
+        return self._state.bass
 
     def set_bass(self, value, trigger_action=False, group_command=False):
         bass = int(value)
@@ -233,15 +416,12 @@ class SonosSpeaker():
                 for speaker in self._zone_members:
                     speaker.set_bass(bass, trigger_action=True, group_command=False)
             self.soco.bass = bass
-        if self._bass == bass:
-            return
-        self._bass = value
-        self.dirty_property('bass')
+        self.apply_patch({'bass': bass})
 
     ### TREBLE #########################################################################################################
 
     def get_treble(self):
-        return self._treble
+        return self._state.treble
 
     def set_treble(self, value, trigger_action=False, group_command=False):
         treble = int(value)
@@ -250,15 +430,12 @@ class SonosSpeaker():
                 for speaker in self._zone_members:
                     speaker.set_treble(treble, trigger_action=True, group_command=False)
             self.soco.treble = treble
-        if self._treble == treble:
-            return
-        self._treble = treble
-        self.dirty_property('treble')
+        self.apply_patch({'treble': treble})
 
     ### LOUDNESS #######################################################################################################
 
     def get_loudness(self):
-        return int(self._loudness)
+        return int(self._state.loudness)
 
     def set_loudness(self, value, trigger_action=False, group_command=False):
         loudness = int(value)
@@ -267,10 +444,7 @@ class SonosSpeaker():
                 for speaker in self._zone_members:
                     speaker.set_loudness(loudness, trigger_action=True, group_command=False)
             self.soco.loudness = loudness
-        if self._loudness == loudness:
-            return
-        self._loudness = value
-        self.dirty_property('loudness')
+        self.apply_patch({'loudness': loudness})
 
     ### PLAYMODE #######################################################################################################
 
@@ -279,7 +453,7 @@ class SonosSpeaker():
             logger.debug("forwarding playmode getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.playmode
-        return self._playmode.lower()
+        return self._state.playmode.lower()
 
     def set_playmode(self, value, trigger_action=False):
         if trigger_action:
@@ -289,15 +463,7 @@ class SonosSpeaker():
                 self.zone_coordinator.set_playmode(value, trigger_action)
             else:
                 self.soco.play_mode = value
-        if self._playmode == value:
-            return
-        self._playmode = value
-        self.dirty_property('playmode')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('playmode')
+        self.apply_patch({'playmode': value})
 
     ### ZONE NAME ######################################################################################################
 
@@ -307,7 +473,7 @@ class SonosSpeaker():
             logger.debug("forwarding zone_name getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.zone_name
-        return self._zone_name
+        return self._state.zone_name
 
     ### ZONE ICON ######################################################################################################
 
@@ -317,7 +483,7 @@ class SonosSpeaker():
             logger.debug("forwarding zone_icon getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.zone_icon
-        return self._zone_icon
+        return self._state.zone_icon
 
     ### ZONE MEMBERS ###################################################################################################
 
@@ -328,6 +494,14 @@ class SonosSpeaker():
     def zone_member_changed(self):
         self.dirty_property('additional_zone_members')
 
+    @property
+    def sub_members(self):
+        """
+        Returns the uids of the satellites (home theatre) and the stereo pair slave of the zone as string, delimited
+        by ','. These players are controlled through the zone.
+        """
+        return ','.join(self._sub_members)
+
     @property
     def additional_zone_members(self):
         """
@@ -348,7 +522,7 @@ class SonosSpeaker():
     ### VOLUME #########################################################################################################
 
     def get_volume(self):
-        return self._volume
+        return self._state.volume
 
     def set_volume(self, volume, trigger_action=False, group_command=False):
         volume = int(volume)
@@ -360,10 +534,7 @@ class SonosSpeaker():
             if utils.check_max_volume_exceeded(volume, self.max_volume):
                 volume = self.max_volume
             self.soco.volume = volume
-        if self._volume == volume:
-            return
-        self._volume = volume
-        self.dirty_property('volume')
+        self.apply_patch({'volume': volume})
 
     ### VOLUME UP#######################################################################################################
 
@@ -414,7 +585,7 @@ class SonosSpeaker():
         :return: None
         """
 
-        return self._max_volume
+        return self._state.max_volume
 
     def set_maxvolume(self, value, group_command=False):
 
@@ -432,14 +603,11 @@ class SonosSpeaker():
     def _set_maxvolume(self, value):
 
         m_volume = int(value)
-        if m_volume is not -1:
-            self._max_volume = m_volume
-            if utils.check_volume_range(self._max_volume):
-                if self.volume > self._max_volume:
-                    self.set_volume(self._max_volume, trigger_action=True)
-        else:
-            self._max_volume = m_volume
-        self.dirty_property('max_volume')
+        self.apply_patch({'max_volume': m_volume})
+        if m_volume != -1:
+            if utils.check_volume_range(m_volume):
+                if self.volume > m_volume:
+                    self.set_volume(m_volume, trigger_action=True)
 
     ### UID ############################################################################################################
 
@@ -450,7 +618,7 @@ class SonosSpeaker():
     ### MUTE ###########################################################################################################
 
     def get_mute(self):
-        return self._mute
+        return self._state.mute
 
     def set_mute(self, value, trigger_action=False, group_command=False):
         """
@@ -465,10 +633,7 @@ class SonosSpeaker():
                 for speaker in self._zone_members:
                     speaker.set_mute(mute, trigger_action=True, group_command=False)
             self.soco.mute = mute
-        if self._mute == value:
-            return
-        self._mute = value
-        self.dirty_property('mute')
+        self.apply_patch({'mute': mute})
 
     ### TRACK_URI ######################################################################################################
 
@@ -478,19 +643,11 @@ class SonosSpeaker():
             logger.debug("forwarding track_uri getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.track_uri
-        return self._track_uri
+        return self._state.track_uri
 
     @track_uri.setter
     def track_uri(self, value):
-        if self._track_uri == value:
-            return
-        self._track_uri = value
-        self.dirty_property('track_uri')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_uri')
+        self.apply_patch({'track_uri': value})
 
     ### TRACK DURATION #################################################################################################
 
@@ -500,21 +657,13 @@ class SonosSpeaker():
             logger.debug("forwarding track_duration getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.track_duration
-        if not self._track_duration:
+        if not self._state.track_duration:
             return "00:00:00"
-        return self._track_duration
+        return self._state.track_duration
 
     @track_duration.setter
     def track_duration(self, value):
-        if self._track_duration == value:
-            return
-        self.dirty_property('track_duration')
-        self._track_duration = value
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_duration')
+        self.apply_patch({'track_duration': value})
 
     ### TRACK POSITION #################################################################################################
 
@@ -532,9 +681,9 @@ class SonosSpeaker():
         if force_refresh:
             track_info = self.soco.get_current_track_info()
             self.track_position = track_info['position']
-        if not self._track_position:
+        if not self._state.track_position:
             return "00:00:00"
-        return self._track_position
+        return self._state.track_position
 
     def set_trackposition(self, value, trigger_action=False):
         """
@@ -551,15 +700,7 @@ class SonosSpeaker():
                 self.zone_coordinator.set_trackposition(value, trigger_action)
             else:
                 self.soco.seek(value)
-        if self._track_position == value:
-            return
-        self._track_position = value
-        self.dirty_property('track_position')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_position')
+        self.apply_patch({'track_position': value})
 
     ### PLAYLIST POSITION ##############################################################################################
 
@@ -569,19 +710,11 @@ class SonosSpeaker():
             logger.debug("forwarding playlist_position getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.playlist_position
-        return self._playlist_position
+        return self._state.playlist_position
 
     @playlist_position.setter
     def playlist_position(self, value):
-        if self._playlist_position == value:
-            return
-        self._playlist_position = value
-        self.dirty_property('playlist_position')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('playlist_position')
+        self.apply_patch({'playlist_position': value})
 
     ### STREAMTYPE #####################################################################################################
 
@@ -591,19 +724,11 @@ class SonosSpeaker():
             logger.debug("forwarding streamtype getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.streamtype
-        return self._streamtype
+        return self._state.streamtype
 
     @streamtype.setter
     def streamtype(self, value):
-        if self._streamtype == value:
-            return
-        self._streamtype = value
-        self.dirty_property('streamtype')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('streamtype')
+        self.apply_patch({'streamtype': value})
 
     ### STOP ###########################################################################################################
 
@@ -612,7 +737,7 @@ class SonosSpeaker():
             logger.debug("forwarding stop getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.stop
-        return self._stop
+        return self._state.stop
 
     def set_stop(self, value, trigger_action=False):
         stop = int(value)
@@ -627,18 +752,9 @@ class SonosSpeaker():
                 else:
                     self.soco.play()
 
-        if self._stop == stop:
+        if self._state.stop == stop:
             return
-
-        self._stop = stop
-        self._play = int(not self._stop)
-        self._pause = 0
-        self.dirty_property('stop', 'play', 'pause')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('pause', 'play', 'stop')
+        self.apply_patch({'stop': stop, 'play': int(not stop), 'pause': 0})
 
     ### PLAY ###########################################################################################################
 
@@ -647,7 +763,7 @@ class SonosSpeaker():
             logger.debug("forwarding play getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.play
-        return self._play
+        return self._state.play
 
     def set_play(self, value, trigger_action=False):
         play = int(value)
@@ -662,18 +778,9 @@ class SonosSpeaker():
                 else:
                     self.soco.pause()
 
-        if self._play == play:
+        if self._state.play == play:
             return
-
-        self._play = play
-        self._pause = 0
-        self._stop = int(not self._play)
-        self.dirty_property('pause', 'play', 'stop')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('pause', 'play', 'stop')
+        self.apply_patch({'stop': int(not play), 'play': play, 'pause': 0})
 
     ### PAUSE ##########################################################################################################
 
@@ -682,7 +789,7 @@ class SonosSpeaker():
             logger.debug("forwarding pause getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.pause
-        return self._pause
+        return self._state.pause
 
     def set_pause(self, value, trigger_action=False):
         pause = int(value)
@@ -697,18 +804,9 @@ class SonosSpeaker():
                 else:
                     self.soco.play()
 
-        if self._pause == pause:
+        if self._state.pause == pause:
             return
-
-        self._pause = pause
-        self._play = int(not self._pause)
-        self._stop = 0
-        self.dirty_property('pause', 'play', 'stop')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('pause', 'play', 'stop')
+        self.apply_patch({'stop': 0, 'play': int(not pause), 'pause': pause})
 
     ### RADIO STATION ##################################################################################################
 
@@ -718,19 +816,11 @@ class SonosSpeaker():
             logger.debug("forwarding radio_station getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.radio_station
-        return self._radio_station
+        return self._state.radio_station
 
     @radio_station.setter
     def radio_station(self, value):
-        if self._radio_station == value:
-            return
-        self._radio_station = value
-        self.dirty_property('radio_station')
-
-        #dirty properties for all zone members, if coordinator
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('radio_station')
+        self.apply_patch({'radio_station': value})
 
     ### RADIO SHOW #####################################################################################################
 
@@ -740,18 +830,11 @@ class SonosSpeaker():
             logger.debug("forwarding radio_show getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.radio_show
-        return self._radio_show
+        return self._state.radio_show
 
     @radio_show.setter
     def radio_show(self, value):
-        if self._radio_show == value:
-            return
-        self._radio_show = value
-        self.dirty_property('radio_show')
-
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('radio_show')
+        self.apply_patch({'radio_show': value})
 
     ### TRACK ALBUM ART ################################################################################################
 
@@ -761,18 +844,11 @@ class SonosSpeaker():
             logger.debug("forwarding track_album_art getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.track_album_art
-        return self._track_album_art
+        return self._state.track_album_art
 
     @track_album_art.setter
     def track_album_art(self, value):
-        if self._track_album_art == value:
-            return
-        self._track_album_art = value
-        self.dirty_property('track_album_art')
-
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_album_art')
+        self.apply_patch({'track_album_art': value})
 
     ### TRACK TITLE ####################################################################################################
 
@@ -782,20 +858,13 @@ class SonosSpeaker():
             logger.debug("forwarding track_title getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.track_title
-        if not self._track_title:
+        if not self._state.track_title:
             return ''
-        return self._track_title
+        return self._state.track_title
 
     @track_title.setter
     def track_title(self, value):
-        if self._track_title == value:
-            return
-        self._track_title = value
-        self.dirty_property('track_title')
-
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_title')
+        self.apply_patch({'track_title': value})
 
     ### TRACK ARTIST ###################################################################################################
 
@@ -805,20 +874,13 @@ class SonosSpeaker():
             logger.debug("forwarding track_artist getter to coordinator with uid {uid}".
                          format(uid=self.zone_coordinator.uid))
             return self.zone_coordinator.track_artist
-        if not self._track_artist:
+        if not self._state.track_artist:
             return ''
-        return self._track_artist
+        return self._state.track_artist
 
     @track_artist.setter
     def track_artist(self, value):
-        if self._track_artist == value:
-            return
-        self._track_artist = value
-        self.dirty_property('track_artist')
-
-        if self.is_coordinator:
-            for speaker in self._zone_members:
-                speaker.dirty_property('track_artist')
+        self.apply_patch({'track_artist': value})
 
     ### NEXT ###########################################################################################################
 
@@ -903,99 +965,35 @@ class SonosSpeaker():
         to or from a group.
         """
 
-        self.dirty_property(
-            'track_title',
-            'track_position',
-            'track_album_art',
-            'track_artist',
-            'track_uri',
-            'track_duration',
-            'stop',
-            'play',
-            'pause',
-            'mute',
-            'radio_station',
-            'radio_show',
-            'playlist_position',
-            'streamtype',
-            'playmode',
-            'zone_icon',
-            'zone_name',
-            'playmode',
-        )
+        self.dirty_mask(MUSIC_METADATA_MASK)
 
     def dirty_all(self):
-
-        self.dirty_music_metadata()
-
-        self.dirty_property(
-            'tts_local_mode',
-            'ip',
-            'mac_address',
-            'software_version',
-            'hardware_version',
-            'serial_number',
-            'led',
-            'volume',
-            'max_volume',
-            'mute',
-            'additional_zone_members',
-            'status',
-            'model',
-            'bass',
-            'treble',
-            'loudness',
-            'alarms',
-            'is_coordinator'
-        )
+        self.dirty_mask(ALL_MASK)
 
     @property
     def alarms(self):
-        return self._alarms
+        return self._state.alarms
 
     @alarms.setter
     def alarms(self, value):
-        if value != self._alarms:
-            self._alarms = value
-            self.dirty_property('alarms')
+        self.apply_patch({'alarms': value})
 
     @property
     def status(self):
-        return self._status
+        return self._state.status
 
     @status.setter
     def status(self, value):
         # status == 0 -> speaker offline:
-        self._status = value
+        self.apply_patch({'status': value})
 
-        if self._status == 0:
+        if self._state.status == 0:
             self._tts_local_mode = False
-            self._streamtype = ''
-            self._volume = 0
-            self._bass = 0
-            self._treble = 0
-            self._loudness = 0
             self._additional_zone_members = ''
-            self._mute = False
-            self._led = True
-            self._stop = False
-            self._play = False
-            self._pause = False
-            self._track_title = ''
-            self._track_artist = ''
-            self._track_duration = "00:00:00"
-            self._track_position = "00:00:00"
-            self._playlist_position = 0
-            self._track_uri = ''
-            self._track_album_art = ''
-            self._radio_show = ''
-            self._radio_station = ''
-            self._max_volume = -1
-            self._zone_name = ''
-            self._zone_coordinator = ''
-            self._zone_icon = ''
-            self._playmode = ''
-            self._alarms = ''
+            # the values of an offline speaker are reset without sending them, the clients only get the status
+            self._state.apply(OFFLINE_STATE)
+            # an offline speaker is its own coordinator, the getters must not forward to the group
+            self._zone_coordinator = self
 
     def play_uri(self, uri, metadata=None):
 
@@ -1111,18 +1109,15 @@ class SonosSpeaker():
             return
 
     def play_tts(self, tts, volume, language='en', group_command=False, force_stream_mode=False, fade_in=False):
-        if (not self._tts_local_mode) or force_stream_mode:
+        if (not self._tts_local_mode) or force_stream_mode or SonosSpeaker.tts_engine is None:
             logger.warning('Google TTS local mode disabled, using radio stream mode!')
-            url = "x-rincon-mp3radio://translate.google.com/" \
-                  "translate_tts?ie=UTF-8&tl={lang}&q={message}".format(lang=language,
-                                                                        message=urllib.request.quote(tts))
+            url = GoogleTTSProvider.stream_url(tts, language)
         else:
             # we do not need any code here to get the zone coordinator.
             # The play_snippet function does the necessary work.
-            filename = utils.save_google_tts(SonosSpeaker.local_folder, tts, language, SonosSpeaker.quota)
-            if SonosSpeaker.local_folder.endswith('/'):
-                SonosSpeaker.local_folder = SonosSpeaker.local_folder[:-1]
-            url = '{}/{}'.format(SonosSpeaker.remote_folder, filename)
+            # The tts file is rendered by the engine's thread pool, we only wait until it is in the cache.
+            filename = SonosSpeaker.tts_engine.get(tts, language, timeout=definitions.TTS_TIMEOUT)
+            url = '{}/{}'.format(SonosSpeaker.remote_folder.rstrip('/'), filename)
 
         self.play_snippet(url, volume, group_command, fade_in)
 
@@ -1135,30 +1130,79 @@ class SonosSpeaker():
         we need to trigger all zone members, because slave members never trigger events
         '''
         for speaker in self._zone_members:
-            if len(speaker._dirty_properties) > 0:
+            if speaker._dirty:
                 speaker._send()
 
+    def snapshot(self, mask=ALL_MASK):
+        """
+        Reads the properties of a bitmask in one pass under the speaker lock. The group properties of a member are read
+        directly from its zone coordinator.
+        :param mask: bitmask of the properties (see PROPERTIES), default: all properties
+        :return: dict with the property values
+        """
+        values = {}
+        with self._lock:
+            group_source = self
+            if mask & GROUP_MASK and not self.is_coordinator:
+                group_source = self.zone_coordinator
+            while mask:
+                bit = mask & -mask
+                index = bit.bit_length() - 1
+                values[PROPERTIES[index]] = _PROPERTY_READERS[index](group_source if bit & GROUP_MASK else self)
+                mask ^= bit
+        return values
+
+    def retire(self):
+        """
+        Stops sending updates for this instance, after it was removed from the registry. Other threads may still hold
+        a reference. A new instance for the same speaker continues with the state version.
+        """
+        with self._lock:
+            self._retired = True
+            self._dirty = 0
+            _removed_state_versions[self.uid] = self._state_version
+
     def _send(self):
-        dirty_values = {}
-        for prop in self._dirty_properties:
-            value = getattr(self, prop)
-            dirty_values[prop] = value
-        if len(dirty_values) == 0:
-            return
+        # the snapshot and the state version are taken under the lock, the update is sent without it: the network
+        # i/o doesn't block the events and commands of the speaker. The first thread finding the outbox idle sends
+        # all queued updates, so they leave in the order of their state versions.
+        with self._lock:
+            mask = self._dirty
+            if not mask or self._retired:
+                return
+            self._dirty = 0
+            try:
+                dirty_values = self.snapshot(mask)
+            except Exception:
+                self._dirty |= mask
+                raise
 
-        '''
-        always add the uid
-        '''
-        dirty_values['uid'] = self.uid
+            '''
+            always add the uid and the new state version
+            '''
+            dirty_values['uid'] = self._uid
+            self._state_version += 1
+            dirty_values['state_version'] = self._state_version
+            self._pushes_sent += 1
 
-        data = json.dumps(self, default=lambda o: dirty_values, sort_keys=True, ensure_ascii=False, indent=4,
-                          separators=(',', ': '))
-        udp_broker.UdpBroker.udp_send(data)
+            self._outbox.append(dirty_values)
+            if self._sending:
+                return
+            self._sending = True
 
-        '''
-        empty list
-        '''
-        del self._dirty_properties[:]
+        try:
+            while True:
+                with self._lock:
+                    if not self._outbox:
+                        self._sending = False
+                        return
+                    dirty_values = self._outbox.popleft()
+                udp_broker.UdpBroker.udp_send(dirty_values)
+                push_broker.PushBroker.publish(dirty_values)
+        except Exception:
+            with self._lock:
+                self._sending = False
+            raise
 
     def event_unsubscribe(self):
 
@@ -1212,13 +1256,11 @@ class SonosSpeaker():
         :return:
         """
         try:
-            values = get_alarms(self.soco)
+            values = get_alarms(self.soco, zone_uid=self.uid)
         except:
             return {}
         alarm_dict = {}
         for alarm in values:
-            if alarm.zone.uid.lower() != self.uid.lower():
-                continue
             dict = SonosSpeaker.alarm_to_dict(alarm)
             alarm_dict[alarm._alarm_id] = dict
         self.alarms = alarm_dict
@@ -1239,29 +1281,68 @@ class SonosSpeaker():
         }
 
     def dirty_property(self, *args):
+        mask = 0
         for arg in args:
-            if arg not in self._dirty_properties:
-                self._dirty_properties.append(arg)
+            mask |= _PROPERTY_BITS[arg]
+        with self._lock:
+            self._dirty |= mask
 
-    def set_zone_coordinator(self):
-        soco = next(member for member in self.soco.group.members if member.is_coordinator is True)
-        if not soco:
-            '''
-            current instance is the coordinator
-            '''
-            self._zone_coordinator = None
-            self._snippet_event_thread.join()
-            self._snippet_event_thread = None
-
-        self._zone_coordinator = sonos_speakers[soco.uid.lower()]
-        self.dirty_property('is_coordinator')
-
-    def set_group_members(self):
-        del self.zone_members[:]
-        for member in self.soco.group.members:
-            member_uid = member.uid.lower()
-            if member_uid != self.uid:
-                self.zone_members.append(sonos_speakers[member_uid])
+    def dirty_mask(self, mask):
+        """
+        Marks the properties of a bitmask (see PROPERTIES) as dirty.
+        """
+        with self._lock:
+            self._dirty |= mask
+
+    def apply_patch(self, patch):
+        """
+        Writes new values to the speaker state in one pass. Only the values that really changed are marked dirty, the
+        changed group properties of a zone coordinator also for its zone members. An event without any effective
+        change does not cause an update to the clients.
+        :param patch: dict property name -> value
+        :return: bitmask of the changed properties
+        """
+        with self._lock:
+            changed = self._state.apply(patch)
+            self._dirty |= changed
+        group_changed = changed & GROUP_MASK
+        if group_changed and self.is_coordinator:
+            for speaker in self._zone_members:
+                speaker.dirty_mask(group_changed)
+        return changed
+
+    def event_received(self):
+        with self._lock:
+            self._events_received += 1
+
+    def event_statistics(self, reset=False):
+        """
+        Returns the number of events received for the speaker and the number of updates sent to the clients.
+        :param reset: If True, the counters are reset after they were read.
+        """
+        with self._lock:
+            statistics = {'events': self._events_received, 'updates': self._pushes_sent}
+            if reset:
+                self._events_received = 0
+                self._pushes_sent = 0
+        return statistics
+
+    def set_topology(self, coordinator, members, sub_members):
+        """
+        Sets the position of the speaker in the household, see update_topology().
+        :param coordinator: speaker of the zone coordinator, the speaker itself if it is the coordinator
+        :param members: the other zones of the group
+        :param sub_members: uids of the satellites and the stereo pair slave of the zone
+        """
+        if coordinator is not self._zone_coordinator:
+            self._zone_coordinator = coordinator
+            self.dirty_property('is_coordinator')
+        if members != self._zone_members:
+            self._zone_members = members
+            self.zone_member_changed()
+        if sub_members != self._sub_members:
+            self._sub_members = sub_members
+            self.dirty_property('sub_members')
 
     def process_snippets(self):
         while True:
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+
+logger = logging.getLogger('')
+
+REGISTRY_VERSION = 1
+REQUIRED_KEYS = ('uid', 'ip', 'household_id', 'speaker_info')
+# the static part of SoCo.speaker_info
+SPEAKER_INFO_KEYS = ('zone_name', 'zone_icon', 'serial_number', 'software_version', 'hardware_version', 'mac_address')
+
+
+def speaker_entry(speaker):
+    """
+    :return: the persisted data of a speaker: identity, static speaker info and its position in the household
+    """
+    return {
+        'uid': speaker.soco.uid,
+        'ip': speaker.ip,
+        'household_id': speaker.household_id,
+        'model': speaker.model,
+        'speaker_info': {key: speaker.soco.speaker_info.get(key, '') for key in SPEAKER_INFO_KEYS},
+        # uids of the registry (lower case)
+        'coordinator': speaker.zone_coordinator.uid,
+        'zone_members': sorted(member.uid for member in speaker.zone_members),
+        'sub_members': [uid for uid in speaker.sub_members.split(',') if uid],
+    }
+
+
+class SpeakerRegistry():
+    """
+    The speakers of the last discovery, persisted to a json file. At startup the broker registers them at once, so
+    commands are accepted before the first discovery has finished. The file is only written if its content changes.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+        self._saved = None
+
+    @property
+    def path(self):
+        return self._path
+
+    def load(self):
+        """
+        :return: list of speaker entries (see speaker_entry()), empty if there is no valid registry file
+        """
+        try:
+            with open(self._path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as err:
+            logger.warning('Could not read the speaker registry {path}: {err}'.format(path=self._path, err=err))
+            return []
+        if not isinstance(data, dict) or data.get('version') != REGISTRY_VERSION:
+            logger.warning('Ignoring the speaker registry {path}, unknown version'.format(path=self._path))
+            return []
+        entries = [entry for entry in data.get('speakers', [])
+                   if isinstance(entry, dict) and all(entry.get(key) for key in REQUIRED_KEYS)]
+        with self._lock:
+            self._saved = entries
+        return entries
+
+    def save(self, speakers):
+        """
+        Writes the registry file atomically.
+        :param speakers: the registered SonosSpeaker instances
+        """
+        entries = sorted((speaker_entry(speaker) for speaker in speakers), key=lambda entry: entry['uid'])
+        with self._lock:
+            if entries == self._saved:
+                return
+            tmp_path = None
+            try:
+                # a new file next to the registry, never an existing file (or symlink) with a predictable name
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._path)),
+                                                prefix='.speakers', suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({'version': REGISTRY_VERSION, 'speakers': entries}, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self._path)
+                tmp_path = None
+            except OSError as err:
+                logger.warning('Could not write the speaker registry {path}: {err}'.format(path=self._path, err=err))
+                return
+            finally:
+                if tmp_path is not None and os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            self._saved = entries
+        logger.debug('speaker registry: {count} speaker(s) saved'.format(count=len(entries)))
+
+
+# the registry used by the broker, None if disabled; it is set at startup
+speaker_registry = None
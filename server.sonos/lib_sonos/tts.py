@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+import base64
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import urllib
+import urllib.request
+from abc import ABCMeta, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from lib_sonos import utils
+
+logger = logging.getLogger('')
+
+
+class TTSProvider():
+    """
+    Base class for all text-to-speech backends. A provider only knows how to render a text into an audio file, the
+    caching, quota handling and threading is done by the TTSEngine.
+    """
+    __metaclass__ = ABCMeta
+
+    name = ''
+    extension = 'mp3'
+
+    def file_name(self, tts_string, tts_language):
+        """
+        Returns the (unique) file name for a tts string.
+        :param tts_string: text to be rendered
+        :param tts_language: language of the text
+        :return: file name without path
+        """
+        raw = '{}__{}'.format(tts_language, tts_string)
+        if self.name:
+            raw = '{}__{}'.format(self.name, raw)
+        base64_name = base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+        return '{}.{}'.format(base64_name, self.extension)
+
+    def available(self):
+        return True
+
+    @abstractmethod
+    def synthesize(self, tts_string, tts_language, abs_fname):
+        raise NotImplementedError("Method 'synthesize' must be implemented!")
+
+
+class GoogleTTSProvider(TTSProvider):
+    """
+    Fetches the audio file from the Google translate_tts endpoint.
+    The provider name is left empty to keep the file names of previously cached files valid.
+    """
+    name = ''
+    extension = 'mp3'
+    url = "http://translate.google.com/translate_tts?ie=UTF-8&tl={tts_language}&q={tts_string}"
+
+    def __init__(self, timeout=10):
+        self._timeout = timeout
+
+    @classmethod
+    def stream_url(cls, tts_string, tts_language):
+        """
+        Returns the Google TTS url as a Sonos radio stream uri.
+        """
+        url = cls.url.format(tts_language=tts_language, tts_string=urllib.request.quote(tts_string))
+        return url.replace('http://', 'x-rincon-mp3radio://', 1)
+
+    def synthesize(self, tts_string, tts_language, abs_fname):
+        url = self.url.format(tts_language=tts_language, tts_string=urllib.request.quote(tts_string))
+        try:
+            response = requests.get(url, timeout=self._timeout)
+        except requests.RequestException as err:
+            raise Exception("Couldn't obtain TTS from Google.\nError: {}".format(err))
+        if response.status_code != 200:
+            raise Exception("Couldn't obtain TTS from Google.\nStatus code: {}".format(response.status_code))
+        with open(abs_fname, 'wb') as file:
+            file.write(response.content)
+
+
+class LocalTTSProvider(TTSProvider):
+    """
+    Offline speech synthesis with 'espeak' or 'pico2wave'. No network access is needed.
+    """
+    extension = 'wav'
+
+    # pico2wave only accepts full language tags
+    pico_languages = {
+        'de': 'de-DE',
+        'en': 'en-US',
+        'es': 'es-ES',
+        'fr': 'fr-FR',
+        'it': 'it-IT',
+    }
+
+    def __init__(self, command='espeak', timeout=10):
+        if command not in ('espeak', 'pico2wave'):
+            raise ValueError("Unknown local tts engine '{command}'!".format(command=command))
+        self.name = command
+        self._command = command
+        self._timeout = timeout
+
+    def available(self):
+        return shutil.which(self._command) is not None
+
+    def command_line(self, tts_string, tts_language, abs_fname):
+        if self._command == 'pico2wave':
+            language = self.pico_languages.get(tts_language, tts_language)
+            return ['pico2wave', '-l', language, '-w', abs_fname, tts_string]
+        return ['espeak', '-v', tts_language, '-w', abs_fname, tts_string]
+
+    def synthesize(self, tts_string, tts_language, abs_fname):
+        try:
+            subprocess.check_call(self.command_line(tts_string, tts_language, abs_fname), timeout=self._timeout,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.SubprocessError) as err:
+            raise Exception("Couldn't render TTS with '{command}'.\nError: {err}".format(command=self._command,
+                                                                                        err=err))
+
+
+def get_provider(name):
+    """
+    Factory function for all known tts providers.
+    :param name: google, espeak or pico2wave
+    """
+    name = name.lower().strip()
+    if name == 'google':
+        return GoogleTTSProvider()
+    if name in ('espeak', 'pico2wave', 'pico'):
+        return LocalTTSProvider('pico2wave' if name == 'pico' else name)
+    raise ValueError("Unknown tts engine '{name}'!".format(name=name))
+
+
+class TTSEngine():
+    """
+    Renders tts strings with a provider into 'local_folder' and caches the result. All work is done by a thread pool,
+    requests for the same text are coalesced.
+    """
+
+    def __init__(self, provider, local_folder, quota, workers=2):
+        self._provider = provider
+        self._local_folder = local_folder
+        self._quota = quota
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    @property
+    def provider(self):
+        return self._provider
+
+    def _quota_exceeded(self):
+        size = int(utils.get_folder_size(self._local_folder) / 1024 / 1024)
+        if size == 0:
+            size = 1
+        return self._quota < size
+
+    def submit(self, tts_string, tts_language):
+        """
+        Starts the rendering of a tts string in the background.
+        :return: a Future, the result is the file name relative to 'local_folder'
+        """
+        fname = self._provider.file_name(tts_string, tts_language)
+
+        # check if file exists, no need to render it again
+        if os.path.exists(os.path.join(self._local_folder, fname)):
+            future = Future()
+            future.set_result(fname)
+            return future
+
+        if self._quota_exceeded():
+            # since this is a const value, no more files will be written (only this file onetime)
+            tts_language = 'en'
+            tts_string = 'Cannot save file. File size quota exceeded!'
+            fname = self._provider.file_name(tts_string, tts_language)
+            if os.path.exists(os.path.join(self._local_folder, fname)):
+                future = Future()
+                future.set_result(fname)
+                return future
+
+        with self._lock:
+            if fname in self._pending:
+                return self._pending[fname]
+            future = self._executor.submit(self._render, tts_string, tts_language, fname)
+            self._pending[fname] = future
+        future.add_done_callback(lambda f: self._done(fname))
+        return future
+
+    def _done(self, fname):
+        with self._lock:
+            self._pending.pop(fname, None)
+
+    def _render(self, tts_string, tts_language, fname):
+        abs_fname = os.path.join(self._local_folder, fname)
+
+        # render to a temporary file first, speakers must never see a half written file
+        fd, tmp_fname = tempfile.mkstemp(suffix='.' + self._provider.extension, dir=self._local_folder)
+        os.close(fd)
+        try:
+            self._provider.synthesize(tts_string, tts_language, tmp_fname)
+            os.chmod(tmp_fname, 0o444)
+            os.replace(tmp_fname, abs_fname)
+        finally:
+            if os.path.exists(tmp_fname):
+                os.remove(tmp_fname)
+        logger.debug("tts file '{fname}' rendered by '{provider}'".format(fname=fname,
+                                                                         provider=self._provider.__class__.__name__))
+        return fname
+
+    def get(self, tts_string, tts_language, timeout=None):
+        """
+        Blocks until the tts string is available in the cache.
+        :return: file name relative to 'local_folder'
+        """
+        return self.submit(tts_string, tts_language).result(timeout)
+
+    def prerender(self, phrases, tts_language):
+        """
+        Renders a list of common phrases in the background, e.g. at startup.
+        """
+        for phrase in phrases:
+            future = self.submit(phrase, tts_language)
+            future.add_done_callback(self._log_prerender)
+
+    @staticmethod
+    def _log_prerender(future):
+        err = future.exception()
+        if err is not None:
+            logger.warning("Could not pre-render tts phrase. Error: {err}".format(err=err))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -1,71 +1,215 @@
 # -*- coding: utf-8 -*-
+import json
 import logging
 import errno
 import socket
+import threading
+import time
 
 logger = logging.getLogger('')
 registered_clients = {}
+_clients_lock = threading.RLock()
+
+# these keys are always sent, the client needs them to assign the values to a speaker
+ALWAYS_SENT = ('uid', 'state_version')
+
+
+class ClientFilter():
+    """
+    Subscription filter of a client. Only the attributes of the given speakers are sent to the client, at most
+    'max_rate' messages per second and speaker. Updates within this interval are merged and sent delayed.
+    """
+
+    def __init__(self, uids=None, attributes=None, max_rate=None):
+        self.uids = frozenset(uid.lower() for uid in uids) if uids else None
+        self.attributes = frozenset(attributes) if attributes else None
+        self.max_rate = float(max_rate) if max_rate else None
+        self._last_sent = {}
+        self._pending = {}
+        # uid -> state version of the last message sent to the client
+        self._delivered = {}
+        self._lock = threading.Lock()
+
+    @property
+    def key(self):
+        """
+        Clients with the same filter (except the rate) get the same message, so it is encoded only once.
+        """
+        return self.uids, self.attributes
+
+    def select(self, values):
+        """
+        Returns the values matching the filter or None, if nothing has to be sent. Updates without any of the filtered
+        attributes are not sent at all, the versions of the client are tracked per client (see chain()).
+        """
+        if self.uids is not None and values['uid'] not in self.uids:
+            return None
+        if self.attributes is None:
+            return values
+        selected = {key: value for key, value in values.items() if key in self.attributes}
+        if not selected:
+            return None
+        for key in ALWAYS_SENT:
+            if key in values:
+                selected[key] = values[key]
+        return selected
+
+    def throttle(self, values, send):
+        """
+        Returns the values to send now or None, if the client has received a message for this speaker within the
+        last 1/max_rate seconds. In this case the values are merged with other pending values and 'send' is called
+        with the merged values once the interval is over.
+        """
+        if self.max_rate is None:
+            return values
+        uid = values['uid']
+        interval = 1 / self.max_rate
+        with self._lock:
+            now = time.time()
+            due = self._last_sent.get(uid, 0) + interval
+            if uid not in self._pending and now >= due:
+                self._last_sent[uid] = now
+                return values
+            if uid not in self._pending:
+                timer = threading.Timer(due - now, self._flush, (uid, send))
+                timer.daemon = True
+                timer.start()
+            self._pending.setdefault(uid, {}).update(values)
+        return None
+
+    def _flush(self, uid, send):
+        with self._lock:
+            values = self._pending.pop(uid, None)
+            self._last_sent[uid] = time.time()
+        if values:
+            send(values)
+
+    def chain(self, values):
+        """
+        Adds 'previous_version' to the values sent to the client: the state version of the last message the client
+        got for this speaker (null for the first one). Filtered or merged updates are not sent, so the client can't
+        expect consecutive versions; a 'previous_version' differing from the last received version means that a
+        message got lost.
+        """
+        version = values.get('state_version')
+        if version is None:
+            return values
+        with self._lock:
+            previous = self._delivered.get(values['uid'])
+            self._delivered[values['uid']] = version
+        return dict(values, previous_version=previous)
+
+    def delivered_version(self, uid, default=None):
+        """
+        Returns the state version of the last message sent to the client for a speaker.
+        """
+        with self._lock:
+            return self._delivered.get(uid, default)
+
+    def take_over(self, other):
+        """
+        A new subscription of the same client continues the versions sent with the previous subscription.
+        """
+        with other._lock:
+            delivered = dict(other._delivered)
+        with self._lock:
+            self._delivered.update(delivered)
+
+    def __str__(self):
+        return 'uids: {uids}, attributes: {attributes}, max_rate: {rate}'.format(
+            uids=sorted(self.uids) if self.uids else 'all', attributes=sorted(self.attributes) if self.attributes
+            else 'all', rate=self.max_rate or 'unlimited')
+
+
+def _encode(values):
+    return json.dumps(values, sort_keys=True, ensure_ascii=False, indent=4, separators=(',', ': ')).encode('utf-8')
 
 
 class UdpBroker():
+    _sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
     @staticmethod
-    def subscribe_client(ip, port):
-        logger.info('register client for udp messages: {host}:{port}'.format(host=ip, port=port))
-        if ip not in registered_clients:
-            registered_clients.update({ip: [port]})
-        else:
-            ports = registered_clients[ip]
-            if port not in ports:
-                registered_clients[ip].append(port)
-
-        logger.info("registered clients: {clients}".format(clients=", ".join(['{ip}:{port}'.format(ip=key, port=value)
-                                                                              for (key, value) in
-                                                                              registered_clients.items()])))
+    def subscribe_client(ip, port, client_filter=None):
+        if client_filter is None:
+            client_filter = ClientFilter()
+        logger.info('register client for udp messages: {host}:{port} -- filter: {filter}'.format(
+            host=ip, port=port, filter=client_filter))
+        with _clients_lock:
+            # a new subscription of a registered client replaces its filter
+            ports = registered_clients.setdefault(ip, {})
+            if port in ports:
+                client_filter.take_over(ports[port])
+            ports[port] = client_filter
+
+        logger.info("registered clients: {clients}".format(clients=UdpBroker.clients()))
 
     @staticmethod
     def unsubscribe_client(ip, port):
         logger.info('un-register client for udp messages: {host}:{port}'.format(host=ip, port=port))
-        if ip in registered_clients:
-            if port in registered_clients[ip]:
-                registered_clients[ip].remove(port)
+        with _clients_lock:
+            if ip in registered_clients:
+                registered_clients[ip].pop(port, None)
+
+                if len(registered_clients[ip]) == 0:
+                    registered_clients.pop(ip)
+
+        logger.info("registered clients: {clients}".format(clients=UdpBroker.clients()))
 
-            if len(registered_clients[ip]) == 0:
-                registered_clients.pop(ip)
+    @staticmethod
+    def clients():
+        with _clients_lock:
+            return ", ".join(['{ip}:{port}'.format(ip=ip, port=port) for ip, ports in registered_clients.items()
+                              for port in ports])
+
+    @staticmethod
+    def client_filter(ip, port):
+        """
+        Returns the filter of a subscribed client or None.
+        """
+        with _clients_lock:
+            return registered_clients.get(ip, {}).get(port)
+
+    @staticmethod
+    def udp_send(values):
+        """
+        Sends the values of a speaker to all registered clients. Every client only gets the values matching its
+        filter, the message is encoded once per distinct filter and previous version.
+        :param values: dict with the changed values, must contain the speaker 'uid'
+        """
+        logger.info("sending sonos speaker data: {}".format(values))
+        with _clients_lock:
+            clients = [(host, port, client_filter) for host, ports in registered_clients.items()
+                       for port, client_filter in ports.items()]
 
-        logger.info("registered clients: {clients}".format(
-            clients=", ".join(['{ip}:{port}'.format(ip=key, port=value) for (key, value)
-                               in registered_clients.items()])))
+        encoded = {}
+        for host, port, client_filter in clients:
+            selected = client_filter.select(values)
+            if selected is None:
+                continue
+            selected = client_filter.throttle(selected, lambda delayed, h=host, p=port, f=client_filter:
+                                              UdpBroker._send_to(h, p, _encode(f.chain(delayed))))
+            if selected is None:
+                continue
+            selected = client_filter.chain(selected)
+            key = (client_filter.key, selected.get('previous_version'))
+            if key not in encoded:
+                encoded[key] = _encode(selected)
+            UdpBroker._send_to(host, port, encoded[key])
 
     @staticmethod
-    def udp_send(data):
-        logger.info("registered clients: {clients}".format(
-            clients=", ".join(['{ip}:{port}'.format(ip=key, port=value) for (key, value)
-                               in registered_clients.items()])))
-        logger.info("sending sonos speaker data: {}".format(data))
-        for host, ports in registered_clients.items():
-            for port in ports:
-                try:
-                    family, type, proto, canonname, sockaddr = socket.getaddrinfo(host, port)[0]
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-                    try:
-                        sock.sendto(data.encode('utf-8'), (sockaddr[0], sockaddr[1]))
-                    except socket.error as e:
-                        if isinstance(e.args, tuple):
-                            if e[0] == errno.EPIPE:
-                                # remote peer disconnected
-                                logger.warning("Detected remote disconnect")
-                            else:
-                                logger.warning(e)
-                                pass
-                        else:
-                            logger.error("socket error {}".format(e))
-
-                        sock.close()
-
-                    except IOError as e:
-                        logger.error("Got IO error: {}".format(e))
-                except Exception as err:
-                    logger.error(err)
-                    # remove client from the list
-                    UdpBroker.unsubscribe_client(host, port)
-                    pass
\ No newline at end of file
+    def _send_to(host, port, data):
+        try:
+            family, type, proto, canonname, sockaddr = socket.getaddrinfo(host, port, socket.AF_INET,
+                                                                          socket.SOCK_DGRAM)[0]
+            try:
+                UdpBroker._sock.sendto(data, (sockaddr[0], sockaddr[1]))
+            except socket.error as e:
+                if e.errno == errno.EPIPE:
+                    # remote peer disconnected
+                    logger.warning("Detected remote disconnect")
+                else:
+                    logger.warning(e)
+        except Exception as err:
+            logger.error(err)
+            # remove client from the list
+            UdpBroker.unsubscribe_client(host, port)
@@ -1,13 +1,11 @@
 from __future__ import unicode_literals
 
 # -*- coding: utf-8 -*-
-import base64
 import ctypes
 import json
 import os
 import platform
 import socket
-import requests
 import re
 import urllib
 import urllib.request
@@ -110,40 +108,6 @@ def get_folder_size(folder):
     return total_size
 
 
-def save_google_tts(local_share, tts_string, tts_language, quota):
-    size = int(get_folder_size(local_share) / 1024 / 1024)
-    if size == 0:
-        size = 1
-
-    if quota < size:
-        # since this is a const value, no more files will be written (only this mp3 onetime)
-        tts_language = 'en'
-        tts_string = 'Cannot save file. File size quota exceeded!'
-
-    url = "http://translate.google.com/translate_tts?ie=UTF-8&tl={tts_language}&q={tts_string}"
-    url = url.format(tts_language=tts_language, tts_string=urllib.request.quote(tts_string))
-    base64_name = base64.urlsafe_b64encode('{}__{}'.format(tts_language, tts_string).encode('utf-8')).decode('ascii', '')
-
-    fname = '{}.mp3'.format(base64_name)
-    abs_fname = os.path.join(local_share, fname)
-
-    # check if file exists, no need to browse google tts
-    if os.path.exists(abs_fname):
-        return fname
-
-    try:
-        response = requests.get(url)
-        if response and response.status_code == 200:
-            with open(abs_fname, 'wb') as file:
-                file.write(response.content)
-            os.chmod(abs_fname, 0o444)
-            return fname
-        else:
-            raise requests.RequestException('Status code: {}'.format(response.status_code))
-    except requests.RequestException as e:
-        raise ("Couldn't obtain TTS from Google.\nError: {}".format(e.errno))
-
-
 def to_json(value):
     return json.dumps(value, default=lambda o: value, ensure_ascii=False, indent=4)
 
@@ -203,6 +167,33 @@ def get_interface_ip(ifname):
     return socket.inet_ntoa(fcntl.ioctl(s.fileno(), 0x8915, struct.pack('256s', ifname[:15].encode('utf-8')))[20:24])
 
 
+def get_interface_ips(interfaces=None):
+    """
+    The IPv4 addresses of network interfaces, e.g. to search for speakers in several networks.
+    :param interfaces: interface names or ip addresses. If None, all interfaces except the loopback interface.
+    :return: list of ip addresses, interfaces without an address are skipped
+    """
+    if interfaces is None:
+        try:
+            interfaces = [name for index, name in socket.if_nameindex()]
+        except (AttributeError, OSError):
+            # no interface list on this platform, the system default interface is used
+            return []
+    ips = []
+    for interface in interfaces:
+        if ip_address_is_valid(interface):
+            ip = interface
+        else:
+            try:
+                ip = get_interface_ip(interface)
+            except (IOError, NameError):
+                logger.debug('No ip address for network interface {name}'.format(name=interface))
+                continue
+        if not ip.startswith('127.') and ip not in ips:
+            ips.append(ip)
+    return ips
+
+
 def get_lan_ip_fallback():
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -5,7 +5,7 @@ setup(
     name='sonos_broker',
     version='{version}'.format(version=definitions.VERSION),
     packages=['lib_sonos', 'soco'],
-    scripts=['sonos_broker', 'sonos_broker.cfg', 'sonos_cmd'],
+    scripts=['sonos_broker', 'sonos_broker.cfg', 'radio_rules.cfg', 'sonos_cmd'],
     url='https://github.com/pfischi/shSonos',
     license='',
     author='pfischi',
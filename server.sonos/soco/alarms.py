@@ -5,7 +5,7 @@
 from __future__ import unicode_literals
 
 import logging
-from datetime import datetime
+from datetime import datetime, time
 import re
 import weakref
 from .core import PLAY_MODES
@@ -14,6 +14,8 @@ from .xml import XML
 
 log = logging.getLogger(__name__)  # pylint: disable=C0103
 TIME_FORMAT = "%H:%M:%S"
+# the last alarm list and its parsed attributes, see _parse_alarm_list
+_ALARM_LIST_CACHE = [None, []]
 
 
 def is_valid_recurrence(text):
@@ -243,19 +245,51 @@ class Alarm(object):
         self._alarm_id = None
 
 
-def get_alarms(soco=None):
+def _parse_time(text):
+    """Parse a 'HH:MM:SS' string, much faster than datetime.strptime.
+
+    Returns:
+        datetime.time: the parsed time, or None if text is empty
+    """
+    if not text:
+        return None
+    hours, minutes, seconds = text.split(':')
+    return time(int(hours), int(minutes), int(seconds))
+
+
+def _parse_alarm_list(alarm_list):
+    """Return the attributes of all alarms in an alarm list.
+
+    The list is the same for all zones of a household, so the result of the
+    last list is kept. Usually get_alarms is called for every zone after an
+    alarm has changed.
+    """
+    cached_list, cached_values = _ALARM_LIST_CACHE
+    if alarm_list == cached_list:
+        return cached_values
+    tree = XML.fromstring(alarm_list.encode('utf-8'))
+    values = [alarm.attrib for alarm in tree.iterfind('Alarm')]
+    _ALARM_LIST_CACHE[:] = [alarm_list, values]
+    return values
+
+
+def get_alarms(soco=None, zone_uid=None):
     """Get a set of all alarms known to the Sonos system.
 
     Args:
         soco (SoCo, optional): a SoCo instance to query. If None, a random
         instance is used. Defaults to None
+        zone_uid (str, optional): only return the alarms of the zone with this
+        uid (case insensitive). The other alarms are skipped without being
+        decoded. Defaults to None (all alarms)
 
     Returns:
         set: A set of Alarm instances
 
     Note:
         Any existing Alarm instance will have its attributes updated to those
-        currently stored on the Sonos system.
+        currently stored on the Sonos system. Alarms of zones missing from the
+        zone group state are skipped.
 
     """
     # Get a soco instance to query. It doesn't matter which.
@@ -263,7 +297,6 @@ def get_alarms(soco=None):
         soco = discover().pop()
     response = soco.alarmClock.ListAlarms()
     alarm_list = response['CurrentAlarmList']
-    tree = XML.fromstring(alarm_list.encode('utf-8'))
 
     # An alarm list looks like this:
     # <Alarms>
@@ -281,30 +314,37 @@ def get_alarms(soco=None):
     #          IncludeLinkedZones="0"/>
     # </Alarms>
 
+    if zone_uid is not None:
+        zone_uid = zone_uid.upper()
+    # The zone group state is parsed once, the zones are looked up by uid
+    zones = soco.zone_index
+
     # pylint: disable=protected-access
-    alarms = tree.findall('Alarm')
     result = set()
-    for alarm in alarms:
-        values = alarm.attrib
+    for values in _parse_alarm_list(alarm_list):
+        room_uid = values['RoomUUID']
+        if zone_uid is not None and room_uid.upper() != zone_uid:
+            continue
+        zone = zones.get(room_uid)
+        if zone is None:
+            log.debug("Skipping alarm %s of unknown zone %s", values['ID'],
+                      room_uid)
+            continue
         alarm_id = values['ID']
         # If an instance already exists for this ID, update and return it.
         # Otherwise, create a new one and populate its values
-        if Alarm._all_alarms.get(alarm_id):
-            instance = Alarm._all_alarms.get(alarm_id)
-        else:
+        instance = Alarm._all_alarms.get(alarm_id)
+        if instance is None:
             instance = Alarm(None)
             instance._alarm_id = alarm_id
             Alarm._all_alarms[instance._alarm_id] = instance
 
-        instance.start_time = datetime.strptime(
-            values['StartTime'], "%H:%M:%S").time()  # NB StartTime, not
-        # StartLocalTime, which is used by CreateAlarm
-        instance.duration = None if values['Duration'] == '' else\
-            datetime.strptime(values['Duration'], "%H:%M:%S").time()
+        # NB StartTime, not StartLocalTime, which is used by CreateAlarm
+        instance.start_time = _parse_time(values['StartTime'])
+        instance.duration = _parse_time(values['Duration'])
         instance.recurrence = values['Recurrence']
         instance.enabled = values['Enabled'] == '1'
-        instance.zone = [zone for zone in soco.all_zones
-                         if zone.uid == values['RoomUUID']][0]
+        instance.zone = zone
         instance.program_uri = None if values['ProgramURI'] ==\
             "x-rincon-buzzer:0" else values['ProgramURI']
         instance.program_metadata = values['ProgramMetaData']
@@ -10,11 +10,13 @@ import socket
 import logging
 import re
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from .services import DeviceProperties, ContentDirectory
 from .services import RenderingControl, AVTransport, ZoneGroupTopology
 from .services import AlarmClock
-from .groups import ZoneGroup
+from .groups import ZoneGroup, ZoneTopology, parse_channel_map
 from .exceptions import DIDLMetadataError, SoCoUPnPException
 from .data_structures import DidlPlaylistContainer,\
     SearchResult, Queue, DidlObject, DidlMusicAlbum,\
@@ -199,12 +201,15 @@ class SoCo(_SocoSingletonBase):
         # Some private attributes
         self._all_zones = set()
         self._groups = set()
+        self._household_id = None
         self._is_bridge = None
         self._is_coordinator = False
         self._player_name = None
         self._uid = None
         self._visible_zones = set()
         self._zgs_cache = None
+        self._zone_index = {}
+        self._topology = {}
 
         _LOG.debug("Created SoCo instance for ip: %s", ip_address)
 
@@ -235,6 +240,16 @@ class SoCo(_SocoSingletonBase):
             ('DesiredConfiguration', '')
             ])
 
+    @property
+    def household_id(self):
+        """ The id of the household (Sonos system) the zone belongs to. Looks
+        like: Sonos_XXXXXXXXXXXXXXXXXXXXXXXXXX """
+        # It doesn't change, discovery sets it from the search response
+        if self._household_id is None:
+            self._household_id = self.deviceProperties.GetHouseholdID()[
+                'CurrentHouseholdID']
+        return self._household_id
+
     @property
     def uid(self):
         """ A unique identifier.  Looks like: RINCON_000XXXXXXXXXX1400 """
@@ -703,6 +718,9 @@ class SoCo(_SocoSingletonBase):
             # the zone is as yet unseen.
             zone._uid = member_attribs['UUID']
             zone._player_name = member_attribs['ZoneName']
+            # all zones of a zone group state belong to the same household
+            if zone._household_id is None:
+                zone._household_id = self._household_id
             # add the zone to the set of all members, and to the set
             # of visible members if appropriate
             is_visible = False if member_attribs.get(
@@ -710,6 +728,7 @@ class SoCo(_SocoSingletonBase):
             if is_visible:
                 self._visible_zones.add(zone)
             self._all_zones.add(zone)
+            self._zone_index[zone._uid] = zone
             return zone
 
         # This is called quite frequently, so it is worth optimising it.
@@ -727,6 +746,15 @@ class SoCo(_SocoSingletonBase):
         # and the set of all members
         self._all_zones.clear()
         self._visible_zones.clear()
+        # a new dict, so the index returned by zone_index never changes
+        self._zone_index = {}
+        # uid -> (role, main uid, channels), built in the same pass
+        roles = {}
+        # pair slave uid -> uid of the visible part of the stereo pair
+        pair_masters = {}
+        # satellite uid -> (uid of the main player of the home theatre,
+        # channels), for satellites listed as ZoneGroupMember elements
+        satellite_masters = {}
         # Loop over each ZoneGroup Element
         for group_element in tree.findall('ZoneGroup'):
             coordinator_uid = group_element.attrib['Coordinator']
@@ -752,18 +780,68 @@ class SoCo(_SocoSingletonBase):
                     'IsZoneBridge') == '1' else False
                 # add the zone to the members for this group
                 members.add(zone)
+                # The visible part of a stereo pair lists both players in its
+                # channel map, the invisible part is its sub-member. The main
+                # player of a home theatre lists itself and its satellites.
+                channel_map = dict(parse_channel_map(
+                    member_element.attrib.get('ChannelMapSet', '')))
+                satellite_channels = dict(parse_channel_map(
+                    member_element.attrib.get('HTSatChanMapSet', '')))
+                main_uid = zone._uid
+                channels = channel_map.get(main_uid) or \
+                    satellite_channels.get(main_uid, '')
+                if zone._is_bridge:
+                    roles[main_uid] = (ZoneTopology.BRIDGE, None, channels)
+                elif member_element.attrib.get('Invisible') == '1':
+                    roles[main_uid] = (ZoneTopology.PAIR_SLAVE,
+                                       coordinator_uid, channels)
+                else:
+                    roles[main_uid] = (ZoneTopology.ZONE, None, channels)
+                    for uid in channel_map:
+                        if uid != main_uid:
+                            pair_masters[uid] = main_uid
+                    for uid, sat_channels in satellite_channels.items():
+                        if uid != main_uid:
+                            satellite_masters[uid] = (main_uid, sat_channels)
                 # Loop over Satellite elements if present, and process as for
                 # ZoneGroup elements
                 for satellite_element in member_element.findall('Satellite'):
                     zone = parse_zone_group_member(satellite_element)
                     # Assume a satellite can't be a bridge or coordinator, so
                     # no need to check.
+                    roles[zone._uid] = (ZoneTopology.SATELLITE, main_uid,
+                                        satellite_channels.get(zone._uid, ''))
                     #
                     # Add the zone to the members for this group.
                     members.add(zone)
                 # Now create a ZoneGroup with this info and add it to the list
                 # of groups
             self._groups.add(ZoneGroup(group_uid, group_coordinator, members))
+        self._topology = self._build_topology(roles, pair_masters,
+                                              satellite_masters)
+
+    @staticmethod
+    def _build_topology(roles, pair_masters, satellite_masters):
+        """ Create the ZoneTopology of every player. An invisible player
+        listed in the HTSatChanMapSet of a home theatre is one of its
+        satellites. The slave of a stereo pair belongs to the player listing
+        it in its channel map, if there is none, to the coordinator of its
+        group. """
+        sub_uids = {}
+        for uid, (role, main_uid, channels) in roles.items():
+            if role == ZoneTopology.PAIR_SLAVE:
+                if uid in satellite_masters:
+                    role = ZoneTopology.SATELLITE
+                    main_uid, sat_channels = satellite_masters[uid]
+                    channels = channels or sat_channels
+                else:
+                    main_uid = pair_masters.get(uid, main_uid)
+                roles[uid] = (role, main_uid, channels)
+            if main_uid is not None:
+                sub_uids.setdefault(main_uid, []).append(uid)
+        return {uid: ZoneTopology(uid, role, main_uid,
+                                  sorted(sub_uids.get(uid, ())), channels)
+                for uid, (role, main_uid, channels) in roles.items()}
 
     @property
     def all_groups(self):
@@ -799,6 +877,20 @@ class SoCo(_SocoSingletonBase):
         self._parse_zone_group_state()
         return self._all_zones
 
+    @property
+    def zone_index(self):
+        """ Return a dict of all the available zones by uid. The dict is
+        rebuilt when the topology changes, treat it as read-only."""
+        self._parse_zone_group_state()
+        return self._zone_index
+
+    @property
+    def topology(self):
+        """ Return a dict of the ZoneTopology of all players by uid. The
+        dict is rebuilt when the topology changes, treat it as read-only."""
+        self._parse_zone_group_state()
+        return self._topology
+
     @property
     def visible_zones(self):
         """ Return an set of all visible zones"""
@@ -1303,12 +1395,23 @@ class SoCo(_SocoSingletonBase):
             search += ':' + url_escape_path(really_unicode(search_term))
 
         item_list = []
-        metadata = {'total_matches': 100000}
-        while len(item_list) < metadata['total_matches']:
-            # Change start and max for complete searches
-            if complete_result:
-                start, max_items = len(item_list), 100000
-
+        if complete_result:
+            # Get all pages, the remaining pages are requested concurrently
+            metadata = {'total_matches': 0, 'update_id': None}
+            try:
+                for page in self.browse_pages(
+                        search, full_album_art_uri=full_album_art_uri):
+                    metadata['total_matches'] = page.total_matches
+                    metadata['update_id'] = page.update_id
+                    item_list.extend(page)
+            except SoCoUPnPException as exception:
+                # 'No such object' UPnP errors
+                if exception.error_code == '701':
+                    return SearchResult([], search_type, 0, 0, None)
+                else:
+                    raise exception
+            metadata['number_returned'] = len(item_list)
+        else:
             # Try and get this batch of results
             try:
                 response, metadata =\
@@ -1329,14 +1432,7 @@ class SoCo(_SocoSingletonBase):
                 # Append the item to the list
                 item_list.append(item)
 
-            # If we are not after the complete results, the stop after 1
-            # iteration
-            if not complete_result:
-                break
-
         metadata['search_type'] = search_type
-        if complete_result:
-            metadata['number_returned'] = len(item_list)
 
         # pylint: disable=star-args
         return SearchResult(item_list, **metadata)
@@ -1490,6 +1586,93 @@ class SoCo(_SocoSingletonBase):
             metadata[camel_to_underscore(tag)] = int(response[tag])
         return response, metadata
 
+    def _browse_range(self, object_id, start, count):
+        """Browse exactly ``count`` children of ``object_id`` from
+        ``start`` on (fewer at the end of the list).
+
+        The unit may return less items than requested, the missing items are
+        requested until the range is complete.
+
+        Returns:
+            tuple: (items, metadata) with the metadata of the last request
+        """
+        items = []
+        metadata = None
+        while len(items) < count:
+            response, metadata = self._music_lib_search(
+                object_id, start + len(items), count - len(items))
+            page = from_didl_string(response['Result']) \
+                if response['Result'] else []
+            if not page:
+                break
+            items.extend(page)
+        return items, metadata
+
+    def browse_pages(self, object_id, start=0, page_size=100, window=4,
+                     full_album_art_uri=False):
+        """Generator over all children of a ContentDirectory object, page
+        by page
+
+        The first page is requested alone to get the total number of
+        matches, the remaining pages are requested concurrently with at most
+        ``window`` requests in flight. The pages are yielded in order and
+        only ``window`` pages are held in memory at a time.
+
+        :param object_id: The object to browse, e.g. 'A:TRACKS' or 'Q:0'
+        :param start: Index of the first item
+        :param page_size: Number of items per request
+        :param window: Maximum number of concurrent requests
+        :param full_album_art_uri: If the album art URI should include the
+            IP address
+        :returns: A generator of :py:class:`~.soco.data_structures.SearchResult`
+            objects, one per page, with the total_matches and update_id of the
+            first page
+        :raises: SoCoUPnPException: With ``error_code='701'`` if the object
+            cannot be browsed
+        """
+        def page_result(items):
+            if full_album_art_uri:
+                for item in items:
+                    self._update_album_art_to_full_uri(item)
+            return SearchResult(items, 'browse', len(items), total, update_id)
+
+        items, metadata = self._browse_range(object_id, start, page_size)
+        if metadata is None:
+            return
+        total, update_id = metadata['total_matches'], metadata['update_id']
+        yield page_result(items)
+        if len(items) < page_size:
+            return
+
+        offsets = deque(range(start + page_size, total, page_size))
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max(window, 1))
+        try:
+            while offsets or pending:
+                while offsets and len(pending) < window:
+                    pending.append(executor.submit(
+                        self._browse_range, object_id, offsets.popleft(),
+                        page_size))
+                items, metadata = pending.popleft().result()
+                if not items:
+                    # the list got shorter in the meantime
+                    break
+                yield page_result(items)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def browse_items(self, object_id, start=0, page_size=100, window=4,
+                     full_album_art_uri=False):
+        """Generator over all children of a ContentDirectory object, item by
+        item. See :py:meth:`browse_pages`.
+        """
+        for page in self.browse_pages(object_id, start, page_size, window,
+                                      full_album_art_uri):
+            for item in page:
+                yield item
+
     def add_uri_to_queue(self, uri):
         """Adds the URI to the queue
 
@@ -1585,20 +1768,38 @@ class SoCo(_SocoSingletonBase):
         """
         return self.__get_radio_favorites(RADIO_STATIONS, start, max_items)
 
+    def get_sonos_favorites(self, start=0, max_items=100):
+        """ Get Sonos favorites.
+
+        Returns:
+        A list containing the total number of favorites, the number of
+        favorites returned, and the actual list of favorites, represented as a
+        dictionary with `title`, `uri` and `meta` keys. `meta` is the DIDL
+        metadata needed to play the favorite.
+
+        """
+        return self.__get_radio_favorites(SONOS_FAVORITES, start, max_items)
+
     def __get_radio_favorites(self, favorite_type, start=0, max_items=100):
         """ Helper method for `get_favorite_radio_*` methods.
 
         Arguments:
-        favorite_type -- Specify either `RADIO_STATIONS` or `RADIO_SHOWS`.
+        favorite_type -- Specify either `RADIO_STATIONS`, `RADIO_SHOWS` or
+        `SONOS_FAVORITES`.
         start -- Which number to start the retrieval from. Used for paging.
         max_items -- The total number of results to return.
 
         """
-        if favorite_type != RADIO_SHOWS or RADIO_STATIONS:
+        if favorite_type not in (RADIO_SHOWS, RADIO_STATIONS, SONOS_FAVORITES):
             favorite_type = RADIO_STATIONS
 
+        if favorite_type == SONOS_FAVORITES:
+            object_id = 'FV:2'
+        else:
+            object_id = 'R:0/{0}'.format(favorite_type)
+
         response = self.contentDirectory.Browse([
-            ('ObjectID', 'R:0/{0}'.format(favorite_type)),
+            ('ObjectID', object_id),
             ('BrowseFlag', 'BrowseDirectChildren'),
             ('Filter', '*'),
             ('StartingIndex', start),
@@ -1620,6 +1821,9 @@ class SoCo(_SocoSingletonBase):
                     '{http://purl.org/dc/elements/1.1/}title')
                 favorite['uri'] = item.findtext(
                     '{urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/}res')
+                if favorite_type == SONOS_FAVORITES:
+                    favorite['meta'] = item.findtext(
+                        '{urn:schemas-rinconnetworks-com:metadata-1-0/}resMD')
                 favorites.append(favorite)
 
         result['total'] = response['TotalMatches']
@@ -1817,6 +2021,7 @@ class SoCo(_SocoSingletonBase):
 
 RADIO_STATIONS = 0
 RADIO_SHOWS = 1
+SONOS_FAVORITES = 2
 
 NS = {'dc': '{http://purl.org/dc/elements/1.1/}',
       'upnp': '{urn:schemas-upnp-org:metadata-1-0/upnp/}',
@@ -22,6 +22,7 @@ from __future__ import unicode_literals
 import warnings
 warnings.simplefilter('always', DeprecationWarning)
 import textwrap
+from sys import intern
 
 from .xml import XML, ns_tag
 
@@ -70,7 +71,7 @@ def from_didl_string(string):
     root = XML.fromstring(string.encode('utf-8'))
     for elt in root:
         if elt.tag.endswith('item') or elt.tag.endswith('container'):
-            item_class = elt.findtext(ns_tag('upnp', 'class'))
+            item_class = elt.findtext(_CLASS_TAG)
             try:
                 cls = _DIDL_CLASS_TO_CLASS[item_class]
             except KeyError:
@@ -86,6 +87,52 @@ def from_didl_string(string):
     return items
 
 
+def _restore_slots(obj, state):
+    """Restore the state of a pickled object with __slots__. Pickles of
+    older versions contain the instance __dict__."""
+    if isinstance(state, tuple):
+        state = dict(state[0] or {}, **(state[1] or {}))
+    for key, value in state.items():
+        setattr(obj, key, value)
+
+
+def _compact_resource(element):
+    """Return the data of a <res> element as a tuple. Sonos only uses
+    the protocolInfo and duration attributes, so the attributes are only kept
+    as a dict, if there are other ones."""
+    attributes = element.attrib
+    protocol_info = attributes.get('protocolInfo')
+    if protocol_info is not None and \
+            len(attributes) <= ('duration' in attributes) + 1:
+        return element.text, intern(protocol_info), attributes.get('duration')
+    return element.text, dict(attributes)
+
+
+def _expand_resource(res):
+    """Create a DidlResource from the data of _compact_resource."""
+    if len(res) == 3:
+        uri, protocol_info, duration = res
+        attributes = {'protocolInfo': protocol_info}
+        if duration is not None:
+            attributes['duration'] = duration
+        return DidlResource.from_attributes(uri, attributes)
+    return DidlResource.from_attributes(*res)
+
+
+_MISSING = object()
+
+# Frequently used tags, precomputed for the parser
+_CLASS_TAG = ns_tag('upnp', 'class')
+_TITLE_TAG = ns_tag('dc', 'title')
+_RES_TAG = ns_tag('', 'res')
+_DESC_TAG = ns_tag('', 'desc')
+
+# Values of these attributes are shared by many objects (e.g. all tracks of
+# an album), so only one copy is kept in memory
+_INTERNED_KEYS = frozenset(('creator', 'album', 'artist', 'genre',
+                            'contributor', 'publisher'))
+
+
 ###############################################################################
 # DIDL RESOURCE                                                               #
 ###############################################################################
@@ -100,6 +147,11 @@ class DidlResource(object):
 
     # Adapted from a class taken from the Python Brisa project - MIT licence.
 
+    __slots__ = ('uri', 'protocol_info', 'import_uri', 'size', 'duration',
+                 'bitrate', 'sample_frequency', 'bits_per_sample',
+                 'nr_audio_channels', 'resolution', 'color_depth',
+                 'protection')
+
     # pylint: disable=too-many-instance-attributes
     def __init__(self, uri, protocol_info, import_uri=None, size=None,
                  duration=None, bitrate=None, sample_frequency=None,
@@ -134,7 +186,9 @@ class DidlResource(object):
         # Protocol info is in the form a:b:c:d - see
         # sec 2.5.2 at
         # http://upnp.org/specs/av/UPnP-av-ConnectionManager-v1-Service.pdf
-        self.protocol_info = protocol_info
+        # There are only a few distinct values, so they are shared
+        self.protocol_info = intern(protocol_info) \
+            if isinstance(protocol_info, str) else protocol_info
         self.import_uri = import_uri
         self.size = size
         self.duration = duration
@@ -153,9 +207,20 @@ class DidlResource(object):
         Arg:
             element (Element): An ElementTree Element
         """
+        return cls.from_attributes(element.text, element.attrib)
+
+    @classmethod
+    def from_attributes(cls, uri, attributes):
+        """ Set the resource properties from the text and the attributes of
+        a <res> element.
+
+        Args:
+            uri (str): The text of the element
+            attributes (dict): The attributes of the element
+        """
         def _int_helper(name):
             """Try to convert the name attribute to an int, or None."""
-            result = element.get(name)
+            result = attributes.get(name)
             if result is not None:
                 try:
                     return int(result)
@@ -167,24 +232,34 @@ class DidlResource(object):
 
         content = {}
         # required
-        content['protocol_info'] = element.get('protocolInfo')
+        content['protocol_info'] = attributes.get('protocolInfo')
         if content['protocol_info'] is None:
             raise Exception('Could not create Resource from Element: '
                             'protocolInfo not found (required).')
         # Optional
-        content['import_uri'] = element.get('importUri')
+        content['import_uri'] = attributes.get('importUri')
         content['size'] = _int_helper('size')
-        content['duration'] = element.get('duration')
+        content['duration'] = attributes.get('duration')
         content['bitrate'] = _int_helper('bitrate')
         content['sample_frequency'] = _int_helper('sampleFrequency')
         content['bits_per_sample'] = _int_helper('bitsPerSample')
         content['nr_audio_channels'] = _int_helper('nrAudioChannels')
-        content['resolution'] = element.get('resolution')
+        content['resolution'] = attributes.get('resolution')
         content['color_depth'] = _int_helper('colorDepth')
-        content['protection'] = element.get('protection')
-        content['uri'] = element.text
+        content['protection'] = attributes.get('protection')
+        content['uri'] = uri
         return cls(**content)
 
+    def __getstate__(self):
+        # most of the optional attributes are not used by Sonos
+        return dict((key, getattr(self, key)) for key in self.__slots__
+                    if getattr(self, key) is not None)
+
+    def __setstate__(self, state):
+        for key in self.__slots__:
+            setattr(self, key, None)
+        _restore_slots(self, state)
+
     def __repr__(self):
         return '<{0} \'{1}\' at {2}>'.format(self.__class__.__name__,
                                              self.uri,
@@ -244,12 +319,33 @@ class DidlMetaClass(type):
     def __new__(mcs, name, bases, attrs):
         """Create a new instance.
 
+        Every attribute listed in ``_translation`` gets a slot (unless a base
+        class has it already), so the instances don't need a ``__dict__``.
+
         Args:
             name: Name of the class
             bases: Base classes (tuple)
             attrs: Attributes defined for the class
         """
+        if '__slots__' not in attrs:
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(getattr(klass, '__slots__', ()))
+            attrs['__slots__'] = tuple(sorted(
+                key for key in attrs.get('_translation', {})
+                if key not in inherited))
         new_cls = super(DidlMetaClass, mcs).__new__(mcs, name, bases, attrs)
+        # Map the xml tags to the attribute names for the parser
+        translation = getattr(new_cls, '_translation', None)
+        if translation is not None:
+            new_cls._tag_to_key = dict(
+                (ns_tag(*value), key) for key, value in translation.items())
+        # The attributes saved by pickle
+        new_cls._state_keys = tuple(
+            key for klass in new_cls.__mro__
+            for key in getattr(klass, '__slots__', ())
+            if key not in ('_resources', '_resource_elements'))
         # Register all subclasses with the global _DIDL_CLASS_TO_CLASS mapping
         item_class = attrs.get('item_class', None)
         if item_class is not None:
@@ -281,6 +377,11 @@ class DidlObject(DidlMetaClass(str('DidlMetaClass'), (object,), {})):
         'creator': ('dc', 'creator'),
         'write_status': ('upnp', 'writeStatus'),
     }
+    # The attributes of the subclasses are added by the metaclass. The
+    # resources are parsed from the <res> elements on first access.
+    __slots__ = ('title', 'parent_id', 'item_id', 'restricted', 'desc',
+                 '_resources', '_resource_elements', 'creator',
+                 'write_status')
 
     def __init__(self, title, parent_id, item_id, restricted=True,
                  resources=None, desc='RINCON_AssociatedZPUDN', **kwargs):
@@ -319,6 +420,7 @@ class DidlObject(DidlMetaClass(str('DidlMetaClass'), (object,), {})):
         self.restricted = restricted
 
         # Resources is multi-valued, and dealt with separately
+        self._resource_elements = None
         self.resources = [] if resources is None else resources
 
         # According to the spec, there may be one or more desc values. Sonos
@@ -338,6 +440,34 @@ class DidlObject(DidlMetaClass(str('DidlMetaClass'), (object,), {})):
             # way.
             setattr(self, key, value)
 
+    @property
+    def resources(self):
+        """The list of resources (:py:class:`DidlResource`). Parsed on first
+        access, if the object was created from an xml element."""
+        if self._resource_elements is not None:
+            self._resources = [_expand_resource(res)
+                               for res in self._resource_elements]
+            self._resource_elements = None
+        return self._resources
+
+    @resources.setter
+    def resources(self, value):
+        self._resources = value
+        self._resource_elements = None
+
+    def __getstate__(self):
+        state = {}
+        for key in self._state_keys:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                state[key] = value
+        state['resources'] = self.resources
+        return state
+
+    def __setstate__(self, state):
+        self._resource_elements = None
+        _restore_slots(self, state)
+
     @classmethod
     def from_element(cls, element):
         """Create an instance of this class from an ElementTree xml Element.
@@ -357,7 +487,7 @@ class DidlObject(DidlMetaClass(str('DidlMetaClass'), (object,), {})):
         #        "Wrong element. Expected '<{0}>',"
         #        " got '<{1}>'".format(cls.tag, element.tag))
         # and that the upnp matches what we are expecting
-        item_class = element.find(ns_tag('upnp', 'class')).text
+        item_class = element.find(_CLASS_TAG).text
         if item_class != cls.item_class:
             raise DIDLMetadataError(
                 "UPnP class is incorrect. Expected '{0}',"
@@ -376,42 +506,59 @@ class DidlObject(DidlMetaClass(str('DidlMetaClass'), (object,), {})):
             raise DIDLMetadataError("Missing restricted attribute")
         restricted = True if restricted in [1, 'true', 'True'] else False
 
+        # Walk the children once and pick the title, the resource elements,
+        # the desc element (there is only one in Sonos) and the values of
+        # the elements listed in _translation. As with find(), the first
+        # element of a tag wins.
+        title_elt = None
+        res_elts = []
+        desc = None
+        content = {}
+        tag_to_key = cls._tag_to_key
+        for child in element:
+            tag = child.tag
+            if tag == _RES_TAG:
+                res_elts.append(child)
+            elif tag == _TITLE_TAG:
+                if title_elt is None:
+                    title_elt = child
+            elif tag == _DESC_TAG:
+                if desc is None:
+                    desc = child.text or ''
+            else:
+                key = tag_to_key.get(tag)
+                if key is not None and key not in content:
+                    # We store info as unicode internally.
+                    content[key] = really_unicode(child.text or '')
+
         # There must be a title. According to spec, it should be the first
         # child, but Sonos does not abide by this
-        title_elt = element.find(ns_tag('dc', 'title'))
         if title_elt is None:
             raise DIDLMetadataError(
                 "Missing title element")
         title = really_unicode(title_elt.text)
 
-        # Deal with any resource elements
-        resources = []
-        for res_elt in element.findall(ns_tag('', 'res')):
-            resources.append(
-                DidlResource.from_element(res_elt))
-
-        # and the desc element (There is only one in Sonos)
-        desc = element.findtext(ns_tag('', 'desc'))
-
-        # Get values of the elements listed in _translation and add them to
-        # the content dict
-        content = {}
-        for key, value in cls._translation.items():
-            result = element.findtext(ns_tag(*value))
-            if result is not None:
-                # We store info as unicode internally.
-                content[key] = really_unicode(result)
-
         # Convert type for original track number
         if content.get('original_track_number') is not None:
             content['original_track_number'] = \
                 int(content['original_track_number'])
 
-        # Now pass the content dict we have just built to the main
-        # constructor, as kwargs, to create the object
-        return cls(title=title, parent_id=parent_id, item_id=item_id,
-                   restricted=restricted, resources=resources, desc=desc,
-                   **content)
+        # The content only contains keys of _translation, so the checks of
+        # the main constructor are not needed
+        instance = cls.__new__(cls)
+        instance.title = title
+        instance.parent_id = intern(parent_id)
+        instance.item_id = item_id
+        instance.restricted = restricted
+        instance.desc = intern(desc) if desc is not None else None
+        # the resources are parsed on first access
+        instance._resources = []
+        instance._resource_elements = [_compact_resource(res_elt)
+                                       for res_elt in res_elts] or None
+        for key, value in content.items():
+            setattr(instance, key,
+                    intern(value) if key in _INTERNED_KEYS else value)
+        return instance
 
     @classmethod
     def from_dict(cls, content):
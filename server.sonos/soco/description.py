@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+""" Cache of the device descriptions and service descriptions (SCPD) of the
+Sonos players.
+
+All players of the same model with the same software have identical
+descriptions, so they are fetched once per (hardware version, software
+version) and shared by these players. The hardware version (from
+/status/zp) identifies the model and its revision before the description is
+fetched. The cache can be persisted to a json file. """
+
+from __future__ import unicode_literals
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import requests
+
+from .xml import XML
+
+_LOG = logging.getLogger(__name__)
+
+DEVICE_NS = '{urn:schemas-upnp-org:device-1-0}'
+SERVICE_NS = '{urn:schemas-upnp-org:service-1-0}'
+CACHE_VERSION = 1
+
+
+def parse_device_description(content):
+    """ Parse a device description (/xml/device_description.xml).
+
+    Returns:
+        (dict): model_name, model_number, display_name of the player and
+            its services, including those of the embedded devices. A service
+            is a dict with service_type, service_id, control_url,
+            event_sub_url and scpd_url.
+    """
+    tree = XML.fromstring(content)
+    services = []
+    for service in tree.iter('{0}service'.format(DEVICE_NS)):
+        services.append({
+            'service_type': service.findtext(
+                '{0}serviceType'.format(DEVICE_NS)),
+            'service_id': service.findtext('{0}serviceId'.format(DEVICE_NS)),
+            'control_url': service.findtext(
+                '{0}controlURL'.format(DEVICE_NS)),
+            'event_sub_url': service.findtext(
+                '{0}eventSubURL'.format(DEVICE_NS)),
+            'scpd_url': service.findtext('{0}SCPDURL'.format(DEVICE_NS)),
+        })
+    # the first (root) device is the player
+    return {
+        'model_name': tree.findtext(
+            './/{0}modelName'.format(DEVICE_NS)) or '',
+        'model_number': tree.findtext(
+            './/{0}modelNumber'.format(DEVICE_NS)) or '',
+        'display_name': tree.findtext(
+            './/{0}displayName'.format(DEVICE_NS)) or '',
+        'services': services,
+    }
+
+
+def parse_scpd(content):
+    """ Parse a service description (SCPD).
+
+    Returns:
+        (dict): 'actions', a list of [name, in_args, out_args], where the
+            arguments are lists of [name, vartype], and 'event_vars', a list
+            of [name, vartype] of the eventable state variables.
+    """
+    # pylint: disable=invalid-name
+    ns = SERVICE_NS
+    tree = XML.fromstring(content)
+    # parse the state variables to get the relevant variable types
+    vartypes = {}
+    event_vars = []
+    for state in tree.iter('{0}stateVariable'.format(ns)):
+        name = state.findtext('{0}name'.format(ns))
+        vartype = state.findtext('{0}dataType'.format(ns))
+        vartypes[name] = vartype
+        # eventable, if 'sendEvents' is 'yes'
+        if state.attrib.get('sendEvents') == 'yes':
+            event_vars.append([name, vartype])
+    actions = []
+    for action in tree.iter('{0}action'.format(ns)):
+        in_args = []
+        out_args = []
+        for arg in action.iter('{0}argument'.format(ns)):
+            related_variable = arg.findtext(
+                '{0}relatedStateVariable'.format(ns))
+            argument = [arg.findtext('{0}name'.format(ns)),
+                        vartypes.get(related_variable)]
+            if arg.findtext('{0}direction'.format(ns)) == 'in':
+                in_args.append(argument)
+            else:
+                out_args.append(argument)
+        actions.append([action.findtext('{0}name'.format(ns)), in_args,
+                        out_args])
+    return {'actions': actions, 'event_vars': event_vars}
+
+
+class DescriptionCache(object):
+    """ The descriptions by (hardware version, software version) of the
+    players. A description is fetched from the first player of its kind,
+    the service descriptions are added when they are first used. """
+
+    def __init__(self, path=None, max_entries=32):
+        """
+        Args:
+            path (str): the json file the cache is persisted to. If None,
+                the cache is kept in memory only.
+            max_entries (int): the number of (hardware, software) versions
+                kept, the least recently fetched ones are dropped
+        """
+        super(DescriptionCache, self).__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._entries = None
+        #: number of descriptions fetched from the players
+        self.fetches = 0
+
+    @staticmethod
+    def key(zone):
+        """ The cache key of a player, None if its versions are unknown """
+        info = zone.get_speaker_info()
+        if not info or not info.get('hardware_version') or \
+                not info.get('software_version'):
+            return None
+        return '{0}/{1}'.format(info['hardware_version'],
+                                info['software_version'])
+
+    def _load(self):
+        self._entries = {}
+        if self.path is None:
+            return
+        try:
+            with open(self.path, 'rb') as cache_file:
+                data = json.loads(cache_file.read().decode('utf-8'))
+        except (IOError, OSError):
+            return
+        except ValueError as err:
+            _LOG.warning('Ignoring description cache %s: %s', self.path, err)
+            return
+        if isinstance(data, dict) and data.get('version') == CACHE_VERSION:
+            self._entries = data.get('descriptions', {})
+
+    def _save(self):
+        if self.path is None:
+            return
+        # keep the most recently fetched entries
+        if len(self._entries) > self.max_entries:
+            keys = sorted(self._entries,
+                          key=lambda key: self._entries[key]['fetched'])
+            for key in keys[:len(self._entries) - self.max_entries]:
+                del self._entries[key]
+        tmp_path = None
+        try:
+            # a new file next to the cache file, never an existing file (or
+            # symlink) with a predictable name
+            handle, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(os.path.abspath(self.path)),
+                prefix='.descriptions', suffix='.tmp')
+            with os.fdopen(handle, 'wb') as cache_file:
+                cache_file.write(json.dumps(
+                    {'version': CACHE_VERSION, 'descriptions': self._entries},
+                    sort_keys=True).encode('utf-8'))
+            # os.replace is atomic on all platforms, it is missing in Python 2
+            getattr(os, 'replace', os.rename)(tmp_path, self.path)
+            tmp_path = None
+        except (IOError, OSError) as err:
+            _LOG.warning("Can't write description cache %s: %s", self.path,
+                         err)
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _fetch(self, zone, url):
+        self.fetches += 1
+        response = requests.get(
+            'http://{0}:1400{1}'.format(zone.ip_address, url))
+        response.raise_for_status()
+        return response.content
+
+    def description(self, zone):
+        """ The device description of a player, see
+        `parse_device_description`. Treat it as read-only. """
+        key = self.key(zone)
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entry = self._entries.get(key) if key is not None else None
+            if entry is None:
+                entry = parse_device_description(
+                    self._fetch(zone, '/xml/device_description.xml'))
+                entry['scpd'] = {}
+                entry['fetched'] = time.time()
+                if key is not None:
+                    self._entries[key] = entry
+                    self._save()
+            return entry
+
+    def scpd(self, service):
+        """ The service description of a service, see `parse_scpd`. Treat it
+        as read-only. """
+        if self.key(service.soco) is None:
+            return parse_scpd(self._fetch(service.soco, service.scpd_url))
+        with self._lock:
+            entry = self.description(service.soco)
+            scpd = entry['scpd'].get(service.scpd_url)
+            if scpd is None:
+                scpd = parse_scpd(self._fetch(service.soco, service.scpd_url))
+                entry['scpd'][service.scpd_url] = scpd
+                self._save()
+            return scpd
+
+    def model_name(self, zone):
+        """ The model name of a player, e.g. 'Sonos PLAY:3' """
+        return self.description(zone)['model_name']
+
+    def clear(self):
+        """ Empty the cache, the file is kept until the next fetch """
+        with self._lock:
+            self._entries = {}
+
+
+# The cache used by the services. It can be replaced, e.g. by a cache which
+# is persisted to a file.
+description_cache = DescriptionCache()
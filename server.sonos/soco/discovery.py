@@ -15,6 +15,61 @@ from .utils import really_utf8
 
 _LOG = logging.getLogger(__name__)
 
+PLAYER_SEARCH = dedent("""\
+    M-SEARCH * HTTP/1.1
+    HOST: 239.255.255.250:1900
+    MAN: "ssdp:discover"
+    MX: 1
+    ST: urn:schemas-upnp-org:device:ZonePlayer:1
+    """).encode('utf-8')
+MCAST_GRP = "239.255.255.250"
+MCAST_PORT = 1900
+
+
+def _search_socket(interface_addr=None, bind=False):
+    """ Create a socket for the search, which sends its multicast datagrams
+    from `interface_addr` (the system default interface if None). With `bind`
+    the socket is bound to the interface, so it only receives the responses
+    sent to this interface. """
+    sock = socket.socket(
+        socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    # UPnP v1.0 requires a TTL of 4
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
+                    struct.pack("B", 4))
+    # Use the specified interface, if any
+    if interface_addr is not None:
+        try:
+            address = socket.inet_aton(interface_addr)
+        except socket.error:
+            sock.close()
+            raise ValueError("{0} is not a valid IP address string".format(
+                interface_addr))
+        try:
+            sock.setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_IF, address)
+            if bind:
+                sock.bind((interface_addr, 0))
+        except socket.error:
+            sock.close()
+            raise
+    return sock
+
+
+def _send_search(sock):
+    """ Send the search a few times. UDP is unreliable """
+    for _ in range(3):
+        sock.sendto(really_utf8(PLAYER_SEARCH), (MCAST_GRP, MCAST_PORT))
+
+
+def _household_id(response):
+    """ The value of the X-RINCON-HOUSEHOLD header of a search response, or
+    None if the response has none """
+    for line in response.splitlines():
+        name, _, value = line.partition(b':')
+        if name.strip().upper() == b'X-RINCON-HOUSEHOLD':
+            return value.strip().decode('utf-8', 'replace') or None
+    return None
+
 
 def discover(timeout=1, include_invisible=False, interface_addr=None):
     """ Discover Sonos zones on the local network.
@@ -54,37 +109,10 @@ def discover(timeout=1, include_invisible=False, interface_addr=None):
 
     """
 
-    # pylint: disable=invalid-name
-    PLAYER_SEARCH = dedent("""\
-        M-SEARCH * HTTP/1.1
-        HOST: 239.255.255.250:1900
-        MAN: "ssdp:discover"
-        MX: 1
-        ST: urn:schemas-upnp-org:device:ZonePlayer:1
-        """).encode('utf-8')
-    MCAST_GRP = "239.255.255.250"
-    MCAST_PORT = 1900
-
-    _sock = socket.socket(
-        socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-    # UPnP v1.0 requires a TTL of 4
-    _sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL,
-                     struct.pack("B", 4))
-    # Use the specified interface, if any
-    if interface_addr is not None:
-        try:
-            address = socket.inet_aton(interface_addr)
-        except socket.error:
-            raise ValueError("{0} is not a valid IP address string".format(
-                interface_addr))
-        _sock.setsockopt(
-            socket.IPPROTO_IP, socket.IP_MULTICAST_IF, address)
+    _sock = _search_socket(interface_addr)
 
-    # Send a few times. UDP is unreliable
     _LOG.info("Sending discovery packets")
-    _sock.sendto(really_utf8(PLAYER_SEARCH), (MCAST_GRP, MCAST_PORT))
-    _sock.sendto(really_utf8(PLAYER_SEARCH), (MCAST_GRP, MCAST_PORT))
-    _sock.sendto(really_utf8(PLAYER_SEARCH), (MCAST_GRP, MCAST_PORT))
+    _send_search(_sock)
 
     t0 = time.time()
     while True:
@@ -138,3 +166,88 @@ def discover(timeout=1, include_invisible=False, interface_addr=None):
                 return zone.all_zones
             else:
                 return zone.visible_zones
+
+
+def discover_households(timeout=5, include_invisible=False,
+                        interface_addrs=None):
+    """ Discover the Sonos households (Sonos systems) on the networks of
+    several interfaces.
+
+    Unlike `discover`, which returns the zones of the first player that
+    responds, the search is sent on every interface at the same time and the
+    responses are collected for the whole `timeout`. The players are
+    partitioned by the X-RINCON-HOUSEHOLD header of their responses, the
+    zones of a household are taken from the topology of one of its players.
+
+    Args:
+        timeout (int): collect responses for this many seconds. Default 5
+        include_invisible (bool): include invisible zones in the return sets.
+            Default False
+        interface_addrs (list): the addresses (dotted quad) of the network
+            interfaces to search on, one socket is bound to each of them. If
+            None or empty, the system default interface is used.
+
+    Returns:
+        (dict): household id -> set of SoCo instances. Empty, if no zones
+            were found.
+    """
+    socks = []
+    for interface_addr in interface_addrs or [None]:
+        try:
+            socks.append(_search_socket(interface_addr, bind=True))
+        except (socket.error, ValueError) as err:
+            _LOG.warning("Can't search on interface %s: %s",
+                         interface_addr, err)
+
+    # household id -> addresses of the responding players, in order
+    responders = {}
+    try:
+        _LOG.info("Sending discovery packets on %d interface(s)", len(socks))
+        for sock in socks:
+            _send_search(sock)
+        t0 = time.time()
+        while socks:
+            remaining = timeout - (time.time() - t0)
+            if remaining <= 0:
+                break
+            readable, _, _ = select.select(socks, [], [], min(remaining, 0.1))
+            for sock in readable:
+                try:
+                    data, addr = sock.recvfrom(1024)
+                except socket.error:
+                    continue
+                _LOG.debug('Received discovery response from %s: "%s"',
+                           addr, data)
+                if b"Sonos" not in data:
+                    continue
+                addrs = responders.setdefault(_household_id(data), [])
+                if addr[0] not in addrs:
+                    addrs.append(addr[0])
+    finally:
+        for sock in socks:
+            sock.close()
+
+    households = {}
+    # addresses of the players already known from a topology
+    known = set()
+    for household_id, addrs in responders.items():
+        for addr in addrs:
+            if addr in known:
+                continue
+            zone = config.SOCO_CLASS(addr)
+            if household_id is not None and zone._household_id is None:
+                zone._household_id = household_id
+            try:
+                zones = set(zone.all_zones if include_invisible
+                            else zone.visible_zones)
+                known.update(member.ip_address for member in zone.all_zones)
+                household = zone.household_id
+            except Exception as err:  # pylint: disable=broad-except
+                # the player went offline, try the next one
+                _LOG.debug("Can't get the topology from %s: %s", addr, err)
+                continue
+            households.setdefault(household, set()).update(zones)
+            # players without a household header may belong to any household
+            if household_id is not None:
+                break
+    return households
@@ -277,6 +277,8 @@ class EventListener(object):
         #: The address (ip, port) on which the server will listen. Empty for
         #  the moment. (It is set in `meth`:start)
         self.address = ()
+        # zone ip -> local ip which reaches the zone
+        self._callback_ips = {}
 
     def start(self, any_zone):
         """Start the event listener listening on the local machine at port 1400
@@ -290,24 +292,40 @@ class EventListener(object):
 
         """
 
-        # Find our local network IP address which is accessible to the
-        # Sonos net, see http://stackoverflow.com/q/166506
-
-        temp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        temp_sock.connect((any_zone.ip_address, 1400))
-        ip_address = temp_sock.getsockname()[0]
-        temp_sock.close()
+        ip_address = self._local_ip(any_zone)
         # Start the event listener server in a separate thread.
         # Hardcoded to listen on port 1400. Any free port could
         # be used but this seems appropriate for Sonos, and avoids the need
-        # to find a free port.
+        # to find a free port. The server listens on all interfaces, so the
+        # zones of households in other networks can reach it as well.
         self.address = (ip_address, 1400)
-        self._listener_thread = EventServerThread(self.address)
+        self._listener_thread = EventServerThread(('', self.address[1]))
         self._listener_thread.daemon = True
         self._listener_thread.start()
         self.is_running = True
         log.info("Event listener started")
 
+    @staticmethod
+    def _local_ip(zone):
+        """ Find our local network IP address which is accessible to the
+        zone, see http://stackoverflow.com/q/166506 """
+        temp_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            temp_sock.connect((zone.ip_address, 1400))
+            return temp_sock.getsockname()[0]
+        finally:
+            temp_sock.close()
+
+    def callback_address(self, zone):
+        """ The address (ip, port) to which the zone sends its events. With
+        several network interfaces, this is the address of the interface
+        which reaches the zone. """
+        ip_address = self._callback_ips.get(zone.ip_address)
+        if ip_address is None:
+            ip_address = self._local_ip(zone)
+            self._callback_ips[zone.ip_address] = ip_address
+        return ip_address, self.address[1]
+
     def stop(self):
         """Stop the event listener"""
         # Signal the thread to stop before handling the next request
@@ -416,7 +434,7 @@ class Subscription(object):
         # TIMEOUT: Second-requested subscription duration (optional)
 
         # pylint: disable=unbalanced-tuple-unpacking
-        ip_address, port = event_listener.address
+        ip_address, port = event_listener.callback_address(service.soco)
         headers = {
             'Callback': '<http://{0}:{1}>'.format(ip_address, port),
             'NT': 'upnp:event'
@@ -95,3 +95,62 @@ class ZoneGroup(object):
         if len(group_names) > 1:
             group_label += " + {0}".format(len(group_names)-1)
         return group_label
+
+
+class ZoneTopology(object):
+    """
+    The role of a zone player within the household. Players which are not
+    zones of their own are sub-members of a zone::
+
+        ZoneTopology(uid='RINCON_000E5879136C01400', role='satellite',
+                     main_uid='RINCON_000E58A1B2C301400', sub_uids=(),
+                     channels='LR')
+
+    role is one of:
+
+        zone -- a visible zone (a single player, the master of a stereo pair or
+            the main player of a home theatre)
+        pair_slave -- the invisible part of a stereo pair
+        satellite -- a surround speaker or subwoofer of a home theatre
+        bridge -- a bridge, no player
+
+    main_uid is the uid of the zone a sub-member belongs to (None for zones
+    and bridges), sub_uids are the uids of the sub-members of a zone. channels
+    is the channel map of the player, e.g. 'LF,LF' or 'SW' (empty if unknown).
+
+    """
+    ZONE = 'zone'
+    PAIR_SLAVE = 'pair_slave'
+    SATELLITE = 'satellite'
+    BRIDGE = 'bridge'
+
+    __slots__ = ('uid', 'role', 'main_uid', 'sub_uids', 'channels')
+
+    def __init__(self, uid, role, main_uid=None, sub_uids=(), channels=''):
+        self.uid = uid
+        self.role = role
+        self.main_uid = main_uid
+        self.sub_uids = tuple(sub_uids)
+        self.channels = channels
+
+    @property
+    def is_sub_member(self):
+        """ True for satellites and the slave of a stereo pair """
+        return self.main_uid is not None
+
+    def __repr__(self):
+        return ("{0}(uid='{1}', role='{2}', main_uid={3!r}, sub_uids={4!r}, "
+                "channels='{5}')").format(
+                    self.__class__.__name__, self.uid, self.role,
+                    self.main_uid, self.sub_uids, self.channels)
+
+
+def parse_channel_map(channel_map_set):
+    """ Parse a ChannelMapSet or HTSatChanMapSet attribute, e.g.
+    'RINCON_A:LF,LF;RINCON_B:RF,RF', to a list of (uid, channels) """
+    channel_map = []
+    for entry in channel_map_set.split(';'):
+        uid, _, channels = entry.partition(':')
+        if uid:
+            channel_map.append((uid, channels))
+    return channel_map
@@ -42,8 +42,10 @@ from __future__ import unicode_literals, absolute_import
 from collections import namedtuple
 from xml.sax.saxutils import escape
 import logging
+import threading
 
 import requests
+from . import description
 from .cache import Cache
 from .exceptions import SoCoUPnPException, UnknownSoCoException
 from .utils import prettify
@@ -57,11 +59,41 @@ log = logging.getLogger(__name__)  # pylint: disable=C0103
 Action = namedtuple('Action', 'name, in_args, out_args')
 Argument = namedtuple('Argument', 'name, vartype')
 
-# A shared cache for ZoneGroupState. Each zone has the same info, so when a
-# SoCo instance is asked for group info, we can cache it and return it when
-# another instance is asked. To do this we need a cache to be shared between
-# instances
-zone_group_state_shared_cache = Cache()
+
+class HouseholdCaches(object):
+    """ One cache per household. The zones of a household share their zone
+    group state, the zones of another household (Sonos system) don't. """
+
+    def __init__(self):
+        super(HouseholdCaches, self).__init__()
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def cache(self, household_id):
+        """ Return the cache of a household, it is created on first use """
+        with self._lock:
+            cache = self._caches.get(household_id)
+            if cache is None:
+                cache = self._caches[household_id] = Cache()
+            return cache
+
+    def clear(self, household_id=None):
+        """ Clear the cache of a household, or of all households """
+        with self._lock:
+            if household_id is None:
+                caches = list(self._caches.values())
+            else:
+                caches = [self._caches.get(household_id)]
+        for cache in caches:
+            if cache is not None:
+                cache.clear()
+
+
+# Shared caches for ZoneGroupState. Each zone of a household has the same
+# info, so when a SoCo instance is asked for group info, we can cache it and
+# return it when another instance of the same household is asked. To do this
+# we need a cache to be shared between instances
+zone_group_state_caches = HouseholdCaches()
 
 
 # pylint: disable=too-many-instance-attributes
@@ -476,45 +508,15 @@ class Service(object):
                      Argument(name='DesiredDateFormat', vartype='string')],
             out_args=[]) """
 
-        # pylint: disable=too-many-locals
         # TODO: Provide for Allowed value list, Allowed value range,
         # default value
-        # pylint: disable=invalid-name
-        ns = '{urn:schemas-upnp-org:service-1-0}'
-        # get the scpd body as bytes, and feed directly to elementtree
-        # which likes to receive bytes
-        scpd_body = requests.get(self.base_url + self.scpd_url).content
-        tree = XML.fromstring(scpd_body)
-        # parse the state variables to get the relevant variable types
-        vartypes = {}
-        srvStateTables = tree.findall('{0}serviceStateTable'.format(ns))
-        for srvStateTable in srvStateTables:
-            statevars = srvStateTable.findall('{0}stateVariable'.format(ns))
-            for state in statevars:
-                name = state.findtext('{0}name'.format(ns))
-                vartypes[name] = state.findtext('{0}dataType'.format(ns))
-        # find all the actions
-        actionLists = tree.findall('{0}actionList'.format(ns))
-        for actionList in actionLists:
-            actions = actionList.findall('{0}action'.format(ns))
-            for i in actions:
-                action_name = i.findtext('{0}name'.format(ns))
-                argLists = i.findall('{0}argumentList'.format(ns))
-                for argList in argLists:
-                    args_iter = argList.findall('{0}argument'.format(ns))
-                    in_args = []
-                    out_args = []
-                    for arg in args_iter:
-                        arg_name = arg.findtext('{0}name'.format(ns))
-                        direction = arg.findtext('{0}direction'.format(ns))
-                        related_variable = arg.findtext(
-                            '{0}relatedStateVariable'.format(ns))
-                        vartype = vartypes[related_variable]
-                        if direction == "in":
-                            in_args.append(Argument(arg_name, vartype))
-                        else:
-                            out_args.append(Argument(arg_name, vartype))
-                    yield Action(action_name, in_args, out_args)
+        # the schema is shared by all players with the same model and
+        # software, see soco.description
+        scpd = description.description_cache.scpd(self)
+        for action_name, in_args, out_args in scpd['actions']:
+            yield Action(action_name,
+                         [Argument(*argument) for argument in in_args],
+                         [Argument(*argument) for argument in out_args])
 
     def iter_event_vars(self):
         """ Yield an iterator over the services eventable variables.
@@ -523,19 +525,9 @@ class Service(object):
 
         """
 
-        # pylint: disable=invalid-name
-        ns = '{urn:schemas-upnp-org:service-1-0}'
-        scpd_body = requests.get(self.base_url + self.scpd_url).text
-        tree = XML.fromstring(scpd_body.encode('utf-8'))
-        # parse the state variables to get the relevant variable types
-        statevars = tree.findall('{0}stateVariable'.format(ns))
-        for state in statevars:
-            # We are only interested if 'sendEvents' is 'yes', i.e this
-            # is an eventable variable
-            if state.attrib['sendEvents'] == "yes":
-                name = state.findtext('{0}name'.format(ns))
-                vartype = state.findtext('{0}dataType'.format(ns))
-                yield (name, vartype)
+        scpd = description.description_cache.scpd(self)
+        for name, vartype in scpd['event_vars']:
+            yield (name, vartype)
 
 
 class AlarmClock(Service):
@@ -576,11 +568,22 @@ class ZoneGroupTopology(Service):
         super(ZoneGroupTopology, self).__init__(soco)
 
     def GetZoneGroupState(self, *args, **kwargs):
-        """ Overrides default handling to use the global shared zone group
-        state cache, unless another cache is speciified """
-        kwargs['cache'] = kwargs.get('cache', zone_group_state_shared_cache)
+        """ Overrides default handling to use the shared zone group state
+        cache of the household, unless another cache is speciified """
+        if 'cache' not in kwargs:
+            kwargs['cache'] = zone_group_state_caches.cache(
+                self.soco.household_id)
         return self.send_command('GetZoneGroupState', *args, **kwargs)
 
+    def _update_cache_on_event(self, event):
+        """ A topology event contains the new zone group state, it replaces
+        the cached one, so the next GetZoneGroupState needs no network call """
+        zone_group_state = event.variables.get('zone_group_state')
+        if zone_group_state:
+            zone_group_state_caches.cache(self.soco.household_id).put(
+                {'ZoneGroupState': zone_group_state}, 'GetZoneGroupState',
+                None, timeout=5)
+
 
 class GroupManagement(Service):
     """ Sonos group management service, for services relating to groups. """
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the alarm decoding of SoCo.
+
+Feeds get_alarms() with an alarm list and a zone group state of the given size (no speakers needed, the two UPnP
+calls are replaced) and reports the time to decode all alarms and the alarms of a single zone, like the broker does
+for every speaker on an AlarmClock event.
+
+    python3 tools/bench_alarms.py --alarms 500 --zones 40
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from soco import SoCo
+from soco import alarms as soco_alarms
+from soco.alarms import get_alarms
+
+ALARM = ('<Alarm ID="{id}" StartTime="{hour:02d}:{minute:02d}:00" Duration="01:00:00" Recurrence="DAILY" Enabled="1" '
+         'RoomUUID="RINCON_{zone:012d}01400" ProgramURI="x-rincon-buzzer:0" ProgramMetaData="" '
+         'PlayMode="SHUFFLE_NOREPEAT" Volume="25" IncludeLinkedZones="0"/>')
+
+MEMBER = ('<ZoneGroupMember UUID="RINCON_{zone:012d}01400" '
+          'Location="http://10.0.{a}.{b}:1400/xml/device_description.xml" ZoneName="Zone {zone}" '
+          'Icon="x-rincon-roomicon:living" Configuration="1" SoftwareVersion="31.8-24090" '
+          'MinCompatibleVersion="29.0-00000" BootSeq="42"/>')
+
+
+def alarm_list(alarms, zones):
+    return '<Alarms>' + ''.join(ALARM.format(id=i, hour=i % 24, minute=i % 60, zone=i % zones)
+                                for i in range(alarms)) + '</Alarms>'
+
+
+def zone_group_state(zones):
+    groups = ''.join('<ZoneGroup Coordinator="RINCON_{zone:012d}01400" ID="RINCON_{zone:012d}01400:1">{member}'
+                     '</ZoneGroup>'.format(zone=zone, member=MEMBER.format(zone=zone, a=zone // 250, b=zone % 250 + 1))
+                     for zone in range(zones))
+    return '<ZoneGroups>' + groups + '</ZoneGroups>'
+
+
+def best_of(rounds, function):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Alarm decoding benchmark')
+    argparser.add_argument('--alarms', type=int, default=500)
+    argparser.add_argument('--zones', type=int, default=40)
+    argparser.add_argument('--rounds', type=int, default=20)
+    args = argparser.parse_args()
+
+    soco = SoCo('10.0.0.1')
+    alarms = {'CurrentAlarmList': alarm_list(args.alarms, args.zones)}
+    zgs = {'ZoneGroupState': zone_group_state(args.zones)}
+    soco.alarmClock.ListAlarms = lambda *a, **kw: alarms
+    soco.zoneGroupTopology.GetZoneGroupState = lambda *a, **kw: zgs
+
+    result = get_alarms(soco)
+    assert len(result) == args.alarms
+    zone_uid = 'RINCON_{zone:012d}01400'.format(zone=0)
+
+    def first_zone():
+        # the first zone after an alarm change has to parse the alarm list
+        soco_alarms._ALARM_LIST_CACHE[:] = [None, []]
+        get_alarms(soco, zone_uid=zone_uid)
+
+    all_alarms = best_of(args.rounds, lambda: get_alarms(soco))
+    first = best_of(args.rounds, first_zone)
+    one_zone = best_of(args.rounds, lambda: get_alarms(soco, zone_uid=zone_uid))
+
+    print('alarms / zones   : {alarms} / {zones}'.format(alarms=args.alarms, zones=args.zones))
+    print('all alarms       : {ms:.2f} ms'.format(ms=all_alarms * 1000))
+    print('first zone       : {ms:.2f} ms'.format(ms=first * 1000))
+    print('other zones      : {ms:.2f} ms'.format(ms=one_zone * 1000))
+    print('event, all zones : {ms:.1f} ms (one call per speaker)'.format(
+        ms=(first + one_zone * (args.zones - 1)) * 1000))
+
+
+if __name__ == '__main__':
+    main()
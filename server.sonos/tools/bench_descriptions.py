@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Counts the device description requests of the speaker discovery with and without the description cache.
+
+A local http server on port 1400 plays the speakers 127.0.0.2, 127.0.0.3 ... (no Sonos hardware needed). The speakers
+share '--models' combinations of model and software version. Every scan asks every speaker for its model name, like
+the discovery does for new speakers, and the speakers' AVTransport actions are listed. 'restart' is a scan with a new
+cache loaded from the file of the previous run.
+
+    python3 tools/bench_descriptions.py --speakers 12 --models 3 --scans 3
+"""
+import argparse
+import collections
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from soco import SoCo
+from soco import description
+
+DEVICE_DESCRIPTION = '''<?xml version="1.0" encoding="utf-8" ?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+<device>
+<deviceType>urn:schemas-upnp-org:device:ZonePlayer:1</deviceType>
+<modelNumber>S{model}</modelNumber><modelName>Sonos PLAY:{model}</modelName><displayName>PLAY:{model}</displayName>
+<serviceList>
+<service><serviceType>urn:schemas-upnp-org:service:AlarmClock:1</serviceType>
+<serviceId>urn:upnp-org:serviceId:AlarmClock</serviceId><controlURL>/AlarmClock/Control</controlURL>
+<eventSubURL>/AlarmClock/Event</eventSubURL><SCPDURL>/xml/AlarmClock1.xml</SCPDURL></service>
+</serviceList>
+<deviceList><device>
+<deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+<serviceList>
+<service><serviceType>urn:schemas-upnp-org:service:AVTransport:1</serviceType>
+<serviceId>urn:upnp-org:serviceId:AVTransport</serviceId><controlURL>/MediaRenderer/AVTransport/Control</controlURL>
+<eventSubURL>/MediaRenderer/AVTransport/Event</eventSubURL><SCPDURL>/xml/AVTransport1.xml</SCPDURL></service>
+</serviceList>
+</device></deviceList>
+</device>
+</root>'''
+
+SCPD = '''<?xml version="1.0" encoding="utf-8" ?>
+<scpd xmlns="urn:schemas-upnp-org:service-1-0">
+<actionList>
+{actions}
+</actionList>
+<serviceStateTable>
+<stateVariable sendEvents="no"><name>A_ARG_TYPE_InstanceID</name><dataType>ui4</dataType></stateVariable>
+<stateVariable sendEvents="no"><name>A_ARG_TYPE_Value</name><dataType>string</dataType></stateVariable>
+<stateVariable sendEvents="yes"><name>LastChange</name><dataType>string</dataType></stateVariable>
+</serviceStateTable>
+</scpd>'''
+
+ACTION = '''<action><name>Action{index}</name><argumentList>
+<argument><name>InstanceID</name><direction>in</direction>
+<relatedStateVariable>A_ARG_TYPE_InstanceID</relatedStateVariable></argument>
+<argument><name>Value</name><direction>out</direction>
+<relatedStateVariable>A_ARG_TYPE_Value</relatedStateVariable></argument>
+</argumentList></action>'''
+
+STATUS = '''<ZPSupportInfo><ZPInfo><ZoneName>Zone {index}</ZoneName><ZoneIcon></ZoneIcon><SerialNumber></SerialNumber>
+<SoftwareVersion>29.{model}-1234</SoftwareVersion><HardwareVersion>1.{model}.1.1-2</HardwareVersion>
+<MACAddress></MACAddress></ZPInfo></ZPSupportInfo>'''
+
+
+class FakeSpeakers(http.server.BaseHTTPRequestHandler):
+    models = 1
+    requests = collections.Counter()
+
+    def do_GET(self):
+        index = int(self.connection.getsockname()[0].rsplit('.', 1)[1])
+        model = index % FakeSpeakers.models + 1
+        FakeSpeakers.requests[self.path] += 1
+        if self.path == '/xml/device_description.xml':
+            body = DEVICE_DESCRIPTION.format(model=model)
+        elif self.path == '/status/zp':
+            body = STATUS.format(index=index, model=model)
+        elif self.path.startswith('/xml/'):
+            body = SCPD.format(actions='\n'.join(ACTION.format(index=i) for i in range(20)))
+        else:
+            self.send_error(404)
+            return
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class NoCache(description.DescriptionCache):
+    """
+    Fetches the descriptions on every call, like the broker did without the cache.
+    """
+
+    @staticmethod
+    def key(zone):
+        return None
+
+
+def scan(socos):
+    FakeSpeakers.requests.clear()
+    start = time.perf_counter()
+    for soco in socos:
+        soco.get_speaker_info(refresh=True)
+        description.description_cache.model_name(soco)
+        list(soco.avTransport.iter_actions())
+    duration = time.perf_counter() - start
+    return duration, FakeSpeakers.requests['/xml/device_description.xml'], \
+        sum(count for path, count in FakeSpeakers.requests.items() if path.startswith('/xml/') and
+            path != '/xml/device_description.xml')
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Device description cache benchmark')
+    argparser.add_argument('--speakers', type=int, default=12)
+    argparser.add_argument('--models', type=int, default=3, help='distinct models / software versions')
+    argparser.add_argument('--scans', type=int, default=3)
+    args = argparser.parse_args()
+
+    FakeSpeakers.models = args.models
+    server = http.server.ThreadingHTTPServer(('', 1400), FakeSpeakers)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    socos = [SoCo('127.0.0.{index}'.format(index=index + 2)) for index in range(args.speakers)]
+    for index, soco in enumerate(socos):
+        # known from the discovery
+        soco._uid = 'RINCON_BENCH{index:04d}01400'.format(index=index)
+
+    path = os.path.join(tempfile.mkdtemp(), 'descriptions.json')
+    print('{speakers} speakers, {models} models, per scan:'.format(speakers=args.speakers, models=args.models))
+    print('                 descriptions    scpd     time')
+    results = []
+    description.description_cache = NoCache()
+    results.append(('no cache', scan(socos)))
+    description.description_cache = description.DescriptionCache(path)
+    for i in range(args.scans):
+        results.append(('cache, scan {n}'.format(n=i + 1), scan(socos)))
+    description.description_cache = description.DescriptionCache(path)
+    results.append(('restart', scan(socos)))
+    for name, (duration, descriptions, scpds) in results:
+        print('{name:<16} {descriptions:>12} {scpds:>7} {ms:>6.1f} ms'.format(
+            name=name, descriptions=descriptions, scpds=scpds, ms=duration * 1000))
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the DIDL-Lite parsing of SoCo.
+
+Builds a DIDL-Lite document with music tracks (like a large queue or a library browse result), parses it with
+from_didl_string() and reports the parse time, the memory held by the parsed objects and the process RSS. The
+pickle round trip is the one used for the saved playlists.
+
+    python3 tools/bench_didl.py --items 10000
+"""
+import argparse
+import gc
+import os
+import pickle
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from soco.data_structures import from_didl_string
+
+ITEM = ('<item id="S://nas/music/{artist}/{album}/{n:02d}%20Track%20{i}.mp3" parentID="A:TRACKS" restricted="true">'
+        '<res protocolInfo="x-file-cifs:*:audio/mpeg:*" duration="0:04:{sec:02d}">'
+        'x-file-cifs://nas/music/{artist}/{album}/{n:02d}%20Track%20{i}.mp3</res>'
+        '<upnp:albumArtURI>/getaa?u=x-file-cifs%3a%2f%2fnas%2fmusic%2f{artist}%2f{album}%2f{n:02d}.mp3&amp;v=3'
+        '</upnp:albumArtURI>'
+        '<dc:title>Track {i}</dc:title><upnp:class>object.item.audioItem.musicTrack</upnp:class>'
+        '<dc:creator>Artist {artist}</dc:creator><upnp:album>Album {album}</upnp:album>'
+        '<upnp:originalTrackNumber>{n}</upnp:originalTrackNumber></item>')
+
+
+def didl_document(items):
+    body = ''.join(ITEM.format(i=i, artist=i % 300, album=i % 900, n=i % 12 + 1, sec=i % 60) for i in range(items))
+    return ('<DIDL-Lite xmlns:dc="http://purl.org/dc/elements/1.1/" '
+            'xmlns:upnp="urn:schemas-upnp-org:metadata-1-0/upnp/" '
+            'xmlns:r="urn:schemas-rinconnetworks-com:metadata-1-0/" '
+            'xmlns="urn:schemas-upnp-org:metadata-1-0/DIDL-Lite/">' + body + '</DIDL-Lite>')
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='DIDL-Lite parsing benchmark')
+    argparser.add_argument('--items', type=int, default=10000)
+    argparser.add_argument('--rounds', type=int, default=5)
+    args = argparser.parse_args()
+
+    document = didl_document(args.items)
+
+    timings = []
+    for _ in range(args.rounds):
+        start = time.perf_counter()
+        from_didl_string(document)
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    rss_before = rss_mb()
+    tracemalloc.start()
+    items = from_didl_string(document)
+    gc.collect()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_after = rss_mb()
+
+    # access the resources once, e.g. when the items are added to the queue
+    start = time.perf_counter()
+    uris = [item.resources[0].uri for item in items]
+    resource_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    data = pickle.dumps(items, pickle.HIGHEST_PROTOCOL)
+    restored = pickle.loads(data)
+    pickle_time = time.perf_counter() - start
+    assert len(restored) == len(uris) == args.items
+
+    print('items          : {items}'.format(items=args.items))
+    print('parse (best)   : {ms:.1f} ms'.format(ms=min(timings) * 1000))
+    print('resources      : {ms:.1f} ms'.format(ms=resource_time * 1000))
+    print('memory held    : {mb:.2f} MB ({b:.0f} bytes/item)'.format(mb=held / 1024 / 1024, b=held / args.items))
+    print('rss growth     : {mb:.2f} MB'.format(mb=rss_after - rss_before))
+    print('pickle size    : {kb:.0f} kB'.format(kb=len(data) / 1024))
+    print('pickle + load  : {ms:.1f} ms'.format(ms=pickle_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replays Sonos events through the event handlers of the Broker and reports the number of updates sent to the clients.
+
+A zone coordinator with two zone members (fake SoCo devices, no Sonos hardware needed) receives a stream of
+AVTransport events for a radio station and a music track and RenderingControl events. Most of the events repeat the
+current state, like a speaker does while the same track is playing; every '--change' events the title changes. After
+every event the speakers are sent, like the event loop does when the event queue is empty.
+
+    python3 tools/bench_events.py --events 10000 --change 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib_sonos import sonos_speaker
+from lib_sonos import udp_broker
+from lib_sonos.sonos_speaker import SonosSpeaker
+from lib_sonos.sonos_service import SonosServerService
+from soco.data_structures import DidlAudioBroadcast, DidlMusicTrack
+
+
+class FakeSoCo():
+    def __init__(self, index):
+        self.uid = 'RINCON_FAKE{index:04d}01400'.format(index=index)
+        self.ip_address = '10.0.0.{index}'.format(index=index + 1)
+        self.household_id = 'Sonos_FAKE'
+        self.volume = 20
+        self.mute = 0
+        self.bass = 0
+        self.treble = 0
+        self.loudness = True
+        self.play_mode = 'NORMAL'
+        self.speaker_info = {'zone_icon': '', 'zone_name': 'Zone {index}'.format(index=index), 'serial_number': '',
+                             'software_version': '', 'hardware_version': '', 'mac_address': ''}
+
+    def get_current_track_info(self):
+        return {'position': '0:01:00'}
+
+
+def radio_event(title):
+    station = DidlAudioBroadcast('Radio Station', 'R:0/0', 'R:0/0/0')
+    track = DidlAudioBroadcast('', '-1', '-1', stream_content='Artist - {title}'.format(title=title),
+                               radio_show='Morning Show,p123456', album_art_uri='/getaa?s=1&u=x-sonosapi-stream')
+    return {'current_track_uri': 'x-sonosapi-stream:s1234', 'current_playmode': 'NORMAL',
+            'transport_state': 'PLAYING', 'enqueued_transport_uri_meta_data': station,
+            'current_track_meta_data': track}
+
+
+def music_event(title):
+    track = DidlMusicTrack('Track {title}'.format(title=title), 'A:TRACKS', 'S://nas/{title}.mp3', creator='Artist',
+                           album='Album', album_art_uri='/getaa?u=x-file-cifs://nas/{title}.mp3'.format(title=title))
+    return {'current_track_uri': 'x-file-cifs://nas/{title}.mp3'.format(title=title), 'current_playmode': 'NORMAL',
+            'transport_state': 'PLAYING', 'enqueued_transport_uri_meta_data': '',
+            'current_track_duration': '0:04:00', 'current_track_meta_data': track}
+
+
+def rendering_event():
+    return {'volume': {'Master': '20'}, 'mute': {'Master': '0'}, 'bass': '0', 'treble': '0',
+            'loudness': {'Master': '1'}}
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Sonos event replay')
+    argparser.add_argument('--events', type=int, default=10000, help='number of events')
+    argparser.add_argument('--change', type=int, default=20, help='the title changes every n events')
+    args = argparser.parse_args()
+
+    updates = []
+    udp_broker.UdpBroker.udp_send = staticmethod(updates.append)
+    SonosSpeaker.tts_local_mode = False
+
+    speakers = [SonosSpeaker(FakeSoCo(index)) for index in range(3)]
+    for speaker in speakers:
+        sonos_speaker.add_speaker(speaker)
+    coordinator = speakers[0]
+    for speaker in speakers:
+        speaker._zone_coordinator = coordinator
+        speaker._zone_members = [member for member in speakers if member is not speaker]
+        speaker.send()
+
+    service = SonosServerService.__new__(SonosServerService)
+    events = []
+    for i in range(args.events):
+        title = i // args.change
+        if i % 4 == 3:
+            events.append((service.handle_RenderingControl_event, rendering_event()))
+        elif (i // 1000) % 2:
+            events.append((service.handle_AVTransport_event, music_event(title)))
+        else:
+            events.append((service.handle_AVTransport_event, radio_event(title)))
+
+    del updates[:]
+    start = time.perf_counter()
+    for handler, variables in events:
+        handler(coordinator, variables)
+        coordinator.send()
+    duration = time.perf_counter() - start
+
+    values = sum(len(update) - 2 for update in updates)
+    print('events         : {events}'.format(events=len(events)))
+    print('updates        : {updates} ({per_event:.2f} per event, 3 speakers)'.format(
+        updates=len(updates), per_event=len(updates) / len(events)))
+    print('values sent    : {values}'.format(values=values))
+    print('time per event : {us:.1f} us'.format(us=duration / len(events) * 1000000))
+
+
+if __name__ == '__main__':
+    main()
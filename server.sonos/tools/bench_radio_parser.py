@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the radio title parser.
+
+Parses a corpus of stream titles (station, stream title, expected artist and title; see radio_titles.txt) with the
+rules of a rules file and reports the accuracy and the throughput. 'cold' parses every title once with an empty memo,
+'repeated' parses the titles like the events of a playing station, every title many times.
+
+    python3 tools/bench_radio_parser.py --rules radio_rules.cfg --corpus tools/radio_titles.txt
+"""
+import argparse
+import os
+import sys
+import time
+
+BASE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..')
+sys.path.insert(0, BASE_DIR)
+
+from lib_sonos.radio_parser import RadioRules
+
+
+def read_corpus(path):
+    corpus = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line and not line.startswith('#'):
+                corpus.append(tuple(line.split('\t')))
+    return corpus
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Radio title parser benchmark')
+    argparser.add_argument('--rules', default=os.path.join(BASE_DIR, 'radio_rules.cfg'))
+    argparser.add_argument('--corpus', default=os.path.join(BASE_DIR, 'tools', 'radio_titles.txt'))
+    argparser.add_argument('--rounds', type=int, default=200)
+    argparser.add_argument('-v', '--verbose', action='store_true', help='show the wrongly parsed titles')
+    args = argparser.parse_args()
+
+    rules = RadioRules.from_file(args.rules)
+    corpus = read_corpus(args.corpus)
+
+    correct = 0
+    for station, stream_content, artist, title in corpus:
+        result = rules.parse(station, stream_content)
+        if result == (artist, title):
+            correct += 1
+        elif args.verbose:
+            print('{station!r}: {content!r} -> {result!r}, expected {expected!r}'.format(
+                station=station, content=stream_content, result=result, expected=(artist, title)))
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        rules.parse.cache_clear()
+        for station, stream_content, artist, title in corpus:
+            rules.parse(station, stream_content)
+    cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        for station, stream_content, artist, title in corpus:
+            rules.parse(station, stream_content)
+    repeated = time.perf_counter() - start
+
+    parses = args.rounds * len(corpus)
+    print('rules          : {rules}'.format(rules=len(rules.rules)))
+    print('titles         : {titles}'.format(titles=len(corpus)))
+    print('accuracy       : {correct}/{titles} ({percent:.1f} %)'.format(
+        correct=correct, titles=len(corpus), percent=correct / len(corpus) * 100))
+    print('cold           : {rate:.0f} titles/s'.format(rate=parses / cold))
+    print('repeated       : {rate:.0f} titles/s'.format(rate=parses / repeated))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression check for the album art proxy of the Sonos Broker.
+
+Runs the command server in-process with an album art cache in a temporary folder (no Sonos hardware or network
+access needed) and requests keys which are not the digest of a registered uri: parent directories, percent encoded
+parent directories, absolute paths and unregistered digests of files that exist in the cache folder.
+
+Checks:
+  - every such request is answered with 404
+  - no file outside the cache folder is read or touched (the modification time is unchanged)
+  - a registered image is still served
+
+    python3 tools/check_album_art.py
+"""
+import http.client
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib_sonos import album_art
+from lib_sonos.command_server import SonosHttpHandler, PooledHTTPServer
+
+IMAGE = b'\x89PNG\r\n\x1a\n fake image'
+
+
+def get(port, path):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        # the path is sent as is, http.client does not normalize it
+        connection.putrequest('GET', path)
+        connection.endheaders()
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def main():
+    base = tempfile.mkdtemp()
+    folder = os.path.join(base, 'album_art')
+    secret = os.path.join(base, 'secret')
+    with open(secret, 'wb') as f:
+        f.write(b'secret')
+    os.utime(secret, (1000000000, 1000000000))
+
+    server = PooledHTTPServer(('127.0.0.1', 0), SonosHttpHandler, 4, True)
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    album_art.album_art_cache = album_art.AlbumArtCache('http://127.0.0.1:{port}'.format(port=port), folder)
+
+    # a registered image, already on disk
+    url = album_art.proxy_url('http://10.0.0.1:1400/getaa?s=1&u=x-sonos-spotify')
+    key = url.rsplit('/', 1)[1]
+    with open(os.path.join(folder, key), 'wb') as f:
+        f.write(IMAGE)
+    # an image on disk which was not registered in this session
+    unregistered = album_art.AlbumArtCache.key('http://10.0.0.1:1400/getaa?s=1&u=unknown')
+    with open(os.path.join(folder, unregistered), 'wb') as f:
+        f.write(IMAGE)
+
+    relative = os.path.relpath(secret, folder)
+    paths = [
+        '/albumart/' + relative,
+        '/albumart/../../../../etc/hostname',
+        '/albumart/..%2f..%2f..%2fetc%2fhostname',
+        '/albumart/%2e%2e/%2e%2e/etc/hostname',
+        '/albumart/%2e%2e%2fsecret',
+        '/albumart/' + secret,
+        '/albumart//etc/hostname',
+        '/albumart/' + key.upper(),
+        '/albumart/' + key + '/..',
+        '/albumart/' + unregistered,
+        '/albumart/' + relative + '?size=100',
+    ]
+    errors = []
+    for path in paths:
+        status, body = get(port, path)
+        if status != 404:
+            errors.append('{path}: status {status}, {length} bytes'.format(path=path, status=status,
+                                                                             length=len(body)))
+    if os.stat(secret).st_mtime != 1000000000:
+        errors.append('{secret} was touched'.format(secret=secret))
+
+    status, body = get(port, '/albumart/' + key)
+    if status != 200 or body != IMAGE:
+        errors.append('registered key: status {status}'.format(status=status))
+
+    server.shutdown()
+    server.server_close()
+
+    print('requests    : {count}'.format(count=len(paths) + 1))
+    for error in errors:
+        print('ERROR       : {error}'.format(error=error))
+    print('result      : {result}'.format(result='FAILED' if errors else 'OK'))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression check for the zone topology (roles and sub-members of the players) parsed from the zone group state.
+
+The zone group states are synthetic, no Sonos hardware or network access is needed. Cases:
+  - a home theatre with Satellite elements and a stereo pair in the same group
+  - a home theatre whose subwoofer is an invisible ZoneGroupMember, only listed in the HTSatChanMapSet, in a group
+    coordinated by another zone
+  - a bridge
+
+    python3 tools/check_topology.py
+"""
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from soco import SoCo
+from soco.groups import ZoneTopology
+
+ADDRESSES = itertools.count(1)
+
+
+def member(uid, name, attributes='', satellites=''):
+    return ('<ZoneGroupMember UUID="{uid}" Location="http://10.0.0.{ip}:1400/xml/device_description.xml" '
+            'ZoneName="{name}" {attributes}>{satellites}</ZoneGroupMember>').format(
+        uid=uid, ip=next(ADDRESSES), name=name, attributes=attributes, satellites=satellites)
+
+
+def satellite(uid, name):
+    return ('<Satellite UUID="{uid}" Location="http://10.0.0.{ip}:1400/xml/device_description.xml" '
+            'ZoneName="{name}" Invisible="1"/>').format(uid=uid, ip=next(ADDRESSES), name=name)
+
+
+def group(coordinator, *members):
+    return '<ZoneGroup Coordinator="{uid}" ID="{uid}:1">{members}</ZoneGroup>'.format(
+        uid=coordinator, members=''.join(members))
+
+
+CASES = [
+    (
+        'satellite elements and stereo pair',
+        group('RINCON_LIV',
+              member('RINCON_LIV', 'Living', 'HTSatChanMapSet="RINCON_LIV:LF,RF;RINCON_SUB:SW;RINCON_RL:LR"',
+                     satellite('RINCON_SUB', 'Living') + satellite('RINCON_RL', 'Living')),
+              member('RINCON_KIT', 'Kitchen', 'ChannelMapSet="RINCON_KIT:LF,LF;RINCON_KIS:RF,RF"'),
+              member('RINCON_KIS', 'Kitchen', 'ChannelMapSet="RINCON_KIT:LF,LF;RINCON_KIS:RF,RF" Invisible="1"')),
+        {
+            'RINCON_LIV': (ZoneTopology.ZONE, None, ('RINCON_RL', 'RINCON_SUB'), 'LF,RF'),
+            'RINCON_SUB': (ZoneTopology.SATELLITE, 'RINCON_LIV', (), 'SW'),
+            'RINCON_RL': (ZoneTopology.SATELLITE, 'RINCON_LIV', (), 'LR'),
+            'RINCON_KIT': (ZoneTopology.ZONE, None, ('RINCON_KIS',), 'LF,LF'),
+            'RINCON_KIS': (ZoneTopology.PAIR_SLAVE, 'RINCON_KIT', (), 'RF,RF'),
+        },
+    ),
+    (
+        'satellite as invisible member of a group coordinated by another zone',
+        group('RINCON_K',
+              member('RINCON_K', 'Kitchen'),
+              member('RINCON_L', 'Living', 'HTSatChanMapSet="RINCON_L:LF,RF;RINCON_S:SW"'),
+              member('RINCON_S', 'Living', 'Invisible="1"')),
+        {
+            'RINCON_K': (ZoneTopology.ZONE, None, (), ''),
+            'RINCON_L': (ZoneTopology.ZONE, None, ('RINCON_S',), 'LF,RF'),
+            'RINCON_S': (ZoneTopology.SATELLITE, 'RINCON_L', (), 'SW'),
+        },
+    ),
+    (
+        'bridge',
+        group('RINCON_BRI', member('RINCON_BRI', 'BRIDGE', 'IsZoneBridge="1" Invisible="1"')),
+        {
+            'RINCON_BRI': (ZoneTopology.BRIDGE, None, (), ''),
+        },
+    ),
+]
+
+
+def topology(zone_groups):
+    zgs = '<ZoneGroups>{groups}</ZoneGroups>'.format(groups=zone_groups)
+    soco = SoCo('10.0.1.{index}'.format(index=next(ADDRESSES)))
+    soco.zoneGroupTopology.GetZoneGroupState = lambda *args, **kwargs: {'ZoneGroupState': zgs}
+    return soco.topology
+
+
+def main():
+    errors = []
+    for name, zone_groups, expected in CASES:
+        result = {uid: (entry.role, entry.main_uid, entry.sub_uids, entry.channels)
+                  for uid, entry in topology(zone_groups).items()}
+        for uid in sorted(set(expected) | set(result)):
+            if result.get(uid) != expected.get(uid):
+                errors.append('{name}: {uid} is {result}, expected {expected}'.format(
+                    name=name, uid=uid, result=result.get(uid), expected=expected.get(uid)))
+
+    print('cases       : {count}'.format(count=len(CASES)))
+    for error in errors:
+        print('ERROR       : {error}'.format(error=error))
+    print('result      : {result}'.format(result='FAILED' if errors else 'OK'))
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Load test for the Sonos Broker command server.
+
+Starts the command server in-process with fake speakers (no Sonos hardware or network access needed) and fires
+GetVolume / SetVolume commands from several client threads. Reports the commands per second and the latency
+percentiles.
+
+    python3 tools/load_test.py --clients 8 --requests 2000
+    python3 tools/load_test.py --no-keep-alive
+"""
+import argparse
+import http.client
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib_sonos import sonos_speaker
+from lib_sonos.command_server import SonosHttpHandler, PooledHTTPServer
+
+
+class FakeSpeaker():
+    """
+    Minimal speaker backend for the volume commands, no SoCo instance involved.
+    """
+
+    def __init__(self, uid):
+        self.uid = uid
+        self.volume = 20
+        self.max_volume = -1
+        self.zone_members = []
+
+    def set_volume(self, volume, trigger_action=False, group_command=False):
+        self.volume = int(volume)
+
+    def dirty_property(self, *args):
+        pass
+
+    def send(self):
+        pass
+
+
+def percentile(values, p):
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def client(port, uids, requests, keep_alive, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-type': 'application/json'}
+    if not keep_alive:
+        headers['Connection'] = 'close'
+    for i in range(requests):
+        uid = uids[i % len(uids)]
+        if i % 2:
+            payload = {'command': 'set_volume', 'parameter': {'uid': uid, 'volume': i % 100}}
+        else:
+            payload = {'command': 'get_volume', 'parameter': {'uid': uid}}
+        start = time.perf_counter()
+        conn.request('POST', '/', json.dumps(payload).encode('utf-8'), headers)
+        response = conn.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            raise Exception('Unexpected response: {status}'.format(status=response.status))
+        if not keep_alive:
+            conn.close()
+    conn.close()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Sonos Broker command server load test')
+    argparser.add_argument('--clients', type=int, default=8, help='number of concurrent clients')
+    argparser.add_argument('--requests', type=int, default=1000, help='requests per client')
+    argparser.add_argument('--speakers', type=int, default=14, help='number of fake speakers')
+    argparser.add_argument('--workers', type=int, default=16, help='server worker threads')
+    argparser.add_argument('--no-keep-alive', action='store_true', help='one connection per request')
+    args = argparser.parse_args()
+    keep_alive = not args.no_keep_alive
+
+    uids = ['rincon_fake{:04d}'.format(i) for i in range(args.speakers)]
+    for uid in uids:
+        sonos_speaker.add_speaker(FakeSpeaker(uid))
+
+    server = PooledHTTPServer(('127.0.0.1', 0), SonosHttpHandler, max(args.workers, args.clients), keep_alive)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    latencies = []
+    threads = [threading.Thread(target=client, args=(port, uids, args.requests, keep_alive, latencies))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+
+    latencies.sort()
+    total = len(latencies)
+    print('mode        : {mode}'.format(mode='keep-alive' if keep_alive else 'connection per request'))
+    print('commands    : {total} ({clients} clients)'.format(total=total, clients=args.clients))
+    print('duration    : {duration:.2f} s'.format(duration=duration))
+    print('commands/s  : {cps:.0f}'.format(cps=total / duration))
+    for p in (50, 90, 99):
+        print('p{p:<11}: {ms:.3f} ms'.format(p=p, ms=percentile(latencies, p) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Concurrency stress test for the Sonos Broker.
+
+Runs the command server and the speaker discovery in-process with fake SoCo devices (no Sonos hardware or network
+access needed). While client threads hammer volume and status commands, the discovery rescans continuously (with a
+simulated network delay per speaker) and drops and re-adds a speaker on every scan.
+
+Checks afterwards:
+  - no unexpected exceptions in any thread, only 'No speaker found' errors for the dropped speaker
+  - the updates of every speaker were published with strictly increasing state versions
+  - the last published volume of every speaker matches its current volume (no lost dirty properties)
+
+    python3 tools/stress_test.py --clients 8 --requests 500 --speakers 6
+"""
+import argparse
+import http.client
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from lib_sonos import sonos_speaker
+from lib_sonos import udp_broker
+from lib_sonos.command_server import SonosHttpHandler, PooledHTTPServer
+from lib_sonos.sonos_service import SonosServerService
+
+
+class FakeSubscription():
+    time_left = 3600
+
+    def unsubscribe(self):
+        pass
+
+
+class FakeService():
+    def subscribe(self, *args, **kwargs):
+        return FakeSubscription()
+
+
+class FakeGroup():
+    def __init__(self, members):
+        self.members = members
+        self.coordinator = members[0] if members else None
+
+
+class FakeSoCo():
+    """
+    The parts of a SoCo instance used by SonosSpeaker for the volume and status commands.
+    """
+    household = []
+
+    def __init__(self, index, delay):
+        self.uid = 'RINCON_FAKE{index:04d}01400'.format(index=index)
+        self.ip_address = '10.0.0.{index}'.format(index=index + 1)
+        self.household_id = 'Sonos_FAKE'
+        self.volume = 20
+        self.mute = 0
+        self.bass = 0
+        self.treble = 0
+        self.loudness = True
+        self.play_mode = 'NORMAL'
+        self.speaker_info = {'zone_icon': '', 'zone_name': 'Zone {index}'.format(index=index), 'serial_number': '',
+                             'software_version': '', 'hardware_version': '', 'mac_address': ''}
+        self.zoneGroupTopology = self.avTransport = self.renderingControl = self.alarmClock = \
+            self.contentDirectory = FakeService()
+        self._delay = delay
+
+    @property
+    def all_groups(self):
+        return [FakeGroup(FakeSoCo.household)]
+
+    @property
+    def topology(self):
+        # no satellites or stereo pairs, all players are zones
+        return {}
+
+    def get_current_track_info(self):
+        return {'position': '0:00:00'}
+
+    def get_speaker_info(self, refresh=False):
+        # network round trip
+        time.sleep(self._delay)
+        return self.speaker_info
+
+
+def percentile(values, p):
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def rescan(service, socos, stop, scans):
+    dropped = socos[-1]
+    while not stop.is_set():
+        # every other scan the last speaker is offline
+        FakeSoCo.household = socos if len(scans) % 2 else [soco for soco in socos if soco is not dropped]
+        start = time.perf_counter()
+        service.discover()
+        scans.append(time.perf_counter() - start)
+
+
+def client(port, uids, requests, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    headers = {'Content-type': 'application/json'}
+    for i in range(requests):
+        uid = uids[i % len(uids)]
+        if i % 4 == 0:
+            payload = {'command': 'current_state', 'parameter': {'uid': uid, 'group_command': 1}}
+        elif i % 4 == 1:
+            payload = {'command': 'get_volume', 'parameter': {'uid': uid}}
+        else:
+            payload = {'command': 'set_volume', 'parameter': {'uid': uid, 'volume': i % 100, 'group_command': 1}}
+        start = time.perf_counter()
+        conn.request('POST', '/', json.dumps(payload).encode('utf-8'), headers)
+        response = conn.getresponse()
+        body = response.read().decode('utf-8')
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200 and 'No speaker found' not in body:
+            errors.append('{command}: {status} {body}'.format(command=payload['command'], status=response.status,
+                                                              body=body))
+    conn.close()
+
+
+def main():
+    argparser = argparse.ArgumentParser(description='Sonos Broker concurrency stress test')
+    argparser.add_argument('--clients', type=int, default=8, help='number of concurrent clients')
+    argparser.add_argument('--requests', type=int, default=500, help='requests per client')
+    argparser.add_argument('--speakers', type=int, default=6, help='number of fake speakers')
+    argparser.add_argument('--delay', type=float, default=0.01, help='simulated network delay in seconds')
+    args = argparser.parse_args()
+
+    published = {}
+    published_lock = threading.Lock()
+
+    def udp_send(values):
+        with published_lock:
+            published.setdefault(values['uid'], []).append(values)
+    udp_broker.UdpBroker.udp_send = staticmethod(udp_send)
+
+    thread_errors = []
+    threading.excepthook = lambda hook_args: thread_errors.append(repr(hook_args.exc_value))
+
+    socos = [FakeSoCo(index, args.delay) for index in range(args.speakers)]
+    FakeSoCo.household = socos
+    SonosServerService._discover = staticmethod(lambda: {'Sonos_FAKE': set(FakeSoCo.household)})
+    SonosServerService.get_model_name = staticmethod(lambda soco: 'FAKE:1')
+    service = SonosServerService.__new__(SonosServerService)
+    service.lock = threading.Lock()
+    service.event_queue = queue.Queue()
+    service.discover()
+
+    server = PooledHTTPServer(('127.0.0.1', 0), SonosHttpHandler, args.clients, True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    stop = threading.Event()
+    scans = []
+    scanner = threading.Thread(target=rescan, args=(service, socos, stop, scans))
+    scanner.start()
+
+    uids = [soco.uid.lower() for soco in socos]
+    latencies = []
+    errors = []
+    threads = [threading.Thread(target=client, args=(port, uids, args.requests, latencies, errors))
+               for _ in range(args.clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+    stop.set()
+    scanner.join()
+    server.shutdown()
+    server.server_close()
+
+    # flush everything still dirty, then compare the last published values with the speaker state
+    for speaker in sonos_speaker.sonos_speakers.values():
+        speaker.send()
+
+    for uid, updates in published.items():
+        versions = [values['state_version'] for values in updates]
+        if any(later <= earlier for earlier, later in zip(versions, versions[1:])):
+            errors.append('{uid}: state versions out of order'.format(uid=uid))
+    for uid, speaker in sonos_speaker.sonos_speakers.items():
+        volumes = [values['volume'] for values in published.get(uid, []) if 'volume' in values]
+        if volumes and volumes[-1] != speaker.volume:
+            errors.append('{uid}: last published volume {published}, speaker volume {volume}'.format(
+                uid=uid, published=volumes[-1], volume=speaker.volume))
+
+    latencies.sort()
+    print('commands    : {total} ({clients} clients) in {duration:.2f} s'.format(
+        total=len(latencies), clients=args.clients, duration=duration))
+    print('rescans     : {scans} (avg {ms:.0f} ms)'.format(scans=len(scans),
+                                                          ms=sum(scans) / max(len(scans), 1) * 1000))
+    print('updates     : {updates}'.format(updates=sum(len(updates) for updates in published.values())))
+    for p in (50, 99):
+        print('p{p:<11}: {ms:.3f} ms'.format(p=p, ms=percentile(latencies, p) * 1000))
+
+    errors.extend(thread_errors)
+    for error in errors[:20]:
+        print('ERROR: {error}'.format(error=error))
+    print('result      : {result}'.format(result='FAILED ({count} errors)'.format(count=len(errors)) if errors
+                                          else 'OK'))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()